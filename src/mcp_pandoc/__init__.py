@@ -1,12 +1,22 @@
 """mcp_pandoc package initialization."""
-import asyncio
-
-from . import server
+import importlib
 
 
 def main():
     """Run the mcp-pandoc server."""
+    import asyncio
+
+    from . import server
+
     asyncio.run(server.main())
 
+
+def __getattr__(name):
+    # The server pulls in the whole MCP stack, so it is only imported when asked for
+    if name == "server":
+        return importlib.import_module(f"{__name__}.server")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Optionally expose other important items at package level
 __all__ = ['main', 'server']
@@ -0,0 +1,106 @@
+"""Binary sources sent inside the tool call instead of as files on the server.
+
+``contents`` is a string, so a docx, odt or epub could only be converted from
+``input_file``. A remote or containerised client then has to copy the document onto the
+server's filesystem first, which costs a full write and read per document. Instead, a
+source can arrive as ``contents_base64`` or as the ``resource`` of an MCP
+``EmbeddedResource``. It is decoded in memory and written to pandoc's standard input.
+Every reader this server accepts reads its input from stdin, zip packages included,
+so no scratch file is staged.
+
+The payload size is checked against ``MCP_PANDOC_BLOB_LIMIT_MB`` from the length of the
+base64 text, before any memory is spent on decoding it. For large payloads the result
+reports the decoded size and the server's peak memory.
+"""
+import base64
+import binascii
+import os
+import sys
+
+BLOB_LIMIT_ENV = "MCP_PANDOC_BLOB_LIMIT_MB"
+DEFAULT_BLOB_LIMIT_MB = 64
+
+# Payloads at least this large get a memory report in the result.
+REPORT_BYTES = 1024 * 1024
+
+_MB = 1024 * 1024
+
+# ru_maxrss is kilobytes on Linux and bytes on macOS.
+_MAXRSS_TO_BYTES = 1 if sys.platform == "darwin" else 1024
+
+# Readers for the MIME types clients attach to embedded resources.
+MIME_TYPE_FORMATS = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.oasis.opendocument.text": "odt",
+    "application/epub+zip": "epub",
+    "application/pdf": "pdf",
+    "application/x-ipynb+json": "ipynb",
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+    "text/markdown": "markdown",
+    "text/x-markdown": "markdown",
+    "text/x-rst": "rst",
+    "text/x-tex": "latex",
+    "application/x-latex": "latex",
+    "text/plain": "markdown",
+}
+
+
+def blob_limit_mb() -> int:
+    """Return the largest decoded payload accepted, in megabytes."""
+    try:
+        return max(1, int(os.environ.get(BLOB_LIMIT_ENV, DEFAULT_BLOB_LIMIT_MB)))
+    except ValueError:
+        return DEFAULT_BLOB_LIMIT_MB
+
+
+def decoded_size(encoded: str) -> int:
+    """Return the size base64 text decodes to, without decoding it."""
+    length = len(encoded)
+    return length * 3 // 4 - encoded.endswith("=") - encoded.endswith("==")
+
+
+def decode_blob(encoded: str, name: str = "contents_base64") -> bytes:
+    """Decode a base64 payload, refusing one over the size limit before decoding it."""
+    limit = blob_limit_mb()
+    size = decoded_size(encoded)
+    if size > limit * _MB:
+        raise ValueError(
+            f"{name} decodes to {size / _MB:.1f} MB, over the {limit} MB limit set by {BLOB_LIMIT_ENV}"
+        )
+    # Line breaks, as written by most base64 encoders, are allowed; any other character outside the alphabet is not
+    if any(space in encoded for space in "\n\r\t "):
+        encoded = "".join(encoded.split())
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"{name} is not valid base64: {e}") from e
+
+
+def resource_source(resource: dict) -> tuple[str | bytes, str | None]:
+    """Return an embedded resource's text or decoded blob, and the reader its MIME type names."""
+    if not isinstance(resource, dict):
+        raise ValueError("resource must be an object with a 'blob' or 'text' field")
+    mime_type = (resource.get("mimeType") or "").split(";")[0].strip().lower()
+    reader = MIME_TYPE_FORMATS.get(mime_type)
+    if resource.get("blob"):
+        return decode_blob(resource["blob"], "resource blob"), reader
+    if resource.get("text"):
+        return resource["text"], reader
+    raise ValueError("resource must have a non-empty 'blob' or 'text' field")
+
+
+def memory_report(encoded_length: int, data: bytes) -> str:
+    """Describe a large payload's size and the server's peak memory, or return '' for a small one."""
+    if len(data) < REPORT_BYTES:
+        return ""
+    report = (
+        f"Input blob: {len(data) / _MB:.1f} MB decoded from {encoded_length / _MB:.1f} MB of base64 "
+        f"and streamed to pandoc's stdin"
+    )
+    if os.name == "posix":
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_TO_BYTES
+        report += f"; server peak memory {peak / _MB:.0f} MB"
+    return f"{report}."
@@ -0,0 +1,167 @@
+"""Multi-file book builds with a per-chapter AST cache.
+
+A book given as an ordered list of chapter files is not concatenated and reconverted as
+a whole. Each chapter is read into the pandoc JSON AST on its own and the AST is cached
+under ``ast/`` by the chapter's content hash, its reader and the pandoc binary. The
+chapters are then merged into one document, which is written once with the filters,
+defaults and output options of the call. After a one-chapter edit only that chapter is
+parsed again.
+
+Reading chapters separately is pandoc's ``--file-scope`` behaviour: reference links and
+footnote labels resolve within their own chapter. Heading identifiers that repeat across
+chapters get the ``-1``, ``-2`` suffixes pandoc gives them when it reads one file. Only
+chapters in ``AST_READERS`` formats can be built, since images in packaged formats such
+as docx would be lost between the chapter's AST and the book.
+"""
+import json
+import os
+import re
+import threading
+from collections.abc import Callable
+
+from .cache import cache_dir, file_sha256, sha256_hex
+from .runner import input_format_for, pandoc_identity, run_pandoc
+
+# Readers whose whole input ends up in the AST. Packaged formats such as docx keep their
+# images in pandoc's media bag, which the JSON AST does not carry.
+AST_READERS = ("markdown", "html", "rst", "latex")
+
+# Content hashes by path, size and mtime, so unchanged chapters are not even read again.
+_hashes: dict[str, tuple[int, int, str]] = {}
+_hashes_lock = threading.Lock()
+
+
+def source_file_sha256(path: str) -> str:
+    """Return a file's content hash, hashing it again only when its size or mtime changed."""
+    stat = os.stat(path)
+    with _hashes_lock:
+        known = _hashes.get(path)
+    if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+        return known[2]
+    digest = file_sha256(path)
+    with _hashes_lock:
+        _hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def ast_key(source_hash: str, reader: str) -> str:
+    """Return the AST cache key for a source read with a reader by the current pandoc binary."""
+    payload = json.dumps({"source": source_hash, "reader": reader, "pandoc": pandoc_identity()})
+    return sha256_hex(payload.encode("utf-8"))
+
+
+def cached_ast_json(key: str, convert: Callable[[], str]) -> tuple[str, bool]:
+    """Return the AST JSON cached under key, or convert() it and cache it, and whether it came from the cache."""
+    cached_file = os.path.join(cache_dir("ast"), f"{key}.json")
+    try:
+        with open(cached_file, encoding="utf-8") as f:
+            return f.read(), True
+    except OSError:
+        pass
+
+    ast_json = convert()
+    # Written under a temporary name so a concurrent build never reads half a file
+    temp_file = f"{cached_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(ast_json)
+    os.replace(temp_file, cached_file)
+    return ast_json, False
+
+
+def cached_ast(key: str, convert: Callable[[], str]) -> tuple[dict, bool]:
+    """Return the AST cached under key, or convert() it and cache it, and whether it came from the cache."""
+    ast_json, cached = cached_ast_json(key, convert)
+    return json.loads(ast_json), cached
+
+
+def chapter_ast(path: str, reader: str | None = None) -> tuple[dict, bool]:
+    """Return a chapter's AST and whether it came from the cache."""
+    reader = reader or input_format_for(path)
+    return cached_ast(
+        ast_key(source_file_sha256(path), reader),
+        lambda: run_pandoc("json", input_file=path, input_format=reader),
+    )
+
+
+def _nested_blocks(kind: str, content):
+    """Yield every list of blocks directly inside a block, in document order."""
+    if kind == "BlockQuote":
+        yield content
+    elif kind == "Div":
+        yield content[1]
+    elif kind == "BulletList":
+        yield from content
+    elif kind == "OrderedList":
+        yield from content[1]
+    elif kind == "DefinitionList":
+        for _, definitions in content:
+            yield from definitions
+    elif kind == "Figure":
+        yield content[1][1]
+        yield content[2]
+    elif kind == "Table":
+        _, caption, _, head, bodies, foot = content
+        yield caption[1]
+        rows = [*head[1]]
+        for _, _, head_rows, body_rows in bodies:
+            rows.extend([*head_rows, *body_rows])
+        rows.extend(foot[1])
+        for _, cells in rows:
+            for cell in cells:
+                yield cell[4]
+
+
+def _deduplicate_identifiers(blocks, seen: set[str]):
+    """Rename heading identifiers already used earlier in the book, as pandoc would."""
+    for block in blocks:
+        if not isinstance(block, dict):
+            continue
+        kind, content = block.get("t"), block.get("c")
+        if kind == "Header":
+            attr = content[1]
+            identifier = attr[0]
+            if identifier in seen:
+                suffix = 1
+                while f"{identifier}-{suffix}" in seen:
+                    suffix += 1
+                identifier = attr[0] = f"{identifier}-{suffix}"
+            if identifier:
+                seen.add(identifier)
+        else:
+            for nested in _nested_blocks(kind, content):
+                _deduplicate_identifiers(nested, seen)
+
+
+def merge_chapters(asts: list[dict]) -> dict:
+    """Merge chapter ASTs in order; the first chapter to set a metadata field wins."""
+    meta: dict = {}
+    blocks: list = []
+    seen: set[str] = set()
+    for ast in asts:
+        for key, value in ast.get("meta", {}).items():
+            meta.setdefault(key, value)
+        _deduplicate_identifiers(ast["blocks"], seen)
+        blocks.extend(ast["blocks"])
+    return {"pandoc-api-version": asts[0]["pandoc-api-version"], "meta": meta, "blocks": blocks}
+
+
+def build_book(paths: list[str], reader: str | None = None) -> tuple[str, int]:
+    """Read every chapter through the cache and return the merged AST as JSON and how many were parsed."""
+    for path in paths:
+        if not os.path.isfile(path):
+            raise ValueError(f"Input file not found: {path}")
+        # Extensions such as markdown+smart do not change what ends up in the AST
+        chapter_reader = re.split(r"[+-]", reader or input_format_for(path), maxsplit=1)[0]
+        if chapter_reader not in AST_READERS:
+            raise ValueError(
+                f"Chapter {path} is read as {chapter_reader}, which cannot be built into a book: its images would "
+                f"be lost. Chapters must be {', '.join(AST_READERS[:-1])} or {AST_READERS[-1]} files; convert "
+                f"it on its own with input_file instead."
+            )
+
+    asts, parsed = [], 0
+    for path in paths:
+        ast, cached = chapter_ast(path, reader)
+        asts.append(ast)
+        parsed += not cached
+    return json.dumps(merge_chapters(asts), ensure_ascii=False), parsed
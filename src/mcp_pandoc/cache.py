@@ -0,0 +1,48 @@
+"""On-disk cache locations shared by the conversion stages.
+
+Every cache the server keeps lives under one root so that a deployment can point it at
+a persistent volume, or wipe it, in one place. The root is ``MCP_PANDOC_CACHE_DIR`` when
+set, otherwise ``mcp-pandoc`` inside the platform's user cache directory.
+"""
+import hashlib
+import os
+
+CACHE_DIR_ENV = "MCP_PANDOC_CACHE_DIR"
+
+# Read files in fixed-size blocks so hashing a large input never loads it whole.
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _default_cache_root() -> str:
+    """Return the platform's per-user cache directory for this project."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "mcp-pandoc")
+
+
+def cache_root() -> str:
+    """Return the cache root, honouring MCP_PANDOC_CACHE_DIR."""
+    return os.path.abspath(os.environ.get(CACHE_DIR_ENV) or _default_cache_root())
+
+
+def cache_dir(*parts: str) -> str:
+    """Return a directory under the cache root, creating it if it does not exist yet."""
+    path = os.path.join(cache_root(), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def sha256_hex(data: bytes) -> str:
+    """Return the hex SHA-256 digest of a byte string."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,205 @@
+"""Heading-aware chunking of converted documents.
+
+A large inbound document is parsed once into the pandoc JSON AST and rendered once, with
+an unambiguous marker paragraph between top-level blocks. Splitting the rendered text on
+those markers gives the output of every block without a pandoc call per section. Blocks
+are then grouped into chunks that start at each heading and never exceed a size limit
+unless a single block does.
+
+The rendered document and its manifest are cached under ``chunks/<document_id>/``, where
+the id is derived from the source hash and the conversion options. Any chunk can be read
+back by id, as a byte range of the cached document, without converting the source again.
+"""
+import json
+import os
+import re
+import secrets
+from collections.abc import Callable
+
+from .cache import cache_dir, sha256_hex
+
+# Shortest useful chunk. Anything smaller would split most paragraphs from their heading.
+MIN_CHUNK_BYTES = 256
+
+_ID_LENGTH = 20
+# A document id is a prefix of a SHA-256 hex digest; nothing else may become a cache path.
+_DOCUMENT_ID = re.compile(rf"[0-9a-f]{{{_ID_LENGTH}}}")
+_CONTENT_FILE = "content.txt"
+_MANIFEST_FILE = "manifest.json"
+
+
+def document_key(source_hash: str, options: dict) -> str:
+    """Derive a document id from the source hash and everything that shapes its output."""
+    payload = json.dumps({"source": source_hash, **options}, sort_keys=True)
+    return sha256_hex(payload.encode("utf-8"))[:_ID_LENGTH]
+
+
+def chunk_id(document_id: str, ordinal: int) -> str:
+    """Return the id of one chunk of a document."""
+    return f"{document_id}-{ordinal:04d}"
+
+
+def _parse_chunk_id(value: str) -> tuple[str, int]:
+    """Split a chunk id into its document id and ordinal."""
+    document_id, _, ordinal = value.rpartition("-")
+    if not _DOCUMENT_ID.fullmatch(document_id) or not ordinal.isdigit():
+        raise ValueError(f"Invalid chunk_id: {value}")
+    return document_id, int(ordinal)
+
+
+def stringify(node) -> str:
+    """Return the plain text of an AST fragment, enough for a heading label."""
+    if isinstance(node, list):
+        return "".join(stringify(item) for item in node)
+    if not isinstance(node, dict):
+        return ""
+    kind = node.get("t")
+    if kind == "Str":
+        return node["c"]
+    if kind in ("Space", "SoftBreak", "LineBreak"):
+        return " "
+    if kind in ("Code", "Math"):
+        return node["c"][1]
+    if kind == "Note":
+        return ""
+    return stringify(node.get("c", []))
+
+
+def render_blocks(ast: dict, render: Callable[[str], str]) -> list[str]:
+    """Render every top-level block of a document in one writer pass.
+
+    ``render`` takes pandoc JSON and returns the writer's output for it.
+    """
+    blocks = ast.get("blocks", [])
+    if not blocks:
+        return []
+
+    token = f"MCPPANDOCBLOCKBREAK{secrets.token_hex(8).upper()}"
+    marker = {"t": "Para", "c": [{"t": "Str", "c": token}]}
+    interleaved = []
+    for index, block in enumerate(blocks):
+        if index:
+            interleaved.append(marker)
+        interleaved.append(block)
+
+    rendered = render(json.dumps({**ast, "blocks": interleaved}))
+    # The marker renders as a line of its own in every text writer, possibly wrapped in
+    # paragraph markup such as <p>...</p>, so split on the whole line.
+    pieces = re.split(rf"^[^\n]*{token}[^\n]*$", rendered, flags=re.MULTILINE)
+    if len(pieces) != len(blocks):
+        raise ValueError(
+            f"Could not split the rendered document into blocks: expected {len(blocks)} pieces, got {len(pieces)}"
+        )
+    return [piece.strip("\n") for piece in pieces]
+
+
+def build_chunks(ast: dict, block_texts: list[str], max_bytes: int) -> tuple[str, list[dict]]:
+    """Group rendered blocks into chunks and lay them out as one document.
+
+    A heading always starts a new chunk. A section larger than ``max_bytes`` is split
+    between blocks, and each continuation carries the same heading path. Returns the
+    assembled document text and the chunk entries, whose byte offsets index into it.
+    """
+    blocks = ast.get("blocks", [])
+    chunks = []
+    heading_path: list[str] = []
+    current: list[bytes] = []
+    current_path: list[str] = []
+    continuation = False
+
+    def flush():
+        if current:
+            chunks.append({"heading_path": list(current_path), "continuation": continuation, "parts": list(current)})
+            current.clear()
+
+    for block, text in zip(blocks, block_texts, strict=True):
+        if not text:
+            continue
+        encoded = f"{text}\n\n".encode()
+
+        if block.get("t") == "Header":
+            flush()
+            level = block["c"][0]
+            heading_path = heading_path[: level - 1] + [stringify(block["c"][2])]
+            current_path = heading_path
+            continuation = False
+        elif current and sum(len(part) for part in current) + len(encoded) > max_bytes:
+            flush()
+            current_path = heading_path
+            continuation = True
+        elif not current:
+            current_path = heading_path
+
+        current.append(encoded)
+    flush()
+
+    document = bytearray()
+    entries = []
+    for ordinal, chunk in enumerate(chunks, start=1):
+        start = len(document)
+        for part in chunk["parts"]:
+            document.extend(part)
+        entries.append(
+            {
+                "ordinal": ordinal,
+                "heading_path": chunk["heading_path"],
+                "continuation": chunk["continuation"],
+                "start": start,
+                "end": len(document),
+                "bytes": len(document) - start,
+            }
+        )
+    return document.decode("utf-8"), entries
+
+
+def _document_dir(document_id: str) -> str:
+    return os.path.join(cache_dir("chunks"), document_id)
+
+
+def save_document(document_id: str, text: str, manifest: dict) -> dict:
+    """Cache a chunked document and return its manifest with chunk ids filled in."""
+    for entry in manifest["chunks"]:
+        entry["id"] = chunk_id(document_id, entry["ordinal"])
+    manifest = {"document_id": document_id, **manifest}
+
+    directory = _document_dir(document_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, _CONTENT_FILE), "w", encoding="utf-8", newline="") as handle:
+        handle.write(text)
+    # The manifest is written last, so its presence means the document is complete.
+    with open(os.path.join(directory, _MANIFEST_FILE), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle)
+    return manifest
+
+
+def load_manifest(document_id: str) -> dict | None:
+    """Return the cached manifest for a document, or None if it has not been chunked."""
+    path = os.path.join(_document_dir(document_id), _MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def read_chunk(value: str) -> tuple[dict, dict, str]:
+    """Return the manifest, the entry and the text of one chunk, looked up by chunk id."""
+    document_id, ordinal = _parse_chunk_id(value)
+    manifest = load_manifest(document_id)
+    if manifest is None:
+        raise ValueError(
+            f"No chunked document found for chunk_id: {value}. Convert the source with chunk_max_bytes first"
+        )
+    if not 1 <= ordinal <= len(manifest["chunks"]):
+        raise ValueError(f"Chunk {ordinal} does not exist; document {document_id} has {len(manifest['chunks'])} chunks")
+
+    entry = manifest["chunks"][ordinal - 1]
+    with open(os.path.join(_document_dir(document_id), _CONTENT_FILE), "rb") as handle:
+        handle.seek(entry["start"])
+        text = handle.read(entry["bytes"]).decode("utf-8")
+    return manifest, entry, text
+
+
+def describe_heading_path(entry: dict) -> str:
+    """Render a chunk's heading path for a tool result."""
+    label = " > ".join(entry["heading_path"]) or "(before the first heading)"
+    return f"{label} (continued)" if entry["continuation"] else label
@@ -0,0 +1,191 @@
+"""Documents registered once and referenced by handle.
+
+An agent that converts the same multi-megabyte ``contents`` to html, then docx, then pdf
+sends, encodes and parses that string on every call. ``register-document`` stores the
+source on the server and returns a ``document_id``, which convert-contents and
+inspect-document accept instead of the source.
+
+The id is the SHA-256 of the source, so registering the same source twice gives the same
+id, and the id keys the parsed forms of the document. A document in a text format is read
+into the pandoc JSON AST once, cached under ``ast/`` like a book chapter, and later
+conversions start from the AST.
+
+Documents are held in memory up to ``MCP_PANDOC_DOCUMENT_MEMORY_MB``. Beyond that the
+least recently used are written under ``documents/`` in the cache root and read back on
+their next use. A document unused for ``MCP_PANDOC_DOCUMENT_TTL_SECONDS`` is dropped from
+memory and disk.
+"""
+import collections
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from .book import ast_key, cached_ast_json
+from .cache import cache_dir, sha256_hex
+from .runner import run_pandoc
+
+DOCUMENT_MEMORY_ENV = "MCP_PANDOC_DOCUMENT_MEMORY_MB"
+DEFAULT_DOCUMENT_MEMORY_MB = 256
+
+DOCUMENT_TTL_ENV = "MCP_PANDOC_DOCUMENT_TTL_SECONDS"
+DEFAULT_DOCUMENT_TTL_SECONDS = 3600
+
+_MB = 1024 * 1024
+
+# A document id is a SHA-256 hex digest; nothing else may be looked up among the spill files.
+_DOCUMENT_ID = re.compile(r"[0-9a-f]{64}")
+
+
+@dataclass
+class Document:
+    """A registered source."""
+
+    document_id: str
+    data: bytes
+    text: bool
+    input_format: str | None
+    last_used: float
+
+    @property
+    def contents(self) -> str | bytes:
+        """Return the source as it was registered: text as a string, a blob as bytes."""
+        return self.data.decode("utf-8") if self.text else self.data
+
+
+_documents: collections.OrderedDict[str, Document] = collections.OrderedDict()
+_documents_bytes = 0
+_documents_lock = threading.Lock()
+
+
+def document_memory_mb() -> int:
+    """Return how many megabytes of documents are kept in memory before spilling to disk."""
+    try:
+        return max(0, int(os.environ.get(DOCUMENT_MEMORY_ENV, DEFAULT_DOCUMENT_MEMORY_MB)))
+    except ValueError:
+        return DEFAULT_DOCUMENT_MEMORY_MB
+
+
+def document_ttl_seconds() -> int:
+    """Return how long an unused document is kept."""
+    try:
+        return max(1, int(os.environ.get(DOCUMENT_TTL_ENV, DEFAULT_DOCUMENT_TTL_SECONDS)))
+    except ValueError:
+        return DEFAULT_DOCUMENT_TTL_SECONDS
+
+
+def _spill_dir() -> str:
+    return cache_dir("documents")
+
+
+def _spilled_file(document_id: str) -> str | None:
+    """Return the spill file of a document, named <id>.<format>.<txt|bin>, or None."""
+    prefix = f"{document_id}."
+    for name in os.listdir(_spill_dir()):
+        if name.startswith(prefix) and not name.endswith(".tmp"):
+            return os.path.join(_spill_dir(), name)
+    return None
+
+
+def _forget(document_id: str) -> None:
+    global _documents_bytes
+
+    document = _documents.pop(document_id, None)
+    if document:
+        _documents_bytes -= len(document.data)
+
+
+def _expire(now: float) -> None:
+    """Drop documents in memory and on disk that were not used within the TTL."""
+    cutoff = now - document_ttl_seconds()
+    for document_id in [key for key, document in _documents.items() if document.last_used < cutoff]:
+        _forget(document_id)
+    for entry in os.scandir(_spill_dir()):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _spill() -> None:
+    """Write the least recently used documents to disk until memory is within budget."""
+    budget = document_memory_mb() * _MB
+    # The newest document stays in memory, since it is about to be used
+    while _documents_bytes > budget and len(_documents) > 1:
+        document = next(iter(_documents.values()))
+        name = f"{document.document_id}.{document.input_format or 'unknown'}.{'txt' if document.text else 'bin'}"
+        path = os.path.join(_spill_dir(), name)
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(document.data)
+        os.replace(temp_file, path)
+        # The file's mtime carries the last use across the spill, for the TTL
+        os.utime(path, (document.last_used, document.last_used))
+        _forget(document.document_id)
+
+
+def _keep(document: Document) -> Document:
+    global _documents_bytes
+
+    _documents[document.document_id] = document
+    _documents_bytes += len(document.data)
+    _spill()
+    return document
+
+
+def _load(document_id: str, now: float) -> Document | None:
+    """Move a spilled document back into memory, or return None if there is none."""
+    path = _spilled_file(document_id)
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.unlink(path)
+    except FileNotFoundError:
+        return None
+    _, input_format, kind = os.path.basename(path).split(".")
+    return _keep(Document(document_id, data, kind == "txt", None if input_format == "unknown" else input_format, now))
+
+
+def register_document(contents: str | bytes, input_format: str | None = None) -> tuple[Document, bool]:
+    """Store a source and return it with whether it was new; a known source is only marked as used."""
+    data = contents.encode("utf-8") if isinstance(contents, str) else contents
+    document_id = sha256_hex(data)
+    now = time.time()
+    with _documents_lock:
+        _expire(now)
+        document = _documents.get(document_id) or _load(document_id, now)
+        if document:
+            document.last_used = now
+            document.input_format = input_format or document.input_format
+            _documents.move_to_end(document_id)
+            return document, False
+        return _keep(Document(document_id, data, isinstance(contents, str), input_format, now)), True
+
+
+def get_document(document_id: str) -> Document:
+    """Return a registered document, raising ValueError if it is unknown or expired."""
+    now = time.time()
+    with _documents_lock:
+        _expire(now)
+        valid = isinstance(document_id, str) and _DOCUMENT_ID.fullmatch(document_id)
+        document = valid and (_documents.get(document_id) or _load(document_id, now))
+        if not document:
+            raise ValueError(
+                f"Unknown document_id: {document_id}. It was never registered, or it was not used for "
+                f"{document_ttl_seconds()} seconds and expired. Register the document again."
+            )
+        document.last_used = now
+        _documents.move_to_end(document_id)
+        return document
+
+
+def document_ast(document: Document, reader: str) -> tuple[str, bool]:
+    """Return the document's AST as JSON, parsed once per reader, and whether it came from the cache."""
+    return cached_ast_json(
+        ast_key(document.document_id, reader),
+        lambda: run_pandoc("json", source=document.data, input_format=reader),
+    )
@@ -0,0 +1,162 @@
+r"""Draft PDFs for checking layout.
+
+A full PDF build runs xelatex until its cross-references settle, up to three passes, loads
+fontspec and unicode-math with OpenType fonts, and reads every image. An agent that only
+wants to see how a document lays out pays for all of that, then builds the PDF again for
+real. With ``draft`` pandoc writes standalone LaTeX, and the TeX engine runs once on it:
+
+* pdflatex when it is installed, with pandoc's Latin Modern and T1 font setup, otherwise
+  xelatex,
+* a single pass, so the table of contents and cross-references stay empty,
+* every ``\includegraphics`` drawn as a fixed-size placeholder box, so no image is read,
+* with ``draft_pages``, pages after the first N are discarded instead of written,
+* "DRAFT" printed at the top of every page.
+
+The engine runs in nonstop mode, so a TeX error that would stop a full build is reported
+with the result and the draft is written anyway, as long as TeX produced a PDF. The page
+label and page cap need LaTeX 2020-10 or later and are left out on older formats.
+"""
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+from dataclasses import dataclass
+
+from .runner import ResourceLimitError, ResourceLimits, run_pandoc
+from .tracing import argv_summary, tracer
+
+# Engines tried in order. pdflatex uses Type 1 fonts and skips fontspec entirely.
+DRAFT_ENGINES = ("pdflatex", "xelatex")
+
+_JOB_NAME = "draft"
+
+# Redefined once the preamble's packages are loaded, so it replaces pandoc's own setup.
+_PLACEHOLDER = r"""\AtBeginDocument{\renewcommand{\includegraphics}[2][]{%
+  \fbox{\parbox[c][0.2\textheight][c]{0.5\linewidth}{\centering\footnotesize\sffamily image placeholder}}}}"""
+
+# LaTeX 2020-10 hooks: a label at the top of every page, and discarding pages past the cap.
+_LABEL = (
+    r"\AddToHook{shipout/foreground}{\put(0,-24){\makebox[\paperwidth]"
+    r"{\normalfont\footnotesize\sffamily\bfseries DRAFT: single pass, placeholder images}}}%"
+)
+_PAGE_CAP = r"\AddToHook{shipout/before}{\ifnum\value{page}>%d\relax\DiscardShipoutBox\fi}%%"
+
+# "! Undefined control sequence." and its file:line: form.
+_TEX_ERROR = re.compile(r"^(?:!|\S+:\d+:) .*", re.MULTILINE)
+
+
+@dataclass
+class DraftReport:
+    """How one draft PDF was built."""
+
+    engine: str
+    max_pages: int | None = None
+    tex_errors: int = 0
+
+    def summary(self) -> str:
+        """Describe the draft for the tool result."""
+        pages = f", first {self.max_pages} pages only" if self.max_pages else ""
+        summary = (
+            f"Draft PDF: one {self.engine} pass, images replaced by placeholders{pages}. The table of contents and "
+            f"cross-references are left empty. Convert without draft for the final PDF."
+        )
+        if self.tex_errors:
+            errors = "1 error" if self.tex_errors == 1 else f"{self.tex_errors} errors"
+            summary += f"\nTeX reported {errors}; the draft was written anyway."
+        return summary
+
+
+def draft_engine() -> str:
+    """Return the first draft engine on PATH, raising ValueError if there is none."""
+    for engine in DRAFT_ENGINES:
+        if shutil.which(engine):
+            return engine
+    raise ValueError(
+        "Draft PDFs need pdflatex or xelatex on PATH. Install TeX Live as described for PDF conversion."
+    )
+
+
+def draft_preamble(max_pages: int | None) -> str:
+    """Return the LaTeX added to the document's preamble for a draft."""
+    hooks = [_LABEL, _PAGE_CAP % max_pages] if max_pages else [_LABEL]
+    return "\n".join([
+        _PLACEHOLDER, r"\makeatletter", r"\@ifl@t@r\fmtversion{2020/10/01}{%", *hooks, "}{}", r"\makeatother", "",
+    ])
+
+
+def _run_tex(engine: str, scratch_dir: str, env: dict, limits: ResourceLimits) -> tuple[int, str]:
+    """Run one TeX pass over the draft in scratch_dir and return its exit code and log."""
+    argv = [engine, "-interaction=nonstopmode", "-file-line-error", f"{_JOB_NAME}.tex"]
+    with tracer.start_as_current_span("tex", attributes={"process.command_line": argv_summary(argv)}) as span:
+        process = subprocess.Popen(  # noqa: S603
+            limits.wrap(argv),
+            cwd=scratch_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        span.set_attribute("process.pid", process.pid)
+        returncode = process.wait()
+        span.set_attribute("process.exit.code", returncode)
+
+    file_too_large = hasattr(signal, "SIGXFSZ") and returncode == -signal.SIGXFSZ
+    if limits.output_mb and file_too_large:
+        raise ResourceLimitError("output", f"{engine} output exceeded the {limits.output_mb} MB output size limit")
+    if limits.cpu_seconds and hasattr(signal, "SIGXCPU") and returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        raise ResourceLimitError("cpu", f"{engine} exceeded the {limits.cpu_seconds} second CPU time limit")
+
+    try:
+        with open(os.path.join(scratch_dir, f"{_JOB_NAME}.log"), encoding="utf-8", errors="replace") as f:
+            log = f.read()
+    except FileNotFoundError:
+        log = ""
+    return returncode, log
+
+
+def render_draft_pdf(
+    outputfile: str,
+    *,
+    source: str | bytes | None = None,
+    input_file: str | None = None,
+    input_format: str | None = None,
+    extra_args=(),
+    max_pages: int | None = None,
+) -> DraftReport:
+    """Write a draft PDF of the source to outputfile with one TeX pass."""
+    engine = draft_engine()
+    limits = ResourceLimits.from_env()
+    scratch_dir = tempfile.mkdtemp(prefix="mcp-pandoc-draft-")
+    try:
+        header = os.path.join(scratch_dir, "draft-header.tex")
+        with open(header, "w", encoding="utf-8") as f:
+            f.write(draft_preamble(max_pages))
+        # Last, so a defaults file cannot turn the LaTeX back into a PDF or send it to a file
+        latex = run_pandoc(
+            "latex",
+            source=source,
+            input_file=input_file,
+            input_format=input_format,
+            extra_args=[*extra_args, "--standalone", "--to=latex", "--output=-", f"--include-in-header={header}"],
+            limits=limits,
+        )
+        with open(os.path.join(scratch_dir, f"{_JOB_NAME}.tex"), "w", encoding="utf-8") as f:
+            f.write(latex)
+
+        # Files the document \input's are still found next to the source
+        env = os.environ.copy()
+        source_dir = os.path.dirname(os.path.abspath(input_file)) if input_file else os.getcwd()
+        env["TEXINPUTS"] = f"{source_dir}{os.pathsep}{env.get('TEXINPUTS', '')}{os.pathsep}"
+        returncode, log = _run_tex(engine, scratch_dir, env, limits)
+
+        pdf = os.path.join(scratch_dir, f"{_JOB_NAME}.pdf")
+        errors = _TEX_ERROR.findall(log)
+        if not os.path.exists(pdf):
+            details = "\n".join(errors[:5]) or f"exit code {returncode}"
+            raise RuntimeError(f"{engine} produced no draft PDF: {details}")
+        shutil.move(pdf, outputfile)
+        return DraftReport(engine, max_pages, len(errors))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
@@ -0,0 +1,429 @@
+"""A forkserver for Python pandoc filters.
+
+pandoc runs every filter in ``filters`` as a separate executable, so a Python filter pays
+for interpreter startup and for importing panflute or pandocfilters on every conversion,
+typically 100-300 ms. Instead, the server starts one forkserver per Python interpreter
+named in a filter's ``#!`` line, with those libraries already imported, and gives pandoc
+a small shim in place of the filter. The shim starts with ``-S``. It hands its standard
+streams, arguments, working directory, environment and resource limits to the forkserver
+over a Unix socket. The forkserver forks a monitor, which forks again to run the
+unchanged script as ``__main__`` and waits for it. The shim exits with the filter's
+status, or 128 plus the signal that stopped it, and records the filter's CPU time and
+peak RSS for the runner to add to the job.
+
+If the forkserver cannot be reached, the shim runs the filter itself, so a filter never
+fails because of it. Filters whose ``#!`` line is not a plain Python interpreter, such
+as ``#!/usr/bin/env -S python3 -u``, are passed to pandoc as they are. POSIX only, and
+off unless ``MCP_PANDOC_FILTER_FORKSERVER=on``. List extra modules to import ahead of
+time in ``MCP_PANDOC_FILTER_PRELOAD``.
+
+The forkserver is this file, run by path with the filter's interpreter, so it imports
+only the standard library.
+"""
+from __future__ import annotations
+
+import array
+import ast
+import atexit
+import contextlib
+import functools
+import gc
+import hashlib
+import os
+import runpy
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+FORKSERVER_ENV = "MCP_PANDOC_FILTER_FORKSERVER"
+PRELOAD_ENV = "MCP_PANDOC_FILTER_PRELOAD"
+# Set for pandoc by the runner: the file shims append their filters' CPU seconds and peak RSS to
+USAGE_ENV = "MCP_PANDOC_FILTER_USAGE"
+
+# Imported by every forkserver; missing ones are skipped.
+DEFAULT_PRELOAD = ("json", "io", "codecs", "panflute", "pandocfilters")
+
+# Limits pandoc's children inherit from the job, re-applied to the forked filter.
+_LIMITS = ("RLIMIT_AS", "RLIMIT_CPU", "RLIMIT_FSIZE")
+
+# How long a new forkserver gets to import its modules before filters run directly.
+_START_TIMEOUT_SECONDS = 10
+
+# How often an idle forkserver checks that the server that started it is still there.
+_PARENT_CHECK_SECONDS = 2
+
+_SHIM = """#!{interpreter} -S
+# Runs {script} in the mcp-pandoc filter forkserver; see mcp_pandoc/forkserver.py
+# _socket rather than socket, whose enum and selectors imports would double the startup time
+import _socket, array, os, resource, sys
+SCRIPT = {script!r}
+try:
+    limits = dict((name, resource.getrlimit(getattr(resource, name))) for name in {limits!r})
+    request = repr((SCRIPT, sys.argv[1:], os.getcwd(), dict(os.environ), limits)).encode("utf-8")
+    conn = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    conn.connect({socket_path!r})
+    fds = array.array("i", [0, 1, 2]).tobytes()
+    sent = conn.sendmsg([request], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+    conn.sendall(request[sent:])
+    conn.shutdown(_socket.SHUT_WR)
+except OSError:
+    os.execv({interpreter!r}, [{interpreter!r}, SCRIPT] + sys.argv[1:])
+reply = b""
+while True:
+    chunk = conn.recv(64)
+    if not chunk:
+        break
+    reply += chunk
+# The filter's exit status, or 128 plus the signal that stopped it, then its CPU seconds and peak RSS in KB
+reply = reply.split()
+if len(reply) != 3 or not reply[0].isdigit():
+    sys.exit(1)
+if {usage_env!r} in os.environ:
+    try:
+        usage = os.open(os.environ[{usage_env!r}], os.O_WRONLY | os.O_APPEND)
+        os.write(usage, reply[1] + b" " + reply[2] + b"\\n")
+        os.close(usage)
+    except OSError:
+        pass
+sys.exit(int(reply[0]))
+"""
+
+
+class _Forkserver:
+    def __init__(self, interpreter: str, socket_path: str):
+        self.interpreter = interpreter
+        self.socket_path = socket_path
+        self.process: subprocess.Popen | None = None
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None and os.path.exists(self.socket_path)
+
+    def start(self) -> bool:
+        """Start the forkserver and wait until it listens; return whether it does."""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        preload = [*DEFAULT_PRELOAD, *filter(None, os.environ.get(PRELOAD_ENV, "").split(","))]
+        self.process = subprocess.Popen(  # noqa: S603
+            [self.interpreter, os.path.abspath(__file__), self.socket_path, str(os.getpid()), *preload],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + _START_TIMEOUT_SECONDS
+        while time.monotonic() < deadline and self.process.poll() is None:
+            if os.path.exists(self.socket_path):
+                return True
+            time.sleep(0.01)
+        self.stop()
+        return False
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+_runtime_dir: str | None = None
+_servers: dict[str, _Forkserver] = {}
+_servers_lock = threading.Lock()
+# The filter script behind each shim.
+_scripts: dict[str, str] = {}
+
+
+def forkserver_enabled() -> bool:
+    """Return whether Python filters are run through a forkserver."""
+    if os.name != "posix" or not hasattr(os, "fork"):
+        return False
+    return os.environ.get(FORKSERVER_ENV, "off").strip().lower() in ("1", "on", "true", "yes")
+
+
+@functools.lru_cache(maxsize=32)
+def _resolve_interpreter(command: str) -> str | None:
+    """Return the real executable behind a command such as python3, which may be a pyenv or venv shim."""
+    try:
+        completed = subprocess.run(  # noqa: S603
+            [command, "-c", "import sys; print(sys.executable)"],
+            capture_output=True, text=True, timeout=30, check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def python_interpreter(filter_path: str) -> str | None:
+    """Return the Python executable a filter's #! line runs it with, or None if it is not plain Python."""
+    try:
+        with open(filter_path, "rb") as f:
+            first_line = f.readline(512)
+    except OSError:
+        return None
+    if not first_line.startswith(b"#!"):
+        return None
+    words = first_line[2:].decode("utf-8", errors="replace").split()
+    if words and os.path.basename(words[0]) == "env":
+        words = words[1:]
+    # Interpreter options such as -u would have to be replayed in the fork, so those filters run as they are
+    if len(words) != 1 or not os.path.basename(words[0]).startswith("python"):
+        return None
+    return _resolve_interpreter(words[0])
+
+
+def _cleanup() -> None:
+    with _servers_lock:
+        for server in _servers.values():
+            server.stop()
+        _servers.clear()
+        _scripts.clear()
+    if _runtime_dir:
+        shutil.rmtree(_runtime_dir, ignore_errors=True)
+
+
+def filter_command(filter_path: str) -> str:
+    """Return the path to give pandoc for a filter: a forkserver shim for a Python filter, else the filter."""
+    global _runtime_dir
+
+    if not forkserver_enabled():
+        return filter_path
+    interpreter = python_interpreter(filter_path)
+    if not interpreter:
+        return filter_path
+
+    script = os.path.abspath(filter_path)
+    with _servers_lock:
+        if _runtime_dir is None:
+            # Socket paths are limited to about 100 bytes, so they live in a short temporary directory
+            _runtime_dir = tempfile.mkdtemp(prefix="mcp-pandoc-filters-")
+            atexit.register(_cleanup)
+        server = _servers.get(interpreter)
+        if server is None:
+            server = _servers[interpreter] = _Forkserver(
+                interpreter, os.path.join(_runtime_dir, f"{len(_servers)}.sock")
+            )
+        if not server.running() and not server.start():
+            return filter_path
+
+        # Named after the filter, in a directory per script, so pandoc's log still names the filter
+        shim_dir = os.path.join(_runtime_dir, hashlib.sha256(f"{interpreter}\0{script}".encode()).hexdigest()[:16])
+        shim = os.path.join(shim_dir, os.path.basename(script))
+        if not os.path.exists(shim):
+            os.makedirs(shim_dir, exist_ok=True)
+            content = _SHIM.format(
+                interpreter=interpreter, script=script, socket_path=server.socket_path, limits=_LIMITS,
+                usage_env=USAGE_ENV,
+            )
+            temp_file = f"{shim}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.chmod(temp_file, 0o700)
+            os.replace(temp_file, shim)
+        _scripts[shim] = script
+    return shim
+
+
+def original_filter(path: str) -> str:
+    """Return the filter script a shim stands in for, or path itself if it is not a shim."""
+    return _scripts.get(path, path)
+
+
+def restore_filter_paths(text: str) -> str:
+    """Replace every shim path in text, such as pandoc's error output, with the filter it stands in for."""
+    with _servers_lock:
+        scripts = list(_scripts.items())
+    for shim, script in scripts:
+        text = text.replace(shim, script)
+    return text
+
+
+def usage_file(argv) -> str | None:
+    """Return a new, empty file for the shims in argv to record their filters' usage in, or None if there are none.
+
+    A forked filter is not a child of pandoc, so its CPU time and peak RSS are missing from
+    pandoc's own usage. Name the file in ``USAGE_ENV`` for pandoc, and add it up with
+    ``read_usage`` once pandoc exits.
+    """
+    with _servers_lock:
+        if _runtime_dir is None or not any(arg in _scripts for arg in argv):
+            return None
+        fd, path = tempfile.mkstemp(prefix="usage-", dir=_runtime_dir)
+    os.close(fd)
+    return path
+
+
+def read_usage(path: str) -> tuple[float, int]:
+    """Return the total CPU seconds and the largest peak RSS in KB recorded in a usage file, and remove it."""
+    cpu_seconds, peak_rss_kb = 0.0, 0
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                cpu, rss = line.split()
+                cpu_seconds += float(cpu)
+                peak_rss_kb = max(peak_rss_kb, int(rss))
+    except (OSError, ValueError):
+        pass
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+    return cpu_seconds, peak_rss_kb
+
+
+def shutdown() -> None:
+    """Stop every forkserver and remove the shims."""
+    global _runtime_dir
+
+    _cleanup()
+    _runtime_dir = None
+
+
+# Everything below runs in the forkserver and its children, under the filter's interpreter.
+
+
+def _exit_code(code) -> int:
+    """Turn a SystemExit code into a process exit status, as the interpreter does."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_filter(request: tuple, fds: list[int]) -> None:
+    """Run one filter in this forked process and exit with its status."""
+    code = 1
+    try:
+        script, arguments, cwd, environment, limits = request
+        import resource
+
+        for name, value in limits.items():
+            resource.setrlimit(getattr(resource, name), value)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environment)
+        sys.argv = [script, *arguments]
+        sys.path.insert(0, os.path.dirname(script))
+        try:
+            runpy.run_path(script, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            code = _exit_code(e.code)
+        # Streams the filter wrapped around stdout are flushed when they are collected
+        gc.collect()
+        sys.stdout.flush()
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stderr.flush()
+        finally:
+            os._exit(code & 0xFF)
+
+
+def _monitor(conn: socket.socket, request: tuple, fds: list[int]) -> None:
+    """Fork the filter, wait for it, report its status and resource usage on conn and exit.
+
+    The filter runs one fork further down so that this process can reap it with
+    ``os.wait4``, which gives the shim a status like a shell's, 128 plus the signal for a
+    filter stopped by a limit, and the usage pandoc would otherwise have counted.
+    """
+    status, cpu_seconds, peak_rss_kb = 1, 0.0, 0
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            _run_filter(request, fds)
+        for fd in fds:
+            os.close(fd)
+        _, wait_status, usage = os.wait4(pid, 0)
+        if os.WIFSIGNALED(wait_status):
+            status = 128 + os.WTERMSIG(wait_status)
+        else:
+            status = os.WEXITSTATUS(wait_status)
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        # ru_maxrss is in bytes on macOS and in KB elsewhere
+        peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            conn.sendall(f"{status} {cpu_seconds:.6f} {peak_rss_kb}".encode())
+        finally:
+            os._exit(0)
+
+
+def _receive(conn: socket.socket) -> tuple[tuple, list[int]]:
+    """Read one request and the three standard stream descriptors that came with it."""
+    fds = array.array("i")
+    data, ancillary, _, _ = conn.recvmsg(65536, socket.CMSG_SPACE(3 * fds.itemsize))
+    for level, kind, payload in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[: len(payload) - len(payload) % fds.itemsize])
+    chunks = [data]
+    while chunk := conn.recv(65536):
+        chunks.append(chunk)
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError(f"expected 3 file descriptors, got {len(fds)}")
+    return ast.literal_eval(b"".join(chunks).decode("utf-8")), list(fds)
+
+
+def serve(socket_path: str, parent_pid: int, preload: list[str]) -> None:
+    """Import the preload modules, then fork a monitor per filter run until the parent exits."""
+    # Run by path, this package's own directory would shadow modules the filters import
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+    for name in preload:
+        try:
+            __import__(name)
+        except Exception:  # noqa: BLE001, S112
+            continue
+    # Preloaded objects are never collected, so the children's collections skip them and their pages stay shared
+    gc.freeze()
+    # Monitors are reaped by the kernel; each one reports its filter's status to the shim
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    temp_path = f"{socket_path}.tmp"
+    listener.bind(temp_path)
+    listener.listen(64)
+    listener.settimeout(_PARENT_CHECK_SECONDS)
+    # Renamed once listening, so the server never connects before the forkserver is ready
+    os.rename(temp_path, socket_path)
+
+    while os.getppid() == parent_pid:
+        try:
+            conn, _ = listener.accept()
+        except socket.timeout:  # noqa: UP041 - only an alias of TimeoutError from 3.10 on
+            continue
+        conn.settimeout(None)
+        try:
+            request, fds = _receive(conn)
+        except (OSError, ValueError, SyntaxError):
+            conn.close()
+            continue
+        if os.fork() == 0:
+            listener.close()
+            _monitor(conn, request, fds)
+        # The parent must not hold pandoc's pipes open, or pandoc never sees the filter finish
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+    listener.close()
+    os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], int(sys.argv[2]), sys.argv[3:])
@@ -0,0 +1,217 @@
+"""Downscaling and recompressing the images inside docx, pptx and epub outputs.
+
+pandoc embeds images byte for byte, so a screenshot taken at full camera or retina
+resolution makes a docx or pptx tens of megabytes, most of which no reader ever sees at
+that size. After pandoc has written the package, each PNG and JPEG in it is scaled down
+to ``image_max_pixels`` on its longer edge and, in docx and pptx, to ``image_dpi`` at the
+size it is displayed, then saved again: JPEG at quality 85, progressive, and PNG with
+Pillow's optimizer. An image keeps its format, name and displayed size, and is only
+replaced when the new bytes are smaller.
+
+Results are cached under ``images/`` in the cache root, keyed by the image's SHA-256 and
+the target size, so an unchanged image is never decoded again; only its header is read.
+Animated images and other formats are left alone.
+
+Needs Pillow, installed with ``mcp-pandoc[images]``.
+"""
+import io
+import os
+import threading
+import zipfile
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+from .cache import cache_dir, sha256_hex
+
+# Outputs whose images are optimized, and the ones that record displayed sizes for image_dpi.
+IMAGE_OUTPUT_FORMATS = ("docx", "pptx", "epub")
+DISPLAY_SIZE_FORMATS = ("docx", "pptx")
+
+JPEG_QUALITY = 85
+
+_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# DrawingML sizes are in English Metric Units.
+_EMU_PER_INCH = 914400
+
+_RELATIONSHIPS_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+_MB = 1024 * 1024
+
+# Marks an image that recompressing did not make smaller.
+_KEEP = b""
+
+
+def _size(size: int) -> str:
+    return f"{size / _MB:.1f} MB" if size >= _MB else f"{size / 1024:.0f} KB"
+
+
+@dataclass
+class ImageReport:
+    """What optimizing one output's images did."""
+
+    images: int = 0
+    optimized: int = 0
+    cached: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    def summary(self) -> str:
+        """Describe the optimization for the tool result."""
+        if not self.images:
+            return "Images: none to optimize."
+        return (
+            f"Images: {self.optimized} of {self.images} made smaller ({self.cached} from the cache), "
+            f"{_size(self.bytes_before)} to {_size(self.bytes_after)}, "
+            f"{_size(self.bytes_before - self.bytes_after)} saved."
+        )
+
+
+def pillow_available() -> bool:
+    """Return whether Pillow can be imported."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def display_sizes(package: zipfile.ZipFile) -> dict[str, tuple[int, int]]:
+    """Return the largest size, in EMU, each image of a docx or pptx is displayed at, by entry name."""
+    names = set(package.namelist())
+    sizes: dict[str, tuple[int, int]] = {}
+    for name in names:
+        directory, base = os.path.split(name)
+        rels_name = f"{directory}/_rels/{base}.rels" if directory else f"_rels/{base}.rels"
+        if not name.endswith(".xml") or rels_name not in names:
+            continue
+        part = package.read(name)
+        if b"blip" not in part:
+            continue
+        # The package was just written by pandoc, not taken from the client
+        relationships = ElementTree.fromstring(package.read(rels_name))  # noqa: S314
+        targets = {
+            relationship.get("Id"): os.path.normpath(os.path.join(directory, relationship.get("Target", "")))
+            for relationship in relationships
+        }
+        # A picture holds the image reference (a:blip) and the size it is drawn at (a:xfrm/a:ext)
+        for picture in ElementTree.fromstring(part).iter():  # noqa: S314
+            if _local_name(picture.tag) != "pic":
+                continue
+            blip = next((e for e in picture.iter() if _local_name(e.tag) == "blip"), None)
+            extent = next((e for e in picture.iter() if _local_name(e.tag) == "ext" and "cx" in e.attrib), None)
+            target = targets.get(blip.get(f"{_RELATIONSHIPS_NS}embed")) if blip is not None else None
+            if target is None or extent is None:
+                continue
+            width, height = int(extent.get("cx", 0)), int(extent.get("cy", 0))
+            known = sizes.get(target, (0, 0))
+            sizes[target] = (max(known[0], width), max(known[1], height))
+    return sizes
+
+
+def _target_size(
+    size: tuple[int, int], displayed: tuple[int, int] | None, dpi: int | None, max_pixels: int | None
+) -> tuple[int, int]:
+    """Return the size an image is scaled to: never up, and never below what its display needs."""
+    width, height = size
+    scale = 1.0
+    if max_pixels:
+        scale = min(scale, max_pixels / max(width, height))
+    if dpi and displayed and all(displayed):
+        needed = max(displayed[0] / _EMU_PER_INCH * dpi / width, displayed[1] / _EMU_PER_INCH * dpi / height)
+        scale = min(scale, needed)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _recompress(data: bytes, image_format: str, size: tuple[int, int]) -> bytes:
+    """Scale and save an image again in its own format; return _KEEP unless that made it smaller."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        options = {"icc_profile": image.info.get("icc_profile")}
+        if image_format == "JPEG":
+            # EXIF carries the orientation the image is shown in
+            options.update(quality=JPEG_QUALITY, optimize=True, progressive=True, exif=image.info.get("exif", b""))
+        else:
+            options.update(optimize=True)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format=image_format, **{key: value for key, value in options.items() if value is not None})
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(data) else _KEEP
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(cache_dir("images"), key)
+
+
+def _optimize(data: bytes, displayed, dpi, max_pixels) -> tuple[bytes, bool]:
+    """Return the optimized bytes of one image, or data itself, and whether the result came from the cache."""
+    import PIL
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format, size, frames = image.format, image.size, getattr(image, "n_frames", 1)
+    except (OSError, Image.DecompressionBombError):
+        return data, False
+    if image_format not in ("JPEG", "PNG") or frames > 1:
+        return data, False
+
+    target = _target_size(size, displayed, dpi, max_pixels)
+    path = _cache_path(f"{sha256_hex(data)}-{target[0]}x{target[1]}-q{JPEG_QUALITY}-pillow{PIL.__version__}")
+    try:
+        with open(path, "rb") as f:
+            return f.read() or data, True
+    except FileNotFoundError:
+        pass
+
+    try:
+        optimized = _recompress(data, image_format, target)
+    except (OSError, ValueError):
+        optimized = _KEEP
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, "wb") as f:
+        f.write(optimized)
+    os.replace(temp_file, path)
+    return optimized or data, False
+
+
+def optimize_images(
+    path: str, output_format: str, dpi: int | None = None, max_pixels: int | None = None
+) -> ImageReport:
+    """Downscale and recompress the images of the docx, pptx or epub at path, rewriting it in place."""
+    report = ImageReport()
+    with zipfile.ZipFile(path) as package:
+        entries = package.infolist()
+        if not any(entry.filename.lower().endswith(_IMAGE_EXTENSIONS) for entry in entries):
+            return report
+        sizes = display_sizes(package) if dpi and output_format in DISPLAY_SIZE_FORMATS else {}
+        temp_file = f"{path}.images.tmp"
+        try:
+            # Entries keep their order, dates and compression; an epub's stored mimetype stays first
+            with zipfile.ZipFile(temp_file, "w") as rewritten:
+                for entry in entries:
+                    data = package.read(entry)
+                    if entry.filename.lower().endswith(_IMAGE_EXTENSIONS):
+                        report.images += 1
+                        report.bytes_before += len(data)
+                        displayed = sizes.get(os.path.normpath(entry.filename))
+                        optimized, cached = _optimize(data, displayed, dpi, max_pixels)
+                        report.cached += cached
+                        report.optimized += optimized is not data
+                        report.bytes_after += len(optimized)
+                        data = optimized
+                    rewritten.writestr(entry, data)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+    os.replace(temp_file, path)
+    return report
@@ -0,0 +1,242 @@
+"""Incremental markdown rendering for edit-and-preview loops.
+
+An agent that edits one paragraph of a large markdown file and converts it again pays for
+the whole document. With ``incremental`` the source is split into sections at ATX
+headings (``#``), outside fenced code and fenced divs, and each section's output is kept
+in memory by its content hash. Only the sections that changed are sent to pandoc, all in
+one run with a marker paragraph between them, and the cached outputs are joined the way
+the writer joins blocks.
+
+The HTML writer numbers code blocks without an identifier across the document, for the
+``cb1`` ids of highlighted ones. For html the changed sections go through the JSON AST,
+which gives each section's count of such blocks, and the ids of every section are
+shifted by the blocks before it when the output is joined.
+
+Sections are only independent when nothing in one changes the output of another. The
+whole document is converted normally, and the result says why, when the source has:
+
+* a metadata block or title block,
+* reference link or footnote definitions, or inline footnotes,
+* bracketed text that matches a heading title, which pandoc turns into a link to it,
+* example lists, whose numbers run across the document,
+* LaTeX macro definitions,
+* raw HTML blocks, which can span headings,
+* headings that may get the same identifier, since pandoc numbers repeats in order.
+"""
+import collections
+import json
+import re
+import secrets
+import threading
+from dataclasses import dataclass
+
+from .cache import sha256_hex
+from .runner import pandoc_identity, run_pandoc
+
+# Writers whose output is the concatenation of their blocks' output.
+INCREMENTAL_FORMATS = ("html", "markdown")
+
+# How the writers separate top-level blocks.
+_BLOCK_SEPARATORS = {"html": "\n", "markdown": "\n\n"}
+
+# Rendered sections kept in memory, in bytes of output.
+_CACHE_BYTES = 64 * 1024 * 1024
+
+_ATX_HEADING = re.compile(r"^#{1,6}(?:\s|$)")
+_CODE_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_DIV_FENCE = re.compile(r"^:{3,}")
+_DEFINITION = re.compile(r"^ {0,3}\[[^\]\n]+\]:", re.MULTILINE)
+_SETEXT_UNDERLINE = re.compile(r"^(?:=+|-+)\s*$")
+_ATTRIBUTES = re.compile(r"\{[^}]*\}\s*$")
+_BRACKETED = re.compile(r"\[([^\]\n]+)\]")
+_LATEX_MACRO = re.compile(r"\\(?:re)?newcommand|\\def\b")
+
+# The ids the HTML writer derives from its code block counter.
+_CODE_BLOCK_ID = re.compile(r'\b(id="|href="#)cb(\d+)(-\d+)?"')
+
+# Rendered sections, with the number of code blocks without an identifier in each.
+_rendered: collections.OrderedDict[str, tuple[str, int]] = collections.OrderedDict()
+_rendered_bytes = 0
+_rendered_lock = threading.Lock()
+
+
+def _split(text: str) -> tuple[list[str], list[str]]:
+    """Split markdown into sections at ATX headings outside fences, and list every heading line."""
+    sections: list[list[str]] = [[]]
+    headings: list[str] = []
+    fence = None
+    div_depth = 0
+    previous = ""
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        if fence:
+            if stripped.lstrip(" ").startswith(fence) and not stripped.strip(fence[0] + " "):
+                fence = None
+        elif match := _CODE_FENCE.match(stripped):
+            fence = match.group(1)
+        elif _DIV_FENCE.match(stripped):
+            div_depth = max(0, div_depth - 1) if not stripped.strip(": ") else div_depth + 1
+        elif _ATX_HEADING.match(stripped):
+            headings.append(stripped)
+            if div_depth == 0 and not previous.strip() and sections[-1]:
+                sections.append([])
+        elif _SETEXT_UNDERLINE.match(stripped) and previous.strip():
+            headings.append(previous)
+        sections[-1].append(line)
+        previous = stripped
+    return ["".join(lines) for lines in sections if lines], headings
+
+
+def split_sections(text: str) -> list[str]:
+    """Split markdown into sections, each starting at an ATX heading outside fences."""
+    return _split(text)[0]
+
+
+def _title_key(title: str) -> str:
+    """Return a key at least as coarse as pandoc's identifier: titles with equal ids have equal keys."""
+    letters = "".join(char for char in title.lower() if char.isalnum())
+    return letters.lstrip("0123456789") or "section"
+
+
+def _heading_key(line: str) -> str:
+    attributes = _ATTRIBUTES.search(line)
+    explicit = re.search(r"#([^\s}]+)", attributes.group(0)) if attributes else None
+    if explicit:
+        return _title_key(explicit.group(1))
+    return _title_key(_ATTRIBUTES.sub("", line.lstrip("#")).strip(" #"))
+
+
+def cross_block_reason(text: str) -> str | None:
+    """Return why the sections of a document cannot be rendered on their own, or None if they can."""
+    lines = text.splitlines()
+    if lines and (lines[0].startswith("%") or lines[0].rstrip() == "---"):
+        return "it starts with a metadata block"
+    for index, line in enumerate(lines[1:-1], start=1):
+        # A YAML block may appear anywhere after a blank line; a thematic break is followed by one
+        if line.rstrip() == "---" and not lines[index - 1].strip() and lines[index + 1].strip():
+            return "it has a metadata block"
+    if _DEFINITION.search(text):
+        return "it defines reference links or footnotes"
+    if "^[" in text:
+        return "it has inline footnotes"
+    if "(@" in text:
+        return "it has example lists"
+    if _LATEX_MACRO.search(text):
+        return "it defines LaTeX macros"
+    if any(line.startswith("<") for line in lines):
+        return "it has raw HTML blocks"
+
+    headings = _split(text)[1]
+    keys = [_heading_key(line) for line in headings]
+    if len(set(keys)) != len(keys):
+        return "headings may share an identifier"
+    # Without reference definitions, a bracketed title is the only link from one section to another
+    titles = {_title_key(_ATTRIBUTES.sub("", line.lstrip("#")).strip(" #")) for line in headings}
+    if any(_title_key(label) in titles for label in _BRACKETED.findall(text)):
+        return "it links to headings by their titles"
+    return None
+
+
+@dataclass
+class IncrementalReport:
+    """How one incremental conversion was done."""
+
+    sections: int = 0
+    rendered: int = 0
+    fallback_reason: str | None = None
+
+    def summary(self) -> str:
+        """Describe the conversion for the tool result."""
+        if self.fallback_reason:
+            return f"Incremental: converted in full because {self.fallback_reason}."
+        return f"Incremental: {self.rendered} of {self.sections} sections rendered, the rest from the cache."
+
+
+def _remember(key: str, rendered: tuple[str, int]) -> None:
+    global _rendered_bytes
+
+    with _rendered_lock:
+        if key in _rendered:
+            return
+        _rendered[key] = rendered
+        _rendered_bytes += len(rendered[0])
+        while _rendered_bytes > _CACHE_BYTES and _rendered:
+            _rendered_bytes -= len(_rendered.popitem(last=False)[1][0])
+
+
+def _unnamed_code_blocks(node) -> int:
+    """Count the code blocks without an identifier in an AST node, which advance the HTML writer's counter."""
+    if isinstance(node, list):
+        return sum(_unnamed_code_blocks(item) for item in node)
+    if not isinstance(node, dict):
+        return 0
+    if node.get("t") == "CodeBlock":
+        return 0 if node["c"][0][0] else 1
+    return _unnamed_code_blocks(node.get("c"))
+
+
+def _shift_code_block_ids(output: str, offset: int) -> str:
+    if not offset:
+        return output
+    return _CODE_BLOCK_ID.sub(
+        lambda match: f'{match.group(1)}cb{int(match.group(2)) + offset}{match.group(3) or ""}"', output
+    )
+
+
+def _render_sections(sections: list[str], to: str) -> list[tuple[str, int]]:
+    """Render sections in one pandoc run and return each one's output and unnamed code block count.
+
+    Html output is numbered from the section's first code block, as if the section came first.
+    """
+    token = f"MCPPANDOCSECTIONBREAK{secrets.token_hex(8).upper()}"
+    # Every section ends its blocks before the marker paragraph, which starts at a blank line
+    source = f"\n\n{token}\n\n".join(section.rstrip("\n") for section in sections)
+    counts = [0] * len(sections)
+    if to == "html":
+        ast = run_pandoc("json", source=source, input_format="markdown")
+        position = 0
+        for block in json.loads(ast)["blocks"]:
+            if block["t"] == "Para" and block["c"] == [{"t": "Str", "c": token}]:
+                position += 1
+            else:
+                counts[position] += _unnamed_code_blocks(block)
+        rendered = run_pandoc(to, source=ast, input_format="json")
+    else:
+        rendered = run_pandoc(to, source=source, input_format="markdown")
+    pieces = re.split(rf"^[^\n]*{token}[^\n]*$", rendered, flags=re.MULTILINE)
+    if len(pieces) != len(sections):
+        raise ValueError(f"Could not split the rendered sections: expected {len(sections)} pieces, got {len(pieces)}")
+    results, before = [], 0
+    for piece, count in zip(pieces, counts, strict=True):
+        results.append((_shift_code_block_ids(piece.strip("\n"), -before), count))
+        before += count
+    return results
+
+
+def render_incremental(text: str, to: str) -> tuple[str, IncrementalReport]:
+    """Convert markdown to ``to``, sending only the sections not rendered before to pandoc."""
+    report = IncrementalReport()
+    report.fallback_reason = cross_block_reason(text)
+    if report.fallback_reason:
+        return run_pandoc(to, source=text, input_format="markdown"), report
+
+    sections = split_sections(text)
+    identity = pandoc_identity()
+    keys = [sha256_hex(f"{identity}\0{to}\0{section.rstrip()}".encode()) for section in sections]
+    with _rendered_lock:
+        outputs = {key: _rendered[key] for key in keys if key in _rendered}
+    missing = list(dict.fromkeys(key for key in keys if key not in outputs))
+    if missing:
+        by_key = dict(zip(keys, sections, strict=True))
+        for key, rendered in zip(missing, _render_sections([by_key[key] for key in missing], to), strict=True):
+            outputs[key] = rendered
+            _remember(key, rendered)
+
+    report.sections, report.rendered = len(sections), len(missing)
+    parts, before = [], 0
+    for key in keys:
+        output, count = outputs[key]
+        if output:
+            parts.append(_shift_code_block_ids(output, before))
+        before += count
+    return (_BLOCK_SEPARATORS[to].join(parts) + "\n") if parts else "", report
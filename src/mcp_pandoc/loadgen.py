@@ -0,0 +1,441 @@
+"""Load generator that drives the server through real MCP sessions over stdio.
+
+It launches one server process per session and replays a weighted mix of
+``convert-contents`` calls, either at a fixed concurrency (each worker sends its next
+call as soon as the last one returns) or at a fixed arrival rate (calls start on a
+schedule whether or not earlier ones have finished). Run it with::
+
+    python -m mcp_pandoc.loadgen --sessions 2 --concurrency 8 --requests 400
+    python -m mcp_pandoc.loadgen --rate 20 --duration 60 --formats html,docx --pdf-share 0.1
+
+The report gives throughput, p50/p95/p99 latency overall and per scenario, the error
+rate with the most common errors, and the resident memory of the server processes
+sampled while the load runs. ``--json`` also writes it as JSON, for comparing runs.
+
+At a fixed arrival rate latency is measured from the time a call was due, not from
+when it was sent, so a server that falls behind shows it in the percentiles.
+
+A mix file is a JSON list of scenarios::
+
+    [{"output_format": "html", "size_kb": 4, "weight": 8},
+     {"output_format": "pdf", "size_kb": 64, "weight": 1, "filters": ["/path/filter.py"]}]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass, field
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+DEFAULT_SERVER_COMMAND = [sys.executable, "-c", "from mcp_pandoc import main; main()"]
+
+# Formats the server only writes to a file; mirrors server.ADVANCED_FORMATS.
+FILE_OUTPUT_FORMATS = ("pdf", "docx", "rst", "latex", "epub", "odt", "pptx")
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Scenario:
+    """One kind of call in the mix."""
+
+    output_format: str = "html"
+    size_kb: int = 4
+    input_format: str = "markdown"
+    filters: list[str] = field(default_factory=list)
+    weight: float = 1.0
+
+    @property
+    def name(self) -> str:
+        """Label the scenario in the report."""
+        suffix = f"+{len(self.filters)}f" if self.filters else ""
+        return f"{self.input_format}->{self.output_format}/{self.size_kb}KB{suffix}"
+
+
+@dataclass
+class CallResult:
+    """Outcome of one call."""
+
+    scenario: str
+    session: int
+    latency_seconds: float
+    error: str | None = None
+
+
+def build_mix(
+    formats=("html",), sizes_kb=(4,), pdf_share: float = 0.0, filters=(), filter_share: float = 0.0
+) -> list[Scenario]:
+    """Build scenarios for every format and size, with PDF and filtered calls at the given shares."""
+    if not 0 <= pdf_share <= 1 or not 0 <= filter_share <= 1:
+        raise ValueError("pdf_share and filter_share must be between 0 and 1")
+    formats = [name for name in formats if name != "pdf"]
+    if not formats and pdf_share < 1:
+        raise ValueError("At least one output format other than pdf is needed unless pdf_share is 1")
+
+    shares = [(name, (1 - pdf_share) / len(formats)) for name in formats] if formats else []
+    if pdf_share:
+        shares.append(("pdf", pdf_share))
+
+    filter_share = filter_share if filters else 0.0
+    mix = []
+    for output_format, share in shares:
+        for size_kb in sizes_kb:
+            weight = share / len(sizes_kb)
+            if filter_share:
+                mix.append(Scenario(output_format, size_kb, filters=list(filters), weight=weight * filter_share))
+            if filter_share < 1:
+                mix.append(Scenario(output_format, size_kb, weight=weight * (1 - filter_share)))
+    return mix
+
+
+def load_mix(path: str) -> list[Scenario]:
+    """Read scenarios from a JSON mix file."""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"Mix file {path} must hold a non-empty JSON list of scenarios")
+    try:
+        return [Scenario(**entry) for entry in entries]
+    except TypeError as e:
+        raise ValueError(f"Invalid scenario in mix file {path}: {e}") from e
+
+
+def sample_document(size_kb: int, seed: int = 0) -> str:
+    """Generate markdown of about size_kb kilobytes with headings, lists, tables and code."""
+    rng = random.Random(seed)  # noqa: S311
+    words = ("pandoc", "document", "convert", "format", "server", "latency", "table", "figure", "section", "note")
+    target = size_kb * 1024
+    parts = [f"# Load test document ({size_kb} KB)\n"]
+    length = len(parts[0])
+    section = 0
+    while length < target:
+        section += 1
+        sentences = " ".join(
+            " ".join(rng.choice(words) for _ in range(rng.randint(6, 14))).capitalize() + "." for _ in range(6)
+        )
+        block = (
+            f"\n## Section {section}\n\n{sentences} Some *emphasis*, **strong** text and `code`.\n\n"
+            f"- {rng.choice(words)}\n- {rng.choice(words)}\n\n"
+            f"| Key | Value |\n| --- | --- |\n| {rng.choice(words)} | {section} |\n\n"
+            f"```python\nprint({section})\n```\n"
+        )
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Return the q-th percentile of values, interpolating between the nearest ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _child_pids(pid: int | str = "self") -> set[int]:
+    """Return the direct children of a process, read from /proc (empty where there is none)."""
+    children = set()
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.update(int(value) for value in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss_bytes(pid: int) -> int:
+    """Return the resident memory of a process and all of its descendants, pandoc jobs included."""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += _rss_bytes(current)
+        pending.extend(_child_pids(current))
+    return total
+
+
+class LoadGenerator:
+    """Run one load test and collect its results."""
+
+    def __init__(
+        self,
+        mix: list[Scenario],
+        *,
+        sessions: int = 1,
+        concurrency: int = 1,
+        rate: float | None = None,
+        requests: int | None = 100,
+        duration: float | None = None,
+        server_command=None,
+        sample_interval: float = 0.5,
+        call_timeout: float = 300.0,
+        seed: int = 0,
+    ):
+        """Configure the run; nothing is started until run()."""
+        if not mix:
+            raise ValueError("The mix needs at least one scenario")
+        if sessions < 1 or concurrency < 1:
+            raise ValueError("sessions and concurrency must be at least 1")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if requests is None and duration is None:
+            raise ValueError("Give a number of requests, a duration, or both")
+        self.mix = mix
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.rate = rate
+        self.requests = requests
+        self.duration = duration
+        self.server_command = list(server_command or DEFAULT_SERVER_COMMAND)
+        self.sample_interval = sample_interval
+        self.call_timeout = call_timeout
+        self.rng = random.Random(seed)  # noqa: S311
+        self.documents = {size: sample_document(size, seed) for size in {scenario.size_kb for scenario in mix}}
+        self.results: list[CallResult] = []
+        self.rss_samples: list[tuple[float, int]] = []
+        self.server_pids: list[int] = []
+        self._issued = 0
+        self._output_names = itertools.count(1)
+
+    def _next_scenario(self) -> Scenario | None:
+        """Pick the next call, or None once the request or time budget is spent."""
+        if self.requests is not None and self._issued >= self.requests:
+            return None
+        if self.duration is not None and time.perf_counter() - self._started >= self.duration:
+            return None
+        self._issued += 1
+        return self.rng.choices(self.mix, weights=[scenario.weight for scenario in self.mix])[0]
+
+    def _arguments(self, scenario: Scenario, scratch_dir: str) -> dict:
+        arguments = {
+            "contents": self.documents[scenario.size_kb],
+            "input_format": scenario.input_format,
+            "output_format": scenario.output_format,
+        }
+        if scenario.output_format in FILE_OUTPUT_FORMATS:
+            extension = "tex" if scenario.output_format == "latex" else scenario.output_format
+            arguments["output_file"] = os.path.join(scratch_dir, f"call-{next(self._output_names)}.{extension}")
+        if scenario.filters:
+            arguments["filters"] = scenario.filters
+        return arguments
+
+    async def _call(self, session: ClientSession, index: int, scenario: Scenario, scratch_dir: str, due: float):
+        arguments = self._arguments(scenario, scratch_dir)
+        error = None
+        try:
+            result = await session.call_tool("convert-contents", arguments, read_timeout_seconds=self.call_timeout)
+            if result.is_error:
+                error = result.content[0].text.splitlines()[0] if result.content else "error"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.results.append(CallResult(scenario.name, index, time.perf_counter() - due, error))
+        if "output_file" in arguments and os.path.exists(arguments["output_file"]):
+            os.unlink(arguments["output_file"])
+
+    async def _closed_loop(self, sessions: list[ClientSession], scratch_dir: str):
+        async def worker(number: int):
+            session = sessions[number % len(sessions)]
+            while (scenario := self._next_scenario()) is not None:
+                await self._call(session, number % len(sessions), scenario, scratch_dir, time.perf_counter())
+
+        await asyncio.gather(*(worker(number) for number in range(self.concurrency)))
+
+    async def _open_loop(self, sessions: list[ClientSession], scratch_dir: str):
+        tasks = []
+        interval = 1 / self.rate
+        while (scenario := self._next_scenario()) is not None:
+            due = self._started + (self._issued - 1) * interval
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            index = (self._issued - 1) % len(sessions)
+            tasks.append(asyncio.create_task(self._call(sessions[index], index, scenario, scratch_dir, due)))
+        await asyncio.gather(*tasks)
+
+    async def _sample_rss(self):
+        while True:
+            total = sum(tree_rss_bytes(pid) for pid in self.server_pids)
+            self.rss_samples.append((time.perf_counter() - self._started, total))
+            await asyncio.sleep(self.sample_interval)
+
+    async def run(self) -> dict:
+        """Start the servers, run the load and return the report."""
+        params = StdioServerParameters(command=self.server_command[0], args=self.server_command[1:])
+        with tempfile.TemporaryDirectory(prefix="mcp-pandoc-loadgen-") as scratch_dir:
+            async with AsyncExitStack() as stack:
+                sessions = []
+                for _ in range(self.sessions):
+                    before = _child_pids()
+                    streams = await stack.enter_async_context(stdio_client(params))
+                    session = await stack.enter_async_context(ClientSession(*streams))
+                    await session.initialize()
+                    self.server_pids.extend(sorted(_child_pids() - before))
+                    sessions.append(session)
+
+                self._started = time.perf_counter()
+                sampler = asyncio.create_task(self._sample_rss())
+                try:
+                    if self.rate is None:
+                        await self._closed_loop(sessions, scratch_dir)
+                    else:
+                        await self._open_loop(sessions, scratch_dir)
+                finally:
+                    elapsed = time.perf_counter() - self._started
+                    sampler.cancel()
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        """Summarise the results of a run that took elapsed seconds."""
+
+        def summary(results: list[CallResult]) -> dict:
+            latencies = [result.latency_seconds for result in results]
+            errors = sum(1 for result in results if result.error)
+            return {
+                "calls": len(results),
+                "errors": errors,
+                "error_rate": errors / len(results) if results else 0.0,
+                **{f"p{q}_seconds": percentile(latencies, q) for q in PERCENTILES},
+                "max_seconds": max(latencies, default=None),
+            }
+
+        by_scenario = {}
+        for scenario in sorted({result.scenario for result in self.results}):
+            by_scenario[scenario] = summary([result for result in self.results if result.scenario == scenario])
+
+        rss = [value for _, value in self.rss_samples if value]
+        return {
+            "config": {
+                "mode": "fixed rate" if self.rate is not None else "fixed concurrency",
+                "sessions": self.sessions,
+                "concurrency": self.concurrency,
+                "rate": self.rate,
+                "mix": [asdict(scenario) for scenario in self.mix],
+            },
+            "elapsed_seconds": elapsed,
+            "throughput_per_second": len(self.results) / elapsed if elapsed else 0.0,
+            **summary(self.results),
+            "top_errors": Counter(result.error for result in self.results if result.error).most_common(5),
+            "scenarios": by_scenario,
+            "server_rss_bytes": {
+                "peak": max(rss, default=None),
+                "last": rss[-1] if rss else None,
+                "samples": [[round(at, 3), value] for at, value in self.rss_samples],
+            },
+        }
+
+
+def format_report(report: dict) -> str:
+    """Render a report for the terminal."""
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    def mib(value):
+        return "n/a" if value is None else f"{value / 1048576:.1f} MiB"
+
+    config = report["config"]
+    lines = [
+        f"Mode: {config['mode']}, {config['sessions']} session(s)"
+        + (f", {config['rate']}/s" if config["rate"] is not None else f", concurrency {config['concurrency']}"),
+        f"Calls: {report['calls']} in {report['elapsed_seconds']:.2f}s "
+        f"({report['throughput_per_second']:.2f}/s), errors: {report['errors']} ({report['error_rate']:.1%})",
+        f"Latency ms: p50 {ms(report['p50_seconds'])}  p95 {ms(report['p95_seconds'])}  "
+        f"p99 {ms(report['p99_seconds'])}  max {ms(report['max_seconds'])}",
+        f"Server RSS: peak {mib(report['server_rss_bytes']['peak'])}, last {mib(report['server_rss_bytes']['last'])}",
+        "",
+        f"{'Scenario':<36}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for name, stats in report["scenarios"].items():
+        lines.append(
+            f"{name:<36}{stats['calls']:>7}{stats['errors']:>8}{ms(stats['p50_seconds']):>10}"
+            f"{ms(stats['p95_seconds']):>10}{ms(stats['p99_seconds']):>10}"
+        )
+    for error, count in report["top_errors"]:
+        lines.append(f"error x{count}: {error}")
+    return "\n".join(lines)
+
+
+def _csv(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    """Parse the command line, run the load test and print the report."""
+    parser = argparse.ArgumentParser(prog="python -m mcp_pandoc.loadgen", description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1, help="server processes, one MCP session each")
+    parser.add_argument("--concurrency", type=int, default=4, help="calls kept in flight (fixed concurrency)")
+    parser.add_argument("--rate", type=float, help="calls started per second (fixed arrival rate)")
+    parser.add_argument("--requests", type=int, help="calls to send (default 100 unless --duration is given)")
+    parser.add_argument("--duration", type=float, help="seconds to keep sending calls")
+    parser.add_argument("--formats", type=_csv, default=["html"], help="comma-separated output formats")
+    parser.add_argument("--sizes", type=_csv, default=["4"], help="comma-separated document sizes in KB")
+    parser.add_argument("--pdf-share", type=float, default=0.0, help="fraction of calls that render PDF")
+    parser.add_argument("--filter", action="append", default=[], help="filter applied to --filter-share of calls")
+    parser.add_argument("--filter-share", type=float, default=1.0, help="fraction of calls that use --filter")
+    parser.add_argument("--mix", help="JSON mix file; replaces --formats, --sizes and the shares")
+    parser.add_argument("--server-command", help="command that starts the server (default: this package)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.mix:
+            mix = load_mix(args.mix)
+        else:
+            mix = build_mix(
+                args.formats,
+                [int(size) for size in args.sizes],
+                args.pdf_share,
+                args.filter,
+                args.filter_share,
+            )
+        generator = LoadGenerator(
+            mix,
+            sessions=args.sessions,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            requests=args.requests if args.requests is not None or args.duration else 100,
+            duration=args.duration,
+            server_command=args.server_command.split() if args.server_command else None,
+            sample_interval=args.sample_interval,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(generator.run())
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
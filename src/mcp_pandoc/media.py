@@ -0,0 +1,132 @@
+"""Content-addressed store for media pulled out of inbound documents.
+
+Pandoc's ``--extract-media`` writes images into a directory and points the converted
+text at them. Extracting into a throwaway directory and then moving each file into a
+store keyed by its SHA-256 means an image shared by many documents is kept once, and
+the path written into the converted text never changes for the same bytes.
+"""
+import base64
+import binascii
+import mimetypes
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+
+from .cache import cache_dir, sha256_hex
+
+MEDIA_DIR_ENV = "MCP_PANDOC_MEDIA_DIR"
+
+# Inline images that a reader kept as data URIs. Only base64 image payloads are hoisted;
+# anything else is left alone rather than guessed at.
+DATA_URI_PATTERN = re.compile(r"data:(image/[A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/]+={0,2})")
+
+
+@dataclass
+class MediaReport:
+    """What a conversion put into the media store."""
+
+    stored: list[str] = field(default_factory=list)
+    new: int = 0
+
+    def merge(self, other: "MediaReport") -> None:
+        """Fold another report into this one."""
+        self.stored.extend(other.stored)
+        self.new += other.new
+
+    def summary(self) -> str:
+        """Describe the report for a tool result message."""
+        if not self.stored:
+            return "No embedded media found"
+        reused = len(self.stored) - self.new
+        return (
+            f"Extracted {len(self.stored)} media file(s) to {media_store_dir()} "
+            f"({self.new} new, {reused} already stored)"
+        )
+
+
+def media_store_dir() -> str:
+    """Return the media store directory, honouring MCP_PANDOC_MEDIA_DIR."""
+    override = os.environ.get(MEDIA_DIR_ENV)
+    if override:
+        os.makedirs(override, exist_ok=True)
+        return os.path.abspath(override)
+    return cache_dir("media")
+
+
+def store_bytes(data: bytes, extension: str) -> tuple[str, bool]:
+    """Store a blob under its content hash.
+
+    Returns the stored path and whether this call created it. The blob is written to a
+    temporary file in the target directory and renamed into place, so a concurrent
+    reader never sees a partial image.
+    """
+    digest = sha256_hex(data)
+    shard = os.path.join(media_store_dir(), digest[:2])
+    os.makedirs(shard, exist_ok=True)
+    path = os.path.join(shard, f"{digest}{extension.lower()}")
+    if os.path.exists(path):
+        return path, False
+
+    fd, tmp_path = tempfile.mkstemp(dir=shard, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path, True
+
+
+def _reference_forms(path: str) -> list[str]:
+    """Return the spellings pandoc may have used for a path in the converted text."""
+    forms = [path, path.replace(os.sep, "/")]
+    return list(dict.fromkeys(forms))
+
+
+def _stored_reference(path: str) -> str:
+    """Return the stored path as written back into converted text."""
+    return path.replace(os.sep, "/")
+
+
+def store_extracted(text: str, extract_dir: str) -> tuple[str, MediaReport]:
+    """Move everything pandoc extracted into the store and repoint the text at it."""
+    report = MediaReport()
+    for root, _dirs, files in os.walk(extract_dir):
+        for name in sorted(files):
+            extracted = os.path.join(root, name)
+            with open(extracted, "rb") as handle:
+                stored, created = store_bytes(handle.read(), os.path.splitext(name)[1])
+            for form in _reference_forms(extracted):
+                text = text.replace(form, _stored_reference(stored))
+            report.stored.append(stored)
+            report.new += int(created)
+    return text, report
+
+
+def hoist_data_uris(text: str) -> tuple[str, MediaReport]:
+    """Replace base64 image data URIs in converted text with stored paths."""
+    report = MediaReport()
+
+    def replace(match: re.Match) -> str:
+        try:
+            data = base64.b64decode(match.group(2), validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        extension = mimetypes.guess_extension(match.group(1)) or ".bin"
+        stored, created = store_bytes(data, extension)
+        report.stored.append(stored)
+        report.new += int(created)
+        return _stored_reference(stored)
+
+    return DATA_URI_PATTERN.sub(replace, text), report
+
+
+def externalize_media(text: str, extract_dir: str) -> tuple[str, MediaReport]:
+    """Apply both rewrites: files pandoc extracted, then any data URIs left inline."""
+    text, report = store_extracted(text, extract_dir)
+    text, inline_report = hoist_data_uris(text)
+    report.merge(inline_report)
+    return text, report
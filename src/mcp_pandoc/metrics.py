@@ -0,0 +1,384 @@
+"""Prometheus and OpenMetrics exposition of conversion latency and resource use.
+
+Nothing here is exported unless one of these is set:
+
+``MCP_PANDOC_METRICS_PORT``
+    Serve ``/metrics`` over HTTP on this port, bound to ``MCP_PANDOC_METRICS_HOST``
+    (default ``127.0.0.1``). Scrapers that ask for ``application/openmetrics-text`` get
+    OpenMetrics, everyone else the Prometheus text format.
+``MCP_PANDOC_METRICS_TEXTFILE``
+    Rewrite this file after every tool call, for node_exporter's textfile collector.
+    The file is replaced atomically, so the collector never reads half a file.
+
+The server talks MCP over stdout, so metrics can never be printed there. The registry is
+small and written against the exposition format directly, which keeps
+``prometheus_client`` out of the dependencies.
+"""
+import abc
+import bisect
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT_ENV = "MCP_PANDOC_METRICS_PORT"
+METRICS_HOST_ENV = "MCP_PANDOC_METRICS_HOST"
+METRICS_TEXTFILE_ENV = "MCP_PANDOC_METRICS_TEXTFILE"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# From a tiny inline conversion to a long book rendered through TeX.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Walking the caches is not free, so their sizes are refreshed at most this often.
+CACHE_SIZE_TTL_SECONDS = 30
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    """A metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry: list | None = None):
+        """Add the family to ``registry``, by default the one this module exports."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self, openmetrics: bool) -> list[str]:
+        """Return the HELP and TYPE lines."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def samples(self, openmetrics: bool) -> list[str]:
+        """Return the sample lines."""
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry: list | None = None):
+        """Create an empty counter; ``name`` excludes the ``_total`` suffix."""
+        super().__init__(name, documentation, labels, registry)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to the counter for one label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def header(self, openmetrics: bool) -> list[str]:
+        """Return the HELP and TYPE lines; Prometheus names the family with its suffix."""
+        name = self.name if openmetrics else f"{self.name}_total"
+        return [f"# HELP {name} {self.documentation}", f"# TYPE {name} counter"]
+
+    def samples(self, openmetrics: bool) -> list[str]:
+        """Return one ``_total`` sample per label set."""
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}_total{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        collect: Callable[[], dict[tuple, float]] | None = None,
+        registry: list | None = None,
+    ):
+        """Create a gauge; ``collect`` returns values keyed by label value tuples."""
+        super().__init__(name, documentation, labels, registry)
+        self._values: dict[tuple, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        """Set the gauge for one label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """Raise the gauge for one label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """Lower the gauge for one label set."""
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        """Return the current value for one label set."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self, openmetrics: bool) -> list[str]:
+        """Return one sample per label set."""
+        if self._collect:
+            values = self._collect()
+        else:
+            with self._lock:
+                values = dict(self._values) or ({(): 0} if not self.labels else {})
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: list | None = None,
+    ):
+        """Create an empty histogram with the given upper bounds."""
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        """Record one observation for one label set."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def samples(self, openmetrics: bool) -> list[str]:
+        """Return the bucket, sum and count samples for every label set."""
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                le = f'le="{"+Inf" if bound == math.inf else repr(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+_cache_sizes: dict[tuple, float] = {}
+_cache_sizes_at = 0.0
+
+
+def _collect_cache_sizes() -> dict[tuple, float]:
+    global _cache_sizes, _cache_sizes_at
+
+    if time.monotonic() - _cache_sizes_at < CACHE_SIZE_TTL_SECONDS:
+        return _cache_sizes
+
+    from .cache import cache_dir
+    from .media import media_store_dir
+    from .resources import resource_cache_dir
+
+    locations = {
+        "media": media_store_dir,
+        "resources": resource_cache_dir,
+        "chunks": lambda: cache_dir("chunks"),
+        "ast": lambda: cache_dir("ast"),
+        "bibliography": lambda: cache_dir("bibliography"),
+        "documents": lambda: cache_dir("documents"),
+        "images": lambda: cache_dir("images"),
+    }
+    _cache_sizes = {(name,): _directory_size(location()) for name, location in locations.items()}
+    _cache_sizes_at = time.monotonic()
+    return _cache_sizes
+
+
+def _collect_warmup() -> dict[tuple, float]:
+    from .warmup import WARMUP
+
+    return {(): 1 if WARMUP.ready else 0}
+
+
+CONVERSION_SECONDS = Histogram(
+    "mcp_pandoc_conversion_duration_seconds",
+    "Time spent converting, by input format, output format and phase.",
+    ("input_format", "output_format", "phase"),
+)
+CONVERSION_ERRORS = Counter(
+    "mcp_pandoc_conversion_errors",
+    "Failed conversions, by the error class reported to the client.",
+    ("kind",),
+)
+CALLS_IN_FLIGHT = Gauge("mcp_pandoc_calls_in_flight", "Tool calls accepted and not yet answered.")
+JOBS_RUNNING = Gauge("mcp_pandoc_jobs_running", "pandoc processes currently running.")
+QUEUE_DEPTH = Gauge(
+    "mcp_pandoc_queue_depth",
+    "Tool calls accepted but not yet running pandoc.",
+    collect=lambda: {(): max(0, CALLS_IN_FLIGHT.value() - JOBS_RUNNING.value())},
+)
+CHILD_PEAK_RSS_BYTES = Gauge(
+    "mcp_pandoc_child_peak_rss_bytes",
+    "Peak resident size of the last pandoc job, including the filters and engines it waited for.",
+)
+RTS_PROFILE_JOBS = Counter(
+    "mcp_pandoc_rts_profile_jobs",
+    "pandoc jobs started, by the runtime tuning profile chosen for them.",
+    ("profile",),
+)
+CACHE_BYTES = Gauge("mcp_pandoc_cache_bytes", "Size of each on-disk cache.", ("cache",), collect=_collect_cache_sizes)
+WARMUP_READY = Gauge(
+    "mcp_pandoc_warmup_ready", "1 once warm-up has finished or when it is off.", collect=_collect_warmup
+)
+
+
+class PhaseTimer:
+    """Record the phases of one conversion into CONVERSION_SECONDS.
+
+    Each ``mark`` records the time since the previous mark under the given phase, and
+    ``finish`` records the whole conversion as phase ``total``.
+    """
+
+    def __init__(self, input_format: str, output_format: str):
+        """Start timing a conversion."""
+        self.input_format = input_format
+        self.output_format = output_format
+        self.started = self._last = time.perf_counter()
+
+    def _observe(self, phase: str, seconds: float):
+        CONVERSION_SECONDS.observe(
+            seconds, input_format=self.input_format, output_format=self.output_format, phase=phase
+        )
+
+    def mark(self, phase: str):
+        """Record the time since the previous mark as ``phase``."""
+        now = time.perf_counter()
+        self._observe(phase, now - self._last)
+        self._last = now
+
+    def finish(self):
+        """Record the total time since the timer started."""
+        self._observe("total", time.perf_counter() - self.started)
+
+
+def render(openmetrics: bool = False) -> str:
+    """Render every metric in the Prometheus text format, or in OpenMetrics."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header(openmetrics))
+        lines.extend(metric.samples(openmetrics))
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile():
+    """Rewrite MCP_PANDOC_METRICS_TEXTFILE, if set, for the textfile collector."""
+    path = os.environ.get(METRICS_TEXTFILE_ENV)
+    if not path:
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        # The collector only reads *.prom, so the temporary name must not end in .prom
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".mcp-pandoc-metrics-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(render())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write metrics to %s: %s", path, e)
+
+
+def start_metrics_server():
+    """Serve /metrics in a daemon thread if MCP_PANDOC_METRICS_PORT is set; return the server."""
+    port = os.environ.get(METRICS_PORT_ENV, "").strip()
+    if not port:
+        return None
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            body = render(openmetrics).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # The default writes every scrape to stderr
+            logger.debug("metrics: " + format, *args)
+
+    host = os.environ.get(METRICS_HOST_ENV, "127.0.0.1")
+    try:
+        httpd = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    except (OSError, ValueError) as e:
+        # Metrics are optional, so a taken port must not stop the server starting
+        logger.warning("Could not serve metrics on %s:%s: %s", host, port, e)
+        return None
+    threading.Thread(target=httpd.serve_forever, name="mcp-pandoc-metrics", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, httpd.server_port)
+    return httpd
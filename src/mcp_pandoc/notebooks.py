@@ -0,0 +1,320 @@
+"""Trim Jupyter notebook outputs before pandoc reads the notebook.
+
+Real notebooks carry megabytes of base64 plot images and long cell outputs. pandoc
+parses all of it and writes it out again even when only the code and prose are wanted,
+so the trimming happens on the notebook JSON, before pandoc sees it:
+
+* outputs are dropped by MIME type, with ``image/*`` style wildcards, and ``*`` drops
+  every output. Stream and error outputs have no MIME bundle, so they go by the types
+  Jupyter gives them: ``application/vnd.jupyter.stdout``, ``application/vnd.jupyter.stderr``
+  and ``application/vnd.jupyter.error``,
+* text outputs longer than a byte limit are truncated, and binary outputs over it are
+  dropped,
+* stream output (stdout and stderr) and error tracebacks can be cut to their last lines,
+  which hold the latest progress and the frame that raised,
+* execution counts and execution metadata can be stripped.
+
+Run ``python -m mcp_pandoc.notebooks`` to compare pandoc on generated notebooks with and
+without trimming.
+"""
+import base64
+import fnmatch
+import json
+import random
+import sys
+from dataclasses import dataclass
+
+_KB = 1024
+
+# MIME types Jupyter gives outputs that carry no MIME bundle.
+_STREAM_MIME_TYPE = "application/vnd.jupyter.{name}"
+ERROR_MIME_TYPE = "application/vnd.jupyter.error"
+
+# Cell metadata keys written by Jupyter while running a notebook, not by its author.
+_EXECUTION_METADATA = ("execution", "collapsed", "scrolled", "ExecuteTime")
+
+
+@dataclass(frozen=True)
+class NotebookTrim:
+    """What to remove from a notebook before conversion."""
+
+    drop_outputs: tuple[str, ...] = ()
+    max_output_bytes: int | None = None
+    stream_tail_lines: int | None = None
+    strip_metadata: bool = False
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "NotebookTrim | None":
+        """Build the trim from the notebook_* tool arguments, or return None when none are set."""
+        drop_outputs = arguments.get("notebook_drop_outputs") or []
+        if not isinstance(drop_outputs, list) or not all(isinstance(item, str) for item in drop_outputs):
+            raise ValueError("notebook_drop_outputs must be an array of MIME types")
+        trim = cls(
+            drop_outputs=tuple(item.lower() for item in drop_outputs),
+            max_output_bytes=_positive(arguments, "notebook_max_output_bytes"),
+            stream_tail_lines=_positive(arguments, "notebook_stream_tail_lines"),
+            strip_metadata=bool(arguments.get("notebook_strip_metadata")),
+        )
+        return trim if trim != cls() else None
+
+
+def _positive(arguments: dict, name: str) -> int | None:
+    value = arguments.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+
+@dataclass
+class TrimReport:
+    """What trimming removed from one notebook."""
+
+    bytes_before: int = 0
+    bytes_after: int = 0
+    outputs_dropped: int = 0
+    outputs_truncated: int = 0
+
+    def summary(self) -> str:
+        """Describe the reduction for the tool result."""
+        return (
+            f"Notebook trimmed from {self.bytes_before / _KB:.1f} KB to {self.bytes_after / _KB:.1f} KB "
+            f"({self.outputs_dropped} outputs dropped, {self.outputs_truncated} truncated)"
+        )
+
+
+def _text(value) -> str:
+    # nbformat allows multi-line strings to be stored as a list of lines
+    return "".join(value) if isinstance(value, list) else value
+
+
+def _is_text(mime_type: str) -> bool:
+    return mime_type.startswith("text/") or mime_type.endswith("json") or mime_type.endswith("+xml")
+
+
+def _truncate(text: str, max_bytes: int) -> str | None:
+    """Return text cut to max_bytes with a note of what was cut, or None if it already fits."""
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return None
+    kept = encoded[:max_bytes].decode("utf-8", errors="ignore")
+    return f"{kept}\n[... {len(encoded) - max_bytes} bytes truncated]\n"
+
+
+def _tail(text: str, lines: int) -> str | None:
+    """Return the last lines of text with a note of what was cut, or None if it already fits."""
+    all_lines = text.splitlines(keepends=True)
+    if len(all_lines) <= lines:
+        return None
+    return f"[... {len(all_lines) - lines} lines omitted]\n{''.join(all_lines[-lines:])}"
+
+
+def _dropped(mime_type: str, trim: NotebookTrim) -> bool:
+    return any(fnmatch.fnmatch(mime_type.lower(), pattern) for pattern in trim.drop_outputs)
+
+
+def _trim_lines(text: str, trim: NotebookTrim) -> str | None:
+    """Return text cut to its last lines and to the byte limit, or None if it already fits."""
+    trimmed = _tail(text, trim.stream_tail_lines) if trim.stream_tail_lines else None
+    if trim.max_output_bytes:
+        trimmed = _truncate(trimmed or text, trim.max_output_bytes) or trimmed
+    return trimmed
+
+
+def _trim_output(output: dict, trim: NotebookTrim, report: TrimReport) -> bool:
+    """Trim one output in place and return whether anything of it is left."""
+    if "*" in trim.drop_outputs:
+        return False
+
+    kind = output.get("output_type")
+    if kind == "stream":
+        if _dropped(_STREAM_MIME_TYPE.format(name=output.get("name", "stdout")), trim):
+            return False
+        trimmed = _trim_lines(_text(output.get("text", "")), trim)
+        if trimmed is not None:
+            output["text"] = trimmed
+            report.outputs_truncated += 1
+        return True
+
+    if kind == "error":
+        if _dropped(ERROR_MIME_TYPE, trim):
+            return False
+        # Each traceback entry is a frame, which may span several lines
+        trimmed = _trim_lines("\n".join(output.get("traceback", [])), trim)
+        if trimmed is not None:
+            output["traceback"] = trimmed.rstrip("\n").split("\n")
+            report.outputs_truncated += 1
+        return True
+
+    if kind in ("display_data", "execute_result"):
+        data = output.get("data", {})
+        truncated = False
+        for mime_type in list(data):
+            value = _text(data[mime_type])
+            if _dropped(mime_type, trim):
+                del data[mime_type]
+            elif trim.max_output_bytes and _is_text(mime_type) and isinstance(value, str):
+                shorter = _truncate(value, trim.max_output_bytes)
+                if shorter is not None:
+                    data[mime_type] = shorter
+                    truncated = True
+            elif trim.max_output_bytes and len(json.dumps(value)) > trim.max_output_bytes:
+                # A cut image is no use, so binary outputs over the limit go whole
+                del data[mime_type]
+        if trim.strip_metadata:
+            output["metadata"] = {}
+            if kind == "execute_result":
+                # pandoc rejects a result without a count, so it becomes the same output with no count
+                output["output_type"] = "display_data"
+                del output["execution_count"]
+        report.outputs_truncated += truncated
+        return bool(data)
+
+    return True
+
+
+def trim_notebook(source: str | bytes, trim: NotebookTrim) -> tuple[str, TrimReport]:
+    """Return the notebook JSON with outputs trimmed, and what was removed."""
+    try:
+        notebook = json.loads(source)
+    except ValueError as e:
+        raise ValueError(f"Notebook is not valid JSON: {e}") from e
+    if not isinstance(notebook, dict) or not isinstance(notebook.get("cells"), list):
+        raise ValueError("Notebook has no 'cells' list")
+
+    report = TrimReport(bytes_before=len(source if isinstance(source, bytes) else source.encode("utf-8")))
+    for cell in notebook["cells"]:
+        if trim.strip_metadata:
+            metadata = cell.get("metadata", {})
+            for key in _EXECUTION_METADATA:
+                metadata.pop(key, None)
+            if "execution_count" in cell:
+                cell["execution_count"] = None
+        if "outputs" not in cell:
+            continue
+        kept = [output for output in cell["outputs"] if _trim_output(output, trim, report)]
+        report.outputs_dropped += len(cell["outputs"]) - len(kept)
+        cell["outputs"] = kept
+
+    trimmed = json.dumps(notebook, ensure_ascii=False)
+    report.bytes_after = len(trimmed.encode("utf-8"))
+    return trimmed, report
+
+
+def sample_notebook(plots: int, seed: int = 0) -> str:
+    """Generate a training-run style notebook with plots, chatty streams, wide tables and a traceback."""
+    rng = random.Random(seed)  # noqa: S311
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Experiment\n", "\n", "Training and evaluation."]}]
+    for index in range(plots):
+        # Noise does not compress, like a rendered PNG
+        plot = base64.b64encode(rng.randbytes(300 * _KB)).decode("ascii")
+        cells.append({"cell_type": "markdown", "metadata": {}, "source": [f"## Run {index}\n", "\n", "Loss by epoch."]})
+        cells.append({
+            "cell_type": "code",
+            "execution_count": index + 1,
+            "metadata": {"execution": {"iopub.execute_input": "2026-01-01T00:00:00Z"}},
+            "source": [f"history = train(run={index})\n", "plot(history)"],
+            "outputs": [
+                {
+                    "output_type": "stream", "name": "stdout",
+                    "text": [f"epoch {epoch}: loss {rng.random():.4f}\n" for epoch in range(500)],
+                },
+                {"output_type": "display_data", "metadata": {}, "data": {"image/png": plot, "text/plain": "<Figure>"}},
+                {
+                    "output_type": "execute_result",
+                    "execution_count": index + 1,
+                    "metadata": {},
+                    "data": {
+                        "text/html": "<table>" + "<tr><td>metric</td><td>0.5</td></tr>" * 300 + "</table>",
+                        "text/plain": "<DataFrame>",
+                    },
+                },
+            ],
+        })
+    cells.append({
+        "cell_type": "code",
+        "execution_count": plots + 1,
+        "metadata": {},
+        "source": ["evaluate()"],
+        "outputs": [{
+            "output_type": "error", "ename": "ValueError", "evalue": "shapes do not match",
+            "traceback": [f"  File \"lib/model.py\", line {line}, in forward\n    x = layer(x)" for line in range(200)]
+            + ["ValueError: shapes do not match"],
+        }],
+    })
+    return json.dumps({
+        "cells": cells,
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    })
+
+
+def benchmark(plot_counts: list[int], to: str, repeat: int, trim: NotebookTrim) -> list[dict]:
+    """Convert generated notebooks with pandoc as they are and trimmed, keeping the best run of each."""
+    from .rts import time_job
+    from .runner import ResourceLimits, pandoc_path
+
+    argv = [pandoc_path(), *ResourceLimits.from_env().rts_args(), "--from=ipynb", f"--to={to}"]
+    rows = []
+    for plots in plot_counts:
+        notebook = sample_notebook(plots)
+        trimmed, _ = trim_notebook(notebook, trim)
+        row = {"input": f"ipynb {plots} plots"}
+        for setting, source in (("full", notebook), ("trimmed", trimmed)):
+            encoded = source.encode("utf-8")
+            runs = [time_job(argv, encoded) for _ in range(repeat)]
+            row[f"{setting}_bytes"] = len(encoded)
+            row[f"{setting}_seconds"] = min(seconds for seconds, _ in runs)
+            row[f"{setting}_peak_rss_kb"] = max((rss or 0) for _, rss in runs) or None
+        rows.append(row)
+    return rows
+
+
+def format_benchmark(rows: list[dict]) -> str:
+    """Render benchmark rows as a plain-text table."""
+    lines = [
+        f"{'input':<18} {'full MB':>8} {'trimmed KB':>11} {'full s':>8} {'trimmed s':>10} "
+        f"{'full RSS MB':>12} {'trimmed RSS MB':>15}"
+    ]
+    for row in rows:
+        full_mb, trimmed_mb = (
+            f"{row[key] / 1024:.0f}" if row[key] else "-" for key in ("full_peak_rss_kb", "trimmed_peak_rss_kb")
+        )
+        lines.append(
+            f"{row['input']:<18} {row['full_bytes'] / _KB / _KB:>8.1f} {row['trimmed_bytes'] / _KB:>11.0f} "
+            f"{row['full_seconds']:>8.3f} {row['trimmed_seconds']:>10.3f} {full_mb:>12} {trimmed_mb:>15}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the notebook trimming benchmark from the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mcp_pandoc.notebooks", description="Compare pandoc on notebooks with and without trimming."
+    )
+    parser.add_argument("--plots", default="10,40", help="comma-separated numbers of plots per notebook")
+    parser.add_argument("--to", default="markdown", help="output format")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per notebook and setting")
+    parser.add_argument("--drop-outputs", default="image/*", help="comma-separated MIME types to drop")
+    parser.add_argument("--max-output-bytes", type=int, default=4096, help="truncate text outputs to this size")
+    parser.add_argument("--stream-tail-lines", type=int, default=20, help="keep this many lines of streams")
+    args = parser.parse_args(argv)
+
+    trim = NotebookTrim.from_arguments({
+        "notebook_drop_outputs": [mime_type for mime_type in args.drop_outputs.split(",") if mime_type.strip()],
+        "notebook_max_output_bytes": args.max_output_bytes,
+        "notebook_stream_tail_lines": args.stream_tail_lines,
+    })
+    if trim is None:
+        parser.error("set at least one trimming option")
+    plot_counts = [int(count) for count in args.plots.split(",") if count.strip()]
+    print(format_benchmark(benchmark(plot_counts, args.to, max(1, args.repeat), trim)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
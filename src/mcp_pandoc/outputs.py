@@ -0,0 +1,98 @@
+"""Atomic output writes that leave unchanged files untouched.
+
+Outbound documents are disposable builds, rebuilt after every edit and then synced to
+file shares. Writing straight over ``output_file`` bumps its mtime on every rebuild, so
+every sync copies every file even when nothing changed, and a reader can catch the file
+half written.
+
+Instead, pandoc writes to a temporary file in the target directory. The result is
+compared with the existing file, and it is renamed over the target only when the content
+differs. The rename is atomic because both paths are in the same directory.
+
+Packaged formats embed volatile data that changes on every run even for identical
+input: zip member timestamps, creation and modification dates in the package metadata,
+random EPUB identifiers, and the dates and file ID in a PDF trailer. These are masked
+before hashing, so a rebuild from unchanged sources compares equal.
+"""
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import zipfile
+
+# Output formats packaged as zip archives.
+ZIP_FORMATS = ("docx", "odt", "pptx", "epub")
+
+# Package members that carry per-run timestamps or identifiers.
+_VOLATILE_MEMBERS = re.compile(r"(^|/)(docProps/core\.xml|meta\.xml|[^/]+\.opf|toc\.ncx|nav\.xhtml)$")
+_ISO_TIMESTAMP = re.compile(rb"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z")
+_UUID_URN = re.compile(rb"urn:uuid:[0-9a-fA-F-]{36}")
+
+_PDF_VOLATILE = re.compile(rb"/(?:CreationDate|ModDate)\s*\([^)]*\)|/ID\s*\[\s*<[0-9A-Fa-f]*>\s*<[0-9A-Fa-f]*>\s*\]")
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def temp_output_path(output_file: str) -> str:
+    """Return an unused path next to output_file for pandoc to write to.
+
+    The name keeps the real extension, since pandoc and the PDF engines look at it, and
+    starts with a dot so sync clients that skip hidden files ignore it.
+    """
+    directory, name = os.path.split(os.path.abspath(output_file))
+    extension = os.path.splitext(name)[1]
+    return os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp{extension}")
+
+
+def _mask_volatile(data: bytes) -> bytes:
+    return _UUID_URN.sub(b"urn:uuid:", _ISO_TIMESTAMP.sub(b"", data))
+
+
+def _zip_digest(path: str) -> str:
+    """Hash a zip package by member names and contents, ignoring member timestamps."""
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            data = archive.read(member)
+            if _VOLATILE_MEMBERS.search(member.filename):
+                data = _mask_volatile(data)
+            digest.update(member.filename.encode("utf-8") + b"\0")
+            digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+def normalized_digest(path: str, output_format: str) -> str:
+    """Hash an output file with its per-run volatile data masked."""
+    if output_format in ZIP_FORMATS:
+        try:
+            return _zip_digest(path)
+        except zipfile.BadZipFile:
+            pass
+    elif output_format == "pdf":
+        with open(path, "rb") as handle:
+            return hashlib.sha256(_PDF_VOLATILE.sub(b"", handle.read())).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def commit_output(temp_path: str, output_file: str, output_format: str) -> bool:
+    """Move a freshly written output into place unless it matches the existing file.
+
+    Returns True when output_file was replaced, False when the existing file was kept
+    and the temporary file discarded.
+    """
+    if os.path.isfile(output_file):
+        if os.path.getsize(output_file) == os.path.getsize(temp_path) or output_format in ZIP_FORMATS + ("pdf",):
+            if normalized_digest(output_file, output_format) == normalized_digest(temp_path, output_format):
+                os.unlink(temp_path)
+                return False
+        # Overwriting in place used to keep the existing file's permissions, so keep doing that
+        shutil.copymode(output_file, temp_path)
+
+    os.replace(temp_path, output_file)
+    return True
@@ -0,0 +1,233 @@
+"""Opt-in profiling of single tool calls.
+
+Profiling is off by default, since a bundle costs a verbose pandoc run and disk space.
+The operator turns it on: with ``MCP_PANDOC_PROFILE=request`` a call is profiled when the
+client sets ``"mcp-pandoc/profile": true`` in the request ``_meta``, and with
+``MCP_PANDOC_PROFILE=all`` every call is.
+
+Each profiled call writes a bundle directory named by its UTC start time into
+``MCP_PANDOC_PROFILE_DIR`` (default ``profiles/`` under the cache root). A bundle holds:
+
+* ``call.json``: the tool, a summary of the arguments, the outcome and the timings,
+* ``profile.txt`` and ``profile.pstats`` from cProfile, or ``profile.txt`` and
+  ``profile.html`` from pyinstrument's sampling profiler when it is installed,
+* ``memory.txt``: the top Python allocations from tracemalloc,
+* ``pandoc-N.log`` for every pandoc job: its argv and usage, its ``--verbose`` log and
+  the GHC runtime statistics from ``+RTS -s``.
+
+Only the newest ``MCP_PANDOC_PROFILE_KEEP`` bundles (default 20) are kept, so profiling
+can be left enabled.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import secrets
+import shutil
+import threading
+import time
+import tracemalloc
+
+from .cache import cache_dir
+from .runner import JOB_CAPTURE
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "MCP_PANDOC_PROFILE"
+PROFILE_DIR_ENV = "MCP_PANDOC_PROFILE_DIR"
+PROFILE_KEEP_ENV = "MCP_PANDOC_PROFILE_KEEP"
+
+# Request _meta key a client sets to profile one call.
+META_KEY = "mcp-pandoc/profile"
+
+DEFAULT_KEEP = 20
+
+# Lines kept from the profiler and tracemalloc reports.
+_REPORT_LINES = 60
+
+# Arguments longer than this are summarised by length in call.json.
+_ARGUMENT_PREVIEW = 200
+
+# Profilers cannot nest, so only one call at a time is profiled.
+_active = threading.Lock()
+
+
+def _profile_mode() -> str:
+    mode = os.environ.get(PROFILE_ENV, "off").strip().lower()
+    return mode if mode in ("off", "request", "all") else "off"
+
+
+def profile_dir() -> str:
+    """Return the bundle directory, honouring MCP_PANDOC_PROFILE_DIR."""
+    override = os.environ.get(PROFILE_DIR_ENV)
+    if override:
+        os.makedirs(override, exist_ok=True)
+        return os.path.abspath(override)
+    return cache_dir("profiles")
+
+
+def _keep() -> int:
+    try:
+        return max(1, int(os.environ.get(PROFILE_KEEP_ENV, DEFAULT_KEEP)))
+    except ValueError:
+        return DEFAULT_KEEP
+
+
+def _summarise(arguments: dict | None) -> dict:
+    summary = {}
+    for key, value in (arguments or {}).items():
+        if isinstance(value, str) and len(value) > _ARGUMENT_PREVIEW:
+            value = f"<{len(value)} characters>"
+        summary[key] = value
+    return summary
+
+
+def prune(directory: str, keep: int):
+    """Delete all but the newest ``keep`` bundles."""
+    bundles = sorted(name for name in os.listdir(directory) if name[:1].isdigit())
+    for name in bundles[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class CallProfiler:
+    """Context manager that profiles one tool call if profiling was asked for.
+
+    When it was not, entering and leaving cost nothing and ``result_meta`` is None.
+    """
+
+    def __init__(self, tool: str, arguments: dict | None, meta=None):
+        """Decide whether this call is profiled."""
+        mode = _profile_mode()
+        requested = bool(meta and meta.get(META_KEY))
+        self.enabled = mode == "all" or (mode == "request" and requested)
+        self.tool = tool
+        self.arguments = arguments
+        self.bundle: str | None = None
+
+    @property
+    def result_meta(self) -> dict | None:
+        """Return the result _meta that points the client at the bundle."""
+        return {META_KEY: self.bundle} if self.bundle else None
+
+    def __enter__(self):
+        """Start the profilers."""
+        if not self.enabled:
+            return self
+        if not _active.acquire(blocking=False):
+            logger.info("Not profiling %s: another call is being profiled", self.tool)
+            self.enabled = False
+            return self
+
+        try:
+            self._start_profiler()
+        except Exception as e:
+            # For example another profiling tool already owns the interpreter hook
+            logger.warning("Not profiling %s: %s", self.tool, e)
+            self.enabled = False
+            _active.release()
+            return self
+
+        self.jobs: list = []
+        self._capture_token = JOB_CAPTURE.set(self.jobs)
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._started_at = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def _start_profiler(self):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            self._sampler = None
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = Profiler()
+            self._sampler.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        """Stop the profilers and write the bundle; never affects the call's outcome."""
+        if not self.enabled:
+            return False
+        try:
+            duration = time.perf_counter() - self._started
+            if self._sampler:
+                self._sampler.stop()
+            else:
+                self._profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            JOB_CAPTURE.reset(self._capture_token)
+
+            outcome = "ok" if exc is None else f"{type(exc).__name__}: {exc}"
+            self.bundle = self._write_bundle(duration, peak, snapshot, outcome)
+        except Exception as e:
+            logger.warning("Could not write profile for %s: %s", self.tool, e)
+        finally:
+            _active.release()
+        return False
+
+    def _write_bundle(self, duration: float, peak: int, snapshot, outcome: str) -> str:
+        directory = profile_dir()
+        # Microseconds keep names in start order even for calls within the same second
+        micros = int(self._started_at % 1 * 1_000_000)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self._started_at)) + f".{micros:06d}Z"
+        name = f"{stamp}-{self.tool}-{secrets.token_hex(3)}"
+        # Written under a hidden name and renamed, so a bundle is never seen half written
+        staging = os.path.join(directory, f".{name}")
+        os.makedirs(staging)
+
+        def write(filename: str, text: str):
+            with open(os.path.join(staging, filename), "w", encoding="utf-8") as handle:
+                handle.write(text)
+
+        if self._sampler:
+            write("profile.txt", self._sampler.output_text())
+            write("profile.html", self._sampler.output_html())
+        else:
+            self._profiler.dump_stats(os.path.join(staging, "profile.pstats"))
+            report = io.StringIO()
+            pstats.Stats(self._profiler, stream=report).sort_stats("cumulative").print_stats(_REPORT_LINES)
+            write("profile.txt", report.getvalue())
+
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        top = snapshot.statistics("lineno")[:_REPORT_LINES]
+        write("memory.txt", f"Peak traced memory: {peak} bytes\n\n" + "\n".join(str(stat) for stat in top) + "\n")
+
+        for index, (job, stderr) in enumerate(self.jobs, start=1):
+            write(
+                f"pandoc-{index}.log",
+                f"argv: {' '.join(job.argv)}\n"
+                f"returncode: {job.returncode}\n"
+                f"wall_seconds: {job.wall_seconds:.3f}\n"
+                f"cpu_seconds: {job.cpu_seconds}\n"
+                f"peak_rss_kb: {job.peak_rss_kb}\n"
+                f"output_bytes: {job.output_bytes}\n"
+                f"rts_profile: {job.rts_profile}\n\n"
+                f"{stderr}",
+            )
+
+        call = {
+            "tool": self.tool,
+            "arguments": _summarise(self.arguments),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self._started_at)),
+            "duration_seconds": round(duration, 6),
+            "outcome": outcome,
+            "profiler": "pyinstrument" if self._sampler else "cProfile",
+            "python_peak_bytes": peak,
+            "pandoc_jobs": len(self.jobs),
+        }
+        write("call.json", json.dumps(call, indent=2, default=str) + "\n")
+
+        bundle = os.path.join(directory, name)
+        os.rename(staging, bundle)
+        prune(directory, _keep())
+        logger.info("Profile for %s written to %s", self.tool, bundle)
+        return bundle
@@ -0,0 +1,188 @@
+"""Local fetch cache for remote resources that self-contained output embeds.
+
+A defaults file with ``self-contained: true`` (or ``embed-resources: true``) makes pandoc
+download every remote stylesheet and image it references, on every conversion. This
+module fetches each URL once into the cache and hands pandoc a local path instead, so
+repeated builds never touch the network and keep working offline.
+
+The cache directory is ``resources/`` under the cache root, or ``MCP_PANDOC_RESOURCE_DIR``
+when set; a deployment can pre-populate it by running :func:`fetch` at image build time.
+Set ``MCP_PANDOC_RESOURCE_CACHE=off`` to let pandoc fetch resources itself.
+"""
+import os
+import re
+import tempfile
+import urllib.parse
+
+from .cache import cache_dir, sha256_hex
+
+RESOURCE_DIR_ENV = "MCP_PANDOC_RESOURCE_DIR"
+RESOURCE_CACHE_ENV = "MCP_PANDOC_RESOURCE_CACHE"
+
+FETCH_TIMEOUT_SECONDS = 30
+
+# Defaults-file keys that make pandoc inline remote resources into the output.
+EMBED_KEYS = ("self-contained", "embed-resources")
+
+# Remote references inside markdown and html contents. Only image and stylesheet positions
+# are rewritten; ordinary hyperlinks are navigation, not resources, and stay as they are.
+_MARKDOWN_IMAGE = re.compile(r"(!\[[^\]]*\]\()(https?://[^\s)]+)")
+_HTML_RESOURCE = re.compile(r"""(<(?:img|link|script)\b[^>]*?\b(?:src|href)=["'])(https?://[^"']+)""", re.IGNORECASE)
+
+# References inside a stylesheet, which resolve against the stylesheet's own URL.
+_CSS_URL = re.compile(r"""(url\(\s*(["']?))([^"')\s]+)(\2\s*\))""", re.IGNORECASE)
+_CSS_IMPORT = re.compile(r"""(@import\s+(["']))([^"']+)(\2)""", re.IGNORECASE)
+
+
+def resource_cache_enabled() -> bool:
+    """Return False when MCP_PANDOC_RESOURCE_CACHE turns the cache off."""
+    return os.environ.get(RESOURCE_CACHE_ENV, "on").strip().lower() not in ("0", "off", "false", "no")
+
+
+def resource_cache_dir() -> str:
+    """Return the resource cache directory, honouring MCP_PANDOC_RESOURCE_DIR."""
+    override = os.environ.get(RESOURCE_DIR_ENV)
+    if override:
+        os.makedirs(override, exist_ok=True)
+        return os.path.abspath(override)
+    return cache_dir("resources")
+
+
+def _is_remote(value) -> bool:
+    return isinstance(value, str) and value.startswith(("http://", "https://"))
+
+
+def cached_path(url: str) -> str:
+    """Return where a URL is kept in the cache, whether or not it has been fetched.
+
+    The directory is named by the URL's hash and the file keeps the URL's basename, so
+    pandoc can still infer the MIME type from the extension when it embeds the file.
+    """
+    basename = os.path.basename(urllib.parse.urlparse(url).path) or "resource"
+    return os.path.join(resource_cache_dir(), sha256_hex(url.encode("utf-8")), basename)
+
+
+def _is_stylesheet(url: str, content_type: str | None) -> bool:
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    return mime_type == "text/css" or urllib.parse.urlparse(url).path.lower().endswith(".css")
+
+
+def absolutize_stylesheet(data: bytes, url: str) -> bytes:
+    """Rewrite the relative ``url(...)`` and ``@import`` references of a stylesheet against its URL.
+
+    The cached copy lives under a hash name, so a reference to ``fonts/a.woff2`` would
+    otherwise resolve inside the cache directory instead of next to the original.
+    """
+    # surrogateescape keeps bytes that are not UTF-8 as they were
+    text = data.decode("utf-8", errors="surrogateescape")
+
+    def absolute(match: re.Match) -> str:
+        reference = match.group(3)
+        if reference.startswith(("#", "data:")) or urllib.parse.urlparse(reference).scheme:
+            return match.group(0)
+        return match.group(1) + urllib.parse.urljoin(url, reference) + match.group(4)
+
+    text = _CSS_IMPORT.sub(absolute, _CSS_URL.sub(absolute, text))
+    return text.encode("utf-8", errors="surrogateescape")
+
+
+def fetch(url: str) -> str:
+    """Return a local copy of a URL, downloading it only on first use.
+
+    A stylesheet is stored with its relative references made absolute.
+    """
+    path = cached_path(url)
+    if os.path.exists(path):
+        return path
+
+    import urllib.request
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    request = urllib.request.Request(url, headers={"User-Agent": "mcp-pandoc"})  # noqa: S310
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT_SECONDS) as response:  # noqa: S310
+        data = response.read()
+        if _is_stylesheet(url, response.headers.get("Content-Type")):
+            data = absolutize_stylesheet(data, url)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def _localize(url: str) -> str:
+    """Return a cached path for a URL, or the URL itself if it cannot be fetched.
+
+    A failed fetch is left for pandoc to report, so the error a caller sees is the same
+    one they would get without the cache.
+    """
+    try:
+        return fetch(url).replace(os.sep, "/")
+    except (OSError, ValueError):
+        return url
+
+
+def embeds_resources(defaults: dict | None) -> bool:
+    """Return True when a parsed defaults file asks pandoc to inline resources."""
+    return bool(defaults) and any(defaults.get(key) for key in EMBED_KEYS)
+
+
+def _localize_values(value):
+    """Rewrite remote URLs in a css value, which may be a single string or a list."""
+    if isinstance(value, list):
+        return [_localize(item) if _is_remote(item) else item for item in value]
+    return _localize(value) if _is_remote(value) else value
+
+
+def localize_stylesheets(defaults: dict) -> dict | None:
+    """Return a copy of parsed defaults whose remote stylesheets point into the cache, or None if none do."""
+    rewritten = dict(defaults)
+    changed = False
+
+    if "css" in rewritten:
+        rewritten["css"] = _localize_values(rewritten["css"])
+        changed = rewritten["css"] != defaults["css"]
+
+    # css can also arrive as a template variable or metadata field
+    for key in ("metadata", "variables"):
+        section = rewritten.get(key)
+        if isinstance(section, dict) and "css" in section:
+            localized = _localize_values(section["css"])
+            if localized != section["css"]:
+                rewritten[key] = {**section, "css": localized}
+                changed = True
+
+    return rewritten if changed else None
+
+
+def write_defaults(defaults_file: str, defaults: dict, scratch_dir: str) -> str:
+    """Write parsed defaults into scratch_dir and return the copy's path.
+
+    ``${.}`` in the original refers to the original's directory, so it is expanded before
+    the copy is written elsewhere.
+    """
+    import yaml
+
+    original_dir = os.path.dirname(os.path.abspath(defaults_file)).replace(os.sep, "/")
+    text = yaml.safe_dump(defaults, sort_keys=False, allow_unicode=True).replace("${.}", original_dir)
+    path = os.path.join(scratch_dir, os.path.basename(defaults_file))
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    return path
+
+
+def localize_contents(contents: str, input_format: str) -> str:
+    """Point remote images and stylesheets in markdown or html contents at the cache."""
+    if input_format == "markdown":
+        pattern = _MARKDOWN_IMAGE
+    elif input_format == "html":
+        pattern = _HTML_RESOURCE
+    else:
+        return contents
+    return pattern.sub(lambda match: match.group(1) + _localize(match.group(2)), contents)
@@ -0,0 +1,228 @@
+"""Pick pandoc's GHC runtime options from the size and kind of each input.
+
+pandoc is a GHC program, and its garbage collector settings change both its speed and
+its peak memory. The binaries pandoc ships are linked with ``-with-rtsopts=-H64m``, a
+64 MB suggested heap. That is a poor fit for the small documents most calls convert.
+Measured on the markdown to HTML path, ``-H16m`` made 16 to 64 KB inputs about a quarter
+faster and cut their peak RSS by a third. Above a couple of megabytes, heap hints made no
+reliable difference, but compacting the old generation (``-c``) lowered peak RSS by about
+15% at some cost in time. So:
+
+* ``small`` (under 256 KB) runs with ``-H16m``,
+* ``medium`` (under 2 MB) runs with ``-H32m``,
+* ``large`` keeps the binary's defaults, and becomes ``large-compacting`` with ``-c``
+  when a memory limit is set without a heap limit,
+* heap hints are left out when a memory or heap limit is set, so tuning never changes
+  which jobs the limits refuse,
+* threaded builds also get ``-qg``, since pandoc gains nothing from a parallel collector.
+
+Packaged inputs (docx, odt, epub) are inflated in memory, so they count four times their
+size. Whether the binary accepts ``+RTS`` options at all, and whether it is threaded, is
+probed once with ``+RTS --info``; a binary that rejects them runs with the ``default``
+profile. Set ``MCP_PANDOC_RTS_TUNING=off`` to always run with the binary's defaults.
+
+``python -m mcp_pandoc.rts`` compares the default and tuned settings across input sizes.
+"""
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+RTS_TUNING_ENV = "MCP_PANDOC_RTS_TUNING"
+
+SMALL_INPUT_BYTES = 256 * 1024
+MEDIUM_INPUT_BYTES = 2 * 1024 * 1024
+
+# Packaged inputs are unzipped in memory, so they weigh more than their size on disk.
+_PACKAGED_FORMATS = ("docx", "odt", "epub", "pptx")
+_PACKAGED_EXPANSION = 4
+
+_INFO_ENTRY = re.compile(r'\("([^"]*)",\s*"([^"]*)"\)')
+
+
+@dataclass(frozen=True)
+class RtsSupport:
+    """What the pandoc binary's runtime lets a caller change."""
+
+    accepts_options: bool
+    threaded: bool
+
+
+@dataclass(frozen=True)
+class RtsProfile:
+    """A named set of GHC runtime options for one pandoc job."""
+
+    name: str
+    args: tuple[str, ...] = ()
+
+    def argv(self) -> list[str]:
+        """Return the options as a +RTS ... -RTS block, or nothing for the defaults."""
+        return ["+RTS", *self.args, "-RTS"] if self.args else []
+
+
+DEFAULT_PROFILE = RtsProfile("default")
+
+_support: dict[str, RtsSupport] = {}
+_support_lock = threading.Lock()
+
+
+def tuning_enabled() -> bool:
+    """Whether MCP_PANDOC_RTS_TUNING leaves tuning on, which is the default."""
+    return os.environ.get(RTS_TUNING_ENV, "auto").strip().lower() not in ("0", "off", "false", "no")
+
+
+def probe(pandoc: str) -> RtsSupport:
+    """Return what the binary at ``pandoc`` accepts, running it only the first time."""
+    with _support_lock:
+        if pandoc not in _support:
+            _support[pandoc] = _probe(pandoc)
+        return _support[pandoc]
+
+
+def _probe(pandoc: str) -> RtsSupport:
+    try:
+        info = subprocess.run(  # noqa: S603
+            [pandoc, "+RTS", "--info"], capture_output=True, text=True, timeout=30, check=False
+        )
+        # --info works in every GHC binary; other options need it to be linked with -rtsopts
+        accepted = subprocess.run(  # noqa: S603
+            [pandoc, "+RTS", "-H16m", "-RTS", "--version"], capture_output=True, timeout=30, check=False
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not probe pandoc's runtime options, tuning is off: %s", e)
+        return RtsSupport(accepts_options=False, threaded=False)
+
+    way = dict(_INFO_ENTRY.findall(info.stdout)).get("RTS way", "")
+    support = RtsSupport(accepts_options=accepted.returncode == 0, threaded="thr" in way)
+    logger.info("pandoc runtime: %s, accepts +RTS options: %s", way or "unknown", support.accepts_options)
+    return support
+
+
+def start_probe(pandoc_path) -> threading.Thread | None:
+    """Probe the binary in a daemon thread, so the first conversion does not wait for it."""
+    if not tuning_enabled():
+        return None
+    thread = threading.Thread(target=lambda: probe(pandoc_path()), name="mcp-pandoc-rts-probe", daemon=True)
+    thread.start()
+    return thread
+
+
+def choose_profile(input_bytes: int, input_format: str | None, limits, support: RtsSupport) -> RtsProfile:
+    """Pick the runtime options for one job from its input size and format and the job's limits."""
+    if not support.accepts_options:
+        return DEFAULT_PROFILE
+
+    expansion = _PACKAGED_EXPANSION if input_format in _PACKAGED_FORMATS else 1
+    effective = input_bytes * expansion
+    args: list[str] = []
+    if effective < SMALL_INPUT_BYTES:
+        name, heap_mb = "small", 16
+    elif effective < MEDIUM_INPUT_BYTES:
+        name, heap_mb = "medium", 32
+    else:
+        name, heap_mb = "large", None
+        if limits.memory_mb and not limits.heap_mb:
+            # With -M the runtime already compacts near the cap; without it, only -c does
+            name = "large-compacting"
+            args.append("-c")
+    # A smaller suggested heap lowers peak memory, so under a cap it would move the point where
+    # a job is refused; capped jobs keep the binary's heap and only the limits decide
+    if heap_mb and not (limits.memory_mb or limits.heap_mb):
+        args.append(f"-H{heap_mb}m")
+    if support.threaded:
+        args.append("-qg")
+    return RtsProfile(name, tuple(args))
+
+
+def time_job(argv: list[str], source: bytes) -> tuple[float, int | None]:
+    """Run argv on source and return the wall time in seconds and the peak RSS in KB, where the platform reports it."""
+    started = time.perf_counter()
+    process = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)  # noqa: S603
+    process.stdin.write(source)
+    process.stdin.close()
+    peak_rss_kb = None
+    if hasattr(os, "wait4"):
+        _, _, usage = os.wait4(process.pid, 0)
+        peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    else:
+        process.wait()
+    return time.perf_counter() - started, peak_rss_kb
+
+
+def benchmark(inputs: list[tuple[str, bytes, str]], to: str, repeat: int) -> list[dict]:
+    """Convert each input with the default and the tuned runtime options and keep the best run of each."""
+    from .runner import ResourceLimits, pandoc_path
+
+    pandoc = pandoc_path()
+    support = probe(pandoc)
+    limits = ResourceLimits.from_env()
+    rows = []
+    for label, source, input_format in inputs:
+        tuned = choose_profile(len(source), input_format, limits, support)
+        row = {"input": label, "bytes": len(source), "profile": tuned.name}
+        for setting, profile in (("default", DEFAULT_PROFILE), ("tuned", tuned)):
+            argv = [pandoc, *limits.rts_args(), *profile.argv(), f"--from={input_format}", f"--to={to}"]
+            runs = [time_job(argv, source) for _ in range(repeat)]
+            row[f"{setting}_seconds"] = min(seconds for seconds, _ in runs)
+            row[f"{setting}_peak_rss_kb"] = max((rss or 0) for _, rss in runs) or None
+        rows.append(row)
+    return rows
+
+
+def format_benchmark(rows: list[dict]) -> str:
+    """Render benchmark rows as a plain-text table."""
+    lines = [
+        f"{'input':<24} {'profile':<17} {'default s':>10} {'tuned s':>10} {'default MB':>11} {'tuned MB':>10}"
+    ]
+    for row in rows:
+        default_mb, tuned_mb = (
+            f"{row[key] / 1024:.0f}" if row[key] else "-" for key in ("default_peak_rss_kb", "tuned_peak_rss_kb")
+        )
+        lines.append(
+            f"{row['input']:<24} {row['profile']:<17} {row['default_seconds']:>10.3f} {row['tuned_seconds']:>10.3f} "
+            f"{default_mb:>11} {tuned_mb:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the runtime tuning benchmark from the command line."""
+    import argparse
+
+    from .loadgen import sample_document
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mcp_pandoc.rts", description="Compare pandoc's default and tuned runtime options."
+    )
+    parser.add_argument("--sizes", default="2,16,64,256,1024,4096", help="comma-separated markdown sizes in KB")
+    parser.add_argument("--fixtures", help="directory of fixture files to convert as well, e.g. tests/fixtures")
+    parser.add_argument("--to", default="html", help="output format")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per input and setting")
+    args = parser.parse_args(argv)
+
+    from .runner import input_format_for
+
+    inputs = [
+        (f"markdown {size} KB", sample_document(int(size)).encode("utf-8"), "markdown")
+        for size in args.sizes.split(",")
+        if size.strip()
+    ]
+    if args.fixtures:
+        for name in sorted(os.listdir(args.fixtures)):
+            reader = input_format_for(name)
+            if reader in ("txt", "pdf"):
+                continue
+            with open(os.path.join(args.fixtures, name), "rb") as f:
+                inputs.append((name, f.read(), reader))
+    print(format_benchmark(benchmark(inputs, args.to, max(1, args.repeat))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""Run pandoc as a child process under per-job resource limits.
+
+pypandoc starts pandoc with a plain ``subprocess.Popen``, which leaves no way to cap what
+the child may consume. One oversized input can then make pandoc, or a filter or TeX
+engine it starts, take enough memory to get the whole container OOM-killed. This module
+builds the same command line pypandoc would and runs it with:
+
+* ``RLIMIT_AS`` and ``RLIMIT_CPU``, set in the child before pandoc starts, so they are
+  inherited by every filter and TeX engine pandoc spawns (POSIX only). The server runs
+  several threads, so the limits are not set between fork and exec with ``preexec_fn``,
+  which can deadlock on a lock another thread held. pandoc is started through
+  util-linux's ``prlimit`` instead, or where that is missing through a few lines of Python
+  that set the limits and exec pandoc,
+* pandoc's own GHC heap cap, ``+RTS -M``, which fails cleanly before the address space
+  limit is reached,
+* a maximum output size, enforced with ``RLIMIT_FSIZE`` for files and by counting bytes
+  for output returned inline.
+
+Breaching any of them raises :class:`ResourceLimitError` rather than taking the server
+down. Limits are read from the environment; every one is off unless set:
+
+``MCP_PANDOC_LIMIT_MEMORY_MB``, ``MCP_PANDOC_LIMIT_CPU_SECONDS``,
+``MCP_PANDOC_LIMIT_HEAP_MB`` and ``MCP_PANDOC_LIMIT_OUTPUT_MB``.
+
+The peak resident size and CPU time of every job, including the children pandoc waited
+for, are kept in :data:`JOB_HISTORY`, along with the runtime tuning profile it ran with
+(see :mod:`mcp_pandoc.rts`).
+"""
+import collections
+import contextvars
+import functools
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from opentelemetry.trace import StatusCode
+
+from . import forkserver
+from .metrics import CHILD_PEAK_RSS_BYTES, JOBS_RUNNING, RTS_PROFILE_JOBS
+from .rts import DEFAULT_PROFILE, choose_profile, probe, tuning_enabled
+from .tracing import argv_summary, record_child_processes, tracer
+
+logger = logging.getLogger(__name__)
+
+MEMORY_LIMIT_ENV = "MCP_PANDOC_LIMIT_MEMORY_MB"
+CPU_LIMIT_ENV = "MCP_PANDOC_LIMIT_CPU_SECONDS"
+HEAP_LIMIT_ENV = "MCP_PANDOC_LIMIT_HEAP_MB"
+OUTPUT_LIMIT_ENV = "MCP_PANDOC_LIMIT_OUTPUT_MB"
+
+# How many finished jobs JOB_HISTORY keeps.
+JOB_HISTORY_SIZE = 200
+
+# Exit status GHC programs use for heap exhaustion and out-of-memory.
+_GHC_OUT_OF_MEMORY_EXIT = 251
+
+_READ_BLOCK_SIZE = 64 * 1024
+_MB = 1024 * 1024
+
+# Same normalisation pypandoc applies to names inferred from file extensions.
+_EXTENSION_FORMATS = {"md": "markdown", "tex": "latex", "dbk": "docbook"}
+
+# ru_maxrss is kilobytes on Linux and bytes on macOS.
+_MAXRSS_TO_KB = 1 / 1024 if sys.platform == "darwin" else 1
+
+# Sets the rlimits given as NAME:SOFT:HARD,... and execs the command, when prlimit is not installed.
+_SETRLIMIT_EXEC = (
+    "import os, resource, sys\n"
+    "for limit in sys.argv[1].split(','):\n"
+    "    name, soft, hard = limit.split(':')\n"
+    "    resource.setrlimit(getattr(resource, 'RLIMIT_' + name), (int(soft), int(hard)))\n"
+    "os.execvp(sys.argv[2], sys.argv[2:])\n"
+)
+
+
+class ResourceLimitError(RuntimeError):
+    """A pandoc job was stopped for exceeding one of its resource limits."""
+
+    def __init__(self, limit: str, message: str):
+        """Record which limit was breached alongside the message."""
+        super().__init__(message)
+        self.limit = limit
+
+
+def _env_limit(name: str) -> int | None:
+    """Read a positive integer limit from the environment, or None when unset."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        parsed = int(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be a whole number, got {value!r}") from e
+    if parsed <= 0:
+        raise ValueError(f"{name} must be greater than zero, got {parsed}")
+    return parsed
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Caps applied to one pandoc job and the processes it starts."""
+
+    memory_mb: int | None = None
+    cpu_seconds: int | None = None
+    heap_mb: int | None = None
+    output_mb: int | None = None
+
+    @classmethod
+    def from_env(cls) -> "ResourceLimits":
+        """Build limits from the MCP_PANDOC_LIMIT_* environment variables."""
+        return cls(
+            memory_mb=_env_limit(MEMORY_LIMIT_ENV),
+            cpu_seconds=_env_limit(CPU_LIMIT_ENV),
+            heap_mb=_env_limit(HEAP_LIMIT_ENV),
+            output_mb=_env_limit(OUTPUT_LIMIT_ENV),
+        )
+
+    def rts_args(self) -> list[str]:
+        """Return the GHC runtime options for the heap cap."""
+        return ["+RTS", f"-M{self.heap_mb}m", "-RTS"] if self.heap_mb else []
+
+    def rlimits(self) -> list[tuple[str, int, int]]:
+        """Return the rlimits to set, as resource names without RLIMIT_ and soft and hard values."""
+        if os.name != "posix" or not (self.memory_mb or self.cpu_seconds or self.output_mb):
+            return []
+        # A process killed by a limit should not also write a multi-GB core file
+        rlimits = [("CORE", 0, 0)]
+        if self.memory_mb:
+            rlimits.append(("AS", self.memory_mb * _MB, self.memory_mb * _MB))
+        if self.cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL one second later if it is ignored
+            rlimits.append(("CPU", self.cpu_seconds, self.cpu_seconds + 1))
+        if self.output_mb:
+            rlimits.append(("FSIZE", self.output_mb * _MB, self.output_mb * _MB))
+        return rlimits
+
+    def wrap(self, argv: list[str]) -> list[str]:
+        """Return argv started under the rlimits, or argv itself when there are none.
+
+        The wrapper execs the command, so it keeps the pid and its exit status and rusage
+        are the command's own.
+        """
+        rlimits = self.rlimits()
+        if not rlimits:
+            return argv
+        prlimit = _prlimit_path()
+        if prlimit:
+            return [prlimit, *(f"--{name.lower()}={soft}:{hard}" for name, soft, hard in rlimits), *argv]
+        spec = ",".join(f"{name}:{soft}:{hard}" for name, soft, hard in rlimits)
+        return [sys.executable, "-I", "-S", "-c", _SETRLIMIT_EXEC, spec, *argv]
+
+
+@functools.cache
+def _prlimit_path() -> str | None:
+    # Only util-linux's prlimit takes a command to run; it is not on macOS
+    return shutil.which("prlimit") if sys.platform.startswith("linux") else None
+
+
+@dataclass
+class JobUsage:
+    """Resources one pandoc job used, including children pandoc waited for."""
+
+    argv: list[str]
+    pid: int
+    returncode: int
+    wall_seconds: float
+    cpu_seconds: float | None
+    peak_rss_kb: int | None
+    output_bytes: int
+    rts_profile: str = DEFAULT_PROFILE.name
+
+
+JOB_HISTORY: collections.deque[JobUsage] = collections.deque(maxlen=JOB_HISTORY_SIZE)
+
+# While set, every job runs with --verbose and +RTS -s, and its usage and stderr are
+# appended here. Profiling uses this to capture pandoc's own timings for one call.
+JOB_CAPTURE: contextvars.ContextVar[list | None] = contextvars.ContextVar("mcp_pandoc_job_capture", default=None)
+
+
+def pandoc_path() -> str:
+    """Return the pandoc binary pypandoc would run."""
+    import pypandoc
+
+    return pypandoc.get_pandoc_path()
+
+
+def pandoc_identity() -> str:
+    """Identify the pandoc binary, for cache keys of anything its version decides."""
+    path = shutil.which(pandoc_path()) or pandoc_path()
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def input_format_for(input_file: str) -> str:
+    """Infer the reader from a file extension, the way pypandoc.convert_file does."""
+    extension = os.path.splitext(input_file)[1].lstrip(".").lower()
+    return _EXTENSION_FORMATS.get(extension, extension)
+
+
+def _classify(limits: ResourceLimits, job: "JobUsage", stderr: str) -> ResourceLimitError | None:
+    """Work out which limit, if any, stopped a job that did not exit cleanly.
+
+    A filter or TeX engine stopped by a limit makes pandoc exit with its own error code,
+    so CPU usage and pandoc's report of the child's signal are checked as well.
+    """
+    returncode = job.returncode
+    file_too_large = hasattr(signal, "SIGXFSZ") and returncode == -signal.SIGXFSZ
+    if limits.output_mb and (file_too_large or job.output_bytes > limits.output_mb * _MB):
+        return ResourceLimitError("output", f"pandoc output exceeded the {limits.output_mb} MB output size limit")
+    if returncode == 0:
+        return None
+    cpu_signal = hasattr(signal, "SIGXCPU") and (
+        returncode in (-signal.SIGXCPU, -signal.SIGKILL)
+        # A filter's own CPU time can be accounted just under the limit it was stopped at
+        or f"error status -{signal.SIGXCPU}" in stderr
+        # A forkserver shim exits with 128 plus the signal that stopped its filter
+        or f"error status {128 + signal.SIGXCPU}" in stderr
+    )
+    cpu_spent = job.cpu_seconds is not None and limits.cpu_seconds and job.cpu_seconds >= limits.cpu_seconds
+    if limits.cpu_seconds and (cpu_signal or cpu_spent):
+        return ResourceLimitError("cpu", f"pandoc exceeded the {limits.cpu_seconds} second CPU time limit")
+    if limits.heap_mb and "Heap exhausted" in stderr:
+        return ResourceLimitError("heap", f"pandoc exceeded the {limits.heap_mb} MB heap limit")
+    out_of_memory = returncode == _GHC_OUT_OF_MEMORY_EXIT or "out of memory" in stderr.lower()
+    if limits.memory_mb and (out_of_memory or returncode == -signal.SIGSEGV):
+        return ResourceLimitError("memory", f"pandoc exceeded the {limits.memory_mb} MB memory limit")
+    return None
+
+
+def _strip_info_log(lines: list[str]) -> str:
+    """Drop pandoc's [INFO] log entries, and their indented continuation lines, from stderr."""
+    kept = []
+    in_info = False
+    for line in lines:
+        if line.startswith("[INFO]"):
+            in_info = True
+        elif not (in_info and line.startswith(" ")):
+            in_info = False
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def _communicate(process: subprocess.Popen, source: bytes | None, limits: ResourceLimits):
+    """Feed stdin, collect stdout and stderr, and reap the process with its resource usage.
+
+    Returns stdout, the stderr lines each with the time it was read in nanoseconds since
+    the epoch, and a ``(cpu_seconds, peak_rss_kb)`` pair, which is ``(None, None)`` where
+    ``os.wait4`` is not available.
+    """
+    stderr_lines: list[tuple[int, bytes]] = []
+
+    def read_stderr():
+        # Line by line, so tracing can tell when pandoc started each filter or TeX run
+        for line in iter(process.stderr.readline, b""):
+            stderr_lines.append((time.time_ns(), line))
+
+    readers = [threading.Thread(target=read_stderr, daemon=True)]
+    if source is not None:
+        def feed():
+            try:
+                process.stdin.write(source)
+            except (BrokenPipeError, OSError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        readers.append(threading.Thread(target=feed, daemon=True))
+    for thread in readers:
+        thread.start()
+
+    # Read stdout here so an inline result that outgrows the limit can be stopped early
+    stdout = bytearray()
+    output_cap = limits.output_mb * _MB if limits.output_mb else None
+    for block in iter(lambda: process.stdout.read(_READ_BLOCK_SIZE), b""):
+        stdout.extend(block)
+        if output_cap and len(stdout) > output_cap:
+            process.kill()
+            break
+    process.stdout.close()
+    for thread in readers:
+        thread.join()
+    process.stderr.close()
+
+    cpu_seconds = peak_rss_kb = None
+    if hasattr(os, "wait4"):
+        # wait4 reports the usage of the child and of every descendant it reaped
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        peak_rss_kb = int(usage.ru_maxrss * _MAXRSS_TO_KB)
+    else:
+        process.wait()
+
+    return stdout, stderr_lines, (cpu_seconds, peak_rss_kb)
+
+
+def run_pandoc(
+    to: str,
+    *,
+    source: str | bytes | None = None,
+    input_file: str | None = None,
+    input_format: str | None = None,
+    outputfile: str | None = None,
+    extra_args=(),
+    limits: ResourceLimits | None = None,
+) -> str:
+    """Convert with pandoc under resource limits and return its standard output.
+
+    Mirrors pypandoc.convert_text (``source``) and pypandoc.convert_file (``input_file``),
+    including the RuntimeError raised when pandoc exits non-zero.
+    """
+    limits = limits if limits is not None else ResourceLimits.from_env()
+    if input_file and not input_format:
+        input_format = input_format_for(input_file)
+
+    with tracer.start_as_current_span("pandoc", attributes={"mcp_pandoc.to": to}) as span:
+        return _run(span, to, source, input_file, input_format, outputfile, extra_args, limits)
+
+
+def _run(span, to, source, input_file, input_format, outputfile, extra_args, limits: ResourceLimits) -> str:
+    capture = JOB_CAPTURE.get()
+    # Filter and TeX runs are only visible in the --verbose log
+    verbose = capture is not None or span.is_recording()
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+
+    pandoc = pandoc_path()
+    profile = DEFAULT_PROFILE
+    if tuning_enabled():
+        if source is not None:
+            input_bytes = len(source)
+        else:
+            input_bytes = os.path.getsize(input_file) if input_file and os.path.isfile(input_file) else 0
+        profile = choose_profile(input_bytes, input_format, limits, probe(pandoc))
+    argv = [pandoc, *limits.rts_args(), *profile.argv()]
+    if capture is not None:
+        argv.extend(["+RTS", "-s", "-RTS"])
+    if verbose:
+        argv.append("--verbose")
+    argv.extend([f"--from={input_format}", f"--to={to}"])
+    if input_file:
+        argv.append(input_file)
+    if outputfile:
+        argv.append(f"--output={outputfile}")
+    argv.extend(extra_args)
+
+    # Filters forked by the forkserver report their usage here, as they are not pandoc's children
+    usage_file = forkserver.usage_file(extra_args)
+    started = time.perf_counter()
+    process = subprocess.Popen(  # noqa: S603
+        limits.wrap(argv),
+        stdin=subprocess.PIPE if source is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env={**os.environ, forkserver.USAGE_ENV: usage_file} if usage_file else None,
+    )
+    span.set_attributes({
+        "process.pid": process.pid,
+        "process.command_line": argv_summary(argv),
+        "mcp_pandoc.rts_profile": profile.name,
+    })
+    JOBS_RUNNING.inc()
+    try:
+        stdout, stderr_lines, (cpu_seconds, peak_rss_kb) = _communicate(process, source, limits)
+    finally:
+        JOBS_RUNNING.dec()
+    ended_ns = time.time_ns()
+    if usage_file:
+        filter_cpu_seconds, filter_peak_rss_kb = forkserver.read_usage(usage_file)
+        if cpu_seconds is not None:
+            cpu_seconds += filter_cpu_seconds
+            peak_rss_kb = max(peak_rss_kb, filter_peak_rss_kb)
+
+    output_bytes = len(stdout) or (os.path.getsize(outputfile) if outputfile and os.path.exists(outputfile) else 0)
+    job = JobUsage(
+        argv=argv,
+        pid=process.pid,
+        returncode=process.returncode,
+        wall_seconds=time.perf_counter() - started,
+        cpu_seconds=cpu_seconds,
+        peak_rss_kb=peak_rss_kb,
+        output_bytes=output_bytes,
+        rts_profile=profile.name,
+    )
+    JOB_HISTORY.append(job)
+    RTS_PROFILE_JOBS.inc(profile=profile.name)
+    if peak_rss_kb is not None:
+        CHILD_PEAK_RSS_BYTES.set(peak_rss_kb * 1024)
+    logger.debug(
+        "pandoc job %s exited %s in %.3fs (cpu %ss, peak rss %s KB, output %s bytes, rts profile %s)",
+        job.pid, job.returncode, job.wall_seconds, job.cpu_seconds, job.peak_rss_kb, job.output_bytes,
+        job.rts_profile,
+    )
+
+    decoded = [(at_ns, line.decode("utf-8", errors="replace").rstrip("\r\n")) for at_ns, line in stderr_lines]
+    stderr = "".join(line.decode("utf-8", errors="replace") for _, line in stderr_lines)
+    span.set_attribute("process.exit.code", process.returncode)
+    if span.is_recording():
+        record_child_processes(span, decoded, ended_ns)
+    if capture is not None:
+        capture.append((job, stderr))
+    if verbose:
+        # The log lines were asked for here, not by the user, so keep them out of errors
+        stderr = _strip_info_log([line for _, line in decoded])
+    stderr = forkserver.restore_filter_paths(stderr)
+    breach = _classify(limits, job, stderr)
+    if breach:
+        span.set_status(StatusCode.ERROR, str(breach))
+        raise breach
+    if process.returncode != 0:
+        span.set_status(StatusCode.ERROR, f"exit code {process.returncode}")
+        raise RuntimeError(f'Pandoc died with exitcode "{process.returncode}" during conversion: {stderr}')
+    return stdout.decode("utf-8", errors="replace")
@@ -1,12 +1,64 @@
 """mcp-pandoc server module."""
+import asyncio
+import json
+import logging
 import os
+import shutil
+import tempfile
 
 import mcp.server.stdio
 import mcp.types as types
-import pypandoc
-import yaml
-from jsonschema import ValidationError, validate
 from mcp.server import Server, ServerRequestContext
+from opentelemetry.trace import StatusCode
+
+from .bibliography import (
+    bibliography_cache_enabled,
+    cache_bibliographies,
+    source_keys,
+    uses_citeproc,
+)
+from .blobs import decode_blob, memory_report, resource_source
+from .book import AST_READERS, build_book
+from .cache import file_sha256, sha256_hex
+from .chunks import (
+    MIN_CHUNK_BYTES,
+    build_chunks,
+    describe_heading_path,
+    document_key,
+    load_manifest,
+    read_chunk,
+    render_blocks,
+    save_document,
+)
+from .documents import document_ast, document_ttl_seconds, get_document, register_document
+from .draft import render_draft_pdf
+from .forkserver import filter_command
+from .images import DISPLAY_SIZE_FORMATS, IMAGE_OUTPUT_FORMATS, optimize_images, pillow_available
+from .incremental import INCREMENTAL_FORMATS, render_incremental
+from .media import MediaReport, externalize_media
+from .metrics import CALLS_IN_FLIGHT, CONVERSION_ERRORS, PhaseTimer, start_metrics_server, write_textfile
+from .notebooks import NotebookTrim, trim_notebook
+from .outputs import commit_output, temp_output_path
+from .profiling import CallProfiler
+from .resources import (
+    embeds_resources,
+    localize_contents,
+    localize_stylesheets,
+    resource_cache_enabled,
+    write_defaults,
+)
+from .rts import start_probe as start_rts_probe
+from .runner import ResourceLimitError, input_format_for, pandoc_path, run_pandoc
+from .sniff import AUTO, sniff_bytes, sniff_file, sniff_misnamed_file, sniff_text
+from .structure import DEFAULT_MAX_ITEMS, format_report, inspect_document
+from .structure import QUERIES as STRUCTURE_QUERIES
+from .tracing import call_span, configure_tracing, tracer
+from .warmup import SAMPLE_DOCUMENT, start_warmup
+from .watch import TARGET_ARGUMENTS as WATCH_TARGET_ARGUMENTS
+from .watch import WatchService
+from .webpages import HtmlReduction, html_blocks, html_file_blocks, reduce_html
+
+logger = logging.getLogger(__name__)
 
 # Pandoc reads and writes different sets of formats, so these two lists are deliberately
 # separate and must not be collapsed back into one. Only add a format to the direction
@@ -24,6 +76,34 @@ ADVANCED_FORMATS = ("pdf", "docx", "rst", "latex", "epub", "odt", "pptx")
 # Output formats that accept pandoc's --reference-doc.
 REFERENCE_DOC_FORMATS = ("docx", "odt", "pptx")
 
+# Output formats written as binary packages rather than text. Their output cannot be
+# post-processed as a string, so text rewrites such as extract_media do not apply.
+BINARY_OUTPUT_FORMATS = ("pdf", "docx", "epub", "odt", "pptx")
+
+# Text writers whose output is a plain sequence of blocks, so any run of blocks is valid on its own.
+# ipynb is one JSON document, and latex and rst chunks would lose their preamble and link targets.
+CHUNK_OUTPUT_FORMATS = ("markdown", "html", "txt")
+
+# Arguments that name what to convert.
+SOURCE_ARGUMENTS = ("contents", "contents_base64", "resource", "document_id", "input_file", "input_files")
+
+# Sources inspect-document can summarize.
+INSPECT_SOURCE_ARGUMENTS = ("contents", "contents_base64", "document_id", "input_file")
+
+# Sources register-document can store.
+REGISTER_SOURCE_ARGUMENTS = ("contents", "contents_base64", "resource")
+
+# Defaults file keys that change how the source is read, so a cached AST cannot stand in for it.
+READER_DEFAULTS_KEYS = ("from", "reader", "extract-media", "file-scope")
+
+# Defaults-file keys left out of a second writer pass over an AST that has already been through them.
+WRITER_PASS_DROPPED_KEYS = (
+    *READER_DEFAULTS_KEYS, "to", "writer", "input-file", "input-files", "output-file", "filters", "citeproc",
+)
+
+# Engine and page setup used for every PDF.
+PDF_ARGS = ("--pdf-engine=xelatex", "-V", "geometry:margin=1in")
+
 
 def _join_with_and(values) -> str:
     """Render a sequence as 'a', 'a and b', or 'a, b and c'."""
@@ -33,12 +113,237 @@ def _join_with_and(values) -> str:
     return f"{', '.join(values[:-1])} and {values[-1]}"
 
 
+def _writer_args(extra_args, defaults_file, scratch_dir) -> list[str]:
+    """Return the arguments a writer pass over an already filtered AST needs from extra_args.
+
+    That is the resource path and the defaults file's writer options (template, variables, wrap, highlight
+    style and so on). Its reader options, filters and citeproc were applied when the AST was made.
+    """
+    import yaml
+
+    writer_args = [arg for arg in extra_args if arg.startswith("--resource-path=")]
+    if "--defaults" in extra_args:
+        # The defaults in use, which may be a rewritten copy of defaults_file
+        with open(extra_args[extra_args.index("--defaults") + 1], encoding="utf-8") as f:
+            defaults = yaml.safe_load(f) or {}
+        writer_defaults = {key: value for key, value in defaults.items() if key not in WRITER_PASS_DROPPED_KEYS}
+        writer_args.extend(["--defaults", write_defaults(defaults_file, writer_defaults, scratch_dir)])
+    return writer_args
+
+
+def _convert_chunked(
+    input_file, contents, input_format, output_format, pandoc_output_format, chunk_max_bytes, extra_args,
+    validated_filters, defaults_file, media_dir, media_report,
+) -> str:
+    """Convert a source into heading-aware chunks and return the manifest as a tool message.
+
+    The manifest is cached by source hash and conversion options, so converting the same
+    source again returns it without running pandoc.
+    """
+    if input_file:
+        source_hash = file_sha256(input_file)
+    else:
+        source_hash = sha256_hex(contents if isinstance(contents, bytes) else contents.encode("utf-8"))
+    document_id = document_key(
+        source_hash,
+        {
+            # None for a file read with the reader its extension gives
+            "input_format": input_format,
+            "output_format": output_format,
+            "max_bytes": chunk_max_bytes,
+            "filters": [file_sha256(path) for path in validated_filters],
+            "defaults": file_sha256(defaults_file) if defaults_file else None,
+            "extract_media": bool(media_dir),
+        },
+    )
+
+    manifest = load_manifest(document_id)
+    cached = manifest is not None
+    if not cached:
+        # --to comes last so a 'to' key in a defaults file cannot override the AST writer
+        reader_args = [*extra_args, "--to=json"]
+        if input_file:
+            ast_json = run_pandoc("json", input_file=input_file, input_format=input_format, extra_args=reader_args)
+        else:
+            ast_json = run_pandoc("json", source=contents, input_format=input_format, extra_args=reader_args)
+        ast = json.loads(ast_json)
+
+        # Footnotes go after the block that cites them, so they stay in the same chunk
+        scratch_dir = tempfile.mkdtemp(prefix="mcp-pandoc-chunks-")
+        try:
+            render_args = [*_writer_args(extra_args, defaults_file, scratch_dir), "--reference-location=block"]
+            block_texts = render_blocks(
+                ast,
+                lambda source: run_pandoc(
+                    pandoc_output_format, source=source, input_format="json", extra_args=render_args
+                ),
+            )
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        if media_dir:
+            # One pass over the extracted files for the whole document, not one per block
+            joined, report = externalize_media("\0".join(block_texts), media_dir)
+            block_texts = joined.split("\0")
+            media_report.merge(report)
+
+        text, entries = build_chunks(ast, block_texts, chunk_max_bytes)
+        if not entries:
+            raise ValueError("Conversion resulted in empty output")
+        manifest = save_document(
+            document_id,
+            text,
+            {
+                "source_sha256": source_hash,
+                "output_format": output_format,
+                "max_bytes": chunk_max_bytes,
+                "total_bytes": len(text.encode("utf-8")),
+                "chunks": entries,
+            },
+        )
+
+    media_info = f"{media_report.summary()}.\n" if media_dir and not cached else ""
+    return (
+        f"Converted to {len(manifest['chunks'])} chunks in {output_format} format "
+        f"(document_id: {document_id}, {'served from the chunk cache' if cached else 'newly chunked'}).\n"
+        f"{media_info}"
+        f"Fetch a chunk with the get-chunk tool and its id. Byte offsets index the assembled document.\n"
+        f"Chunk manifest:\n\n{json.dumps(manifest, indent=2, ensure_ascii=False)}"
+    )
+
+
+def _get_chunk(arguments: dict) -> str:
+    """Return one cached chunk, with a pointer to the next one for paging through a document."""
+    manifest, entry, text = read_chunk(arguments["chunk_id"])
+    chunks = manifest["chunks"]
+    next_id = chunks[entry["ordinal"]]["id"] if entry["ordinal"] < len(chunks) else None
+    return (
+        f"Chunk {entry['ordinal']} of {len(chunks)} (chunk_id: {entry['id']}) in {manifest['output_format']} format.\n"
+        f"Heading path: {describe_heading_path(entry)}\n"
+        f"Bytes {entry['start']}-{entry['end']} of {manifest['total_bytes']}\n"
+        f"Next chunk_id: {next_id or 'none, this is the last chunk'}\n"
+        f"Chunk contents:\n\n{text}"
+    )
+
+
+def _inspect_document(arguments: dict) -> str:
+    """Summarize the structure of one document from its cached AST."""
+    sources = [key for key in INSPECT_SOURCE_ARGUMENTS if arguments.get(key)]
+    if len(sources) != 1:
+        raise ValueError(
+            "Exactly one of 'contents', 'contents_base64', 'document_id' or 'input_file' must be provided"
+        )
+
+    input_file = arguments.get("input_file")
+    input_format = (arguments.get("input_format") or "").lower()
+    source = None
+    if arguments.get("document_id"):
+        # The document id is its content hash, so the AST cached here is the one conversions use
+        document = get_document(arguments["document_id"])
+        source = document.contents
+        if input_format and input_format != AUTO:
+            reader = input_format
+        else:
+            reader = document.input_format or (
+                sniff_bytes(source) if isinstance(source, bytes) else sniff_text(source)
+            ) or "markdown"
+    elif input_file:
+        if not os.path.isfile(input_file):
+            raise ValueError(f"Input file not found: {input_file}")
+        if input_format == AUTO:
+            reader = sniff_file(input_file) or input_format_for(input_file)
+        else:
+            reader = input_format or sniff_misnamed_file(input_file, input_format_for(input_file)) or (
+                input_format_for(input_file)
+            )
+    else:
+        contents_base64 = arguments.get("contents_base64")
+        source = decode_blob(contents_base64) if contents_base64 else arguments["contents"]
+        if input_format and input_format != AUTO:
+            reader = input_format
+        else:
+            reader = (sniff_bytes(source) if isinstance(source, bytes) else sniff_text(source)) or "markdown"
+    if reader not in INPUT_FORMATS:
+        raise ValueError(
+            f"Unsupported input format: '{reader}'. Supported input formats are: {', '.join(INPUT_FORMATS)}"
+        )
+
+    # pandoc has no txt reader; plain text is read as markdown
+    reader = "markdown" if reader == "txt" else reader
+    try:
+        report, cached = inspect_document(reader, input_file=input_file, source=source)
+    except RuntimeError as e:
+        raise ValueError(f"Error reading {input_file or 'contents'}: {e}") from e
+    return format_report(
+        input_file or arguments.get("document_id") or "contents", reader, report, cached,
+        arguments.get("include") or STRUCTURE_QUERIES, arguments.get("max_items", DEFAULT_MAX_ITEMS),
+    )
+
+
+def _register_document(arguments: dict) -> str:
+    """Store a source for later calls and describe the handle it was given."""
+    sources = [key for key in REGISTER_SOURCE_ARGUMENTS if arguments.get(key)]
+    if len(sources) != 1:
+        raise ValueError("Exactly one of 'contents', 'contents_base64' or 'resource' must be provided")
+
+    input_format = (arguments.get("input_format") or "").lower() or None
+    if arguments.get("resource"):
+        contents, resource_format = resource_source(arguments["resource"])
+        input_format = input_format or resource_format
+    elif arguments.get("contents_base64"):
+        contents = decode_blob(arguments["contents_base64"])
+    else:
+        contents = arguments["contents"]
+
+    document, new = register_document(contents, input_format)
+    kind = "text" if document.text else "binary data"
+    reader = f", read as {document.input_format}" if document.input_format else ""
+    return (
+        f"{'Registered' if new else 'Already registered:'} document_id {document.document_id} "
+        f"({len(document.data):,} bytes of {kind}{reader}).\n"
+        f"Pass document_id to convert-contents or inspect-document instead of sending the contents again. "
+        f"The document is kept for {document_ttl_seconds()} seconds after its last use."
+    )
+
+
+def _build_watched(arguments: dict) -> str:
+    """Run one build of a watched target; called on a watch pool thread."""
+    return asyncio.run(handle_call_tool("convert-contents", arguments))[0].text
+
+
+WATCH = WatchService(_build_watched)
+
+
+async def _watch(arguments: dict) -> str:
+    """Register, remove or report watched build targets."""
+    action = arguments.get("action")
+    output_file = arguments.get("output_file")
+
+    if action == "add":
+        await asyncio.wrap_future(WATCH.add(arguments))
+        status = WATCH.status(output_file)[0]
+        return (
+            f"Watching {len(status['dependencies'])} files for {status['output_file']}. "
+            f"Initial build: {status['state']} in {status['last_duration_seconds']}s.\n\n"
+            f"{json.dumps(status, indent=2)}"
+        )
+    if action == "remove":
+        if not output_file:
+            raise ValueError("output_file is required to remove a watched target")
+        if not WATCH.remove(output_file):
+            raise ValueError(f"No watched target writes {output_file}")
+        return f"Stopped watching {os.path.abspath(output_file)}; the output file was left in place."
+    if action == "status":
+        statuses = WATCH.status(output_file)
+        return f"{len(statuses)} watched target(s).\n\n{json.dumps(statuses, indent=2)}"
+    raise ValueError(f"Unknown watch action: {action}")
+
+
 async def handle_list_tools() -> list[types.Tool]:
     """List available tools.
 
     Each tool specifies its arguments using JSON Schema validation.
     """
-    return [
+    tools = [
         types.Tool(
             name="convert-contents",
             description=(
@@ -118,6 +423,45 @@ async def handle_list_tools() -> list[types.Tool]:
                 "   * Options in the defaults file can include filters, reference-doc, and other Pandoc options\n"
                 "   * Example: 'Convert this markdown to DOCX using defaults_file=\"/path/to/defaults.yaml\" "
                 "and save as /reports/report.docx'\n\n"
+                "🖼️ Embedded Media:\n"
+                "8. Extracting images from inbound documents:\n"
+                "   * Set extract_media=true when converting docx, odt or epub (or html with data URIs) to a\n"
+                "     text format such as markdown or html\n"
+                "   * Images are stored once per unique content and the converted text points at stable\n"
+                "     file paths instead of broken links or inline base64\n\n"
+                "📑 Chunked Output for Large Documents:\n"
+                "9. Splitting a long document on its headings:\n"
+                "   * Set chunk_max_bytes (and no output_file) to receive a manifest of chunks instead of the\n"
+                "     whole converted document. Each chunk starts at a heading and carries its heading path,\n"
+                "     ordinal and byte offsets\n"
+                "   * Read chunks one at a time with the get-chunk tool; the source is not converted again\n\n"
+                "📚 Multi-file Books:\n"
+                "10. Building one document from chapter files:\n"
+                "   * Pass the chapters in order as input_files instead of input_file or contents\n"
+                "   * Each chapter is parsed once and cached; after editing one chapter only that chapter is\n"
+                "     read again before the book is written\n\n"
+                "📦 Binary Inputs Without a File:\n"
+                "11. Sending a docx, odt or epub inside the call:\n"
+                "   * Pass it base64-encoded as contents_base64, or as the resource of an embedded resource,\n"
+                "     instead of copying it onto the server first. The reader comes from input_format, the\n"
+                "     resource's mimeType, or the payload itself\n\n"
+                "🔖 Converting One Document Several Times:\n"
+                "12. Sending large contents once:\n"
+                "   * Store it with register-document and pass the returned document_id instead of contents\n"
+                "     to each conversion, for example to html, then docx, then pdf\n\n"
+                "📐 Checking a PDF's Layout:\n"
+                "13. Previewing before the final PDF:\n"
+                "   * Set draft for a quick PDF from one TeX pass with placeholder images, labeled DRAFT on every\n"
+                "     page; add draft_pages to write only the first pages. Convert without draft for the final PDF\n\n"
+                "🖼️ Smaller docx, pptx and epub Files:\n"
+                "14. Shrinking full-resolution screenshots and photos:\n"
+                "   * Set image_dpi (docx, pptx) or image_max_pixels to scale embedded images down and recompress\n"
+                "     them; the result reports the bytes saved\n\n"
+                "🌐 Heavy Web Pages:\n"
+                "15. Converting a saved page without its scripts and page chrome:\n"
+                "   * Set html_reduce with html input to remove scripts, styles, inline SVG, navigation, tracking\n"
+                "     pixels and presentation attributes before pandoc parses the page. Add rules with\n"
+                "     html_drop_elements and html_drop_attributes, and exempt defaults with html_keep_elements\n\n"
                 "Note: After conversion, always check the success message for the exact file location."
             ),
             input_schema={
@@ -127,6 +471,34 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "string",
                         "description": "The content to be converted (required if input_file not provided)"
                     },
+                    "contents_base64": {
+                        "type": "string",
+                        "description": (
+                            "Base64-encoded source, for binary documents such as docx, odt or epub that are not on "
+                            "the server's filesystem. Used instead of contents or input_file."
+                        )
+                    },
+                    "resource": {
+                        "type": "object",
+                        "description": (
+                            "The resource of an MCP embedded resource to convert, with a base64 blob or text. Its "
+                            "mimeType picks the reader when input_format is not given. Used instead of contents "
+                            "or input_file."
+                        ),
+                        "properties": {
+                            "uri": {"type": "string"},
+                            "mimeType": {"type": "string"},
+                            "blob": {"type": "string"},
+                            "text": {"type": "string"}
+                        }
+                    },
+                    "document_id": {
+                        "type": "string",
+                        "description": (
+                            "Handle of a document stored with register-document, used instead of contents. "
+                            "Text formats are parsed once per document, so later conversions skip the reader."
+                        )
+                    },
                     "input_file": {
                         "type": "string",
                         "description": (
@@ -134,11 +506,26 @@ async def handle_list_tools() -> list[types.Tool]:
                             "(e.g., '/path/to/input.md')"
                         )
                     },
+                    "input_files": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                        "description": (
+                            "Ordered list of chapter files to build into one document, instead of contents or "
+                            "input_file. Each chapter's reader comes from its extension. Chapter formats are "
+                            f"{_join_with_and(AST_READERS)}; packaged formats such as docx cannot be chapters, as "
+                            "their images would be lost. Each parsed chapter is cached, so only edited chapters are "
+                            "read again."
+                        )
+                    },
                     "input_format": {
                         "type": "string",
-                        "description": "Source format of the content (defaults to markdown)",
+                        "description": (
+                            "Source format of the content (defaults to markdown). Use 'auto' to detect it from "
+                            "the content; the detected format is reported in the result."
+                        ),
                         "default": "markdown",
-                        "enum": list(INPUT_FORMATS)
+                        "enum": [*INPUT_FORMATS, AUTO]
                     },
                     "output_format": {
                         "type": "string",
@@ -178,13 +565,252 @@ async def handle_list_tools() -> list[types.Tool]:
                             "Path to a Pandoc defaults file (YAML) containing conversion options. "
                             "Similar to using pandoc -d option."
                         )
+                    },
+                    "extract_media": {
+                        "type": "boolean",
+                        "description": (
+                            "Extract embedded images into a content-addressed media store and rewrite image "
+                            "references to stable paths in that store. Only for text output formats "
+                            f"(not {', '.join(BINARY_OUTPUT_FORMATS)})."
+                        ),
+                        "default": False
+                    },
+                    "chunk_max_bytes": {
+                        "type": "integer",
+                        "minimum": MIN_CHUNK_BYTES,
+                        "description": (
+                            "Split the converted document into chunks on heading boundaries, each at most this "
+                            "many bytes unless a single block is larger, and return a chunk manifest instead of "
+                            "the full text. Read the chunks with get-chunk. Only for "
+                            f"{_join_with_and(CHUNK_OUTPUT_FORMATS)} output, and not with output_file."
+                        )
+                    },
+                    "notebook_drop_outputs": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "For ipynb input: MIME types of cell outputs to drop before conversion, with wildcards "
+                            "such as 'image/*'. Stream and error outputs go by 'application/vnd.jupyter.stdout', "
+                            "'application/vnd.jupyter.stderr' and 'application/vnd.jupyter.error'. '*' drops every "
+                            "output."
+                        )
+                    },
+                    "notebook_max_output_bytes": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": (
+                            "For ipynb input: truncate text outputs to this many bytes and drop images and other "
+                            "binary outputs that are larger"
+                        )
+                    },
+                    "notebook_stream_tail_lines": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": (
+                            "For ipynb input: keep only the last this many lines of stdout and stderr output and of "
+                            "error tracebacks"
+                        )
+                    },
+                    "notebook_strip_metadata": {
+                        "type": "boolean",
+                        "description": "For ipynb input: drop execution counts and execution metadata",
+                        "default": False
+                    },
+                    "prune_bibliography": {
+                        "type": "boolean",
+                        "description": (
+                            "With a defaults_file that runs citeproc: pass pandoc only the bibliography entries "
+                            "the source cites, from the cached CSL JSON copy of each bibliography"
+                        ),
+                        "default": False
+                    },
+                    "incremental": {
+                        "type": "boolean",
+                        "description": (
+                            "For markdown converted to html or markdown: render only the sections, split at "
+                            "headings, that changed since an earlier call, and reuse the rest. Falls back to a full "
+                            "conversion when the document has footnotes, reference links or other constructs that "
+                            "span sections"
+                        ),
+                        "default": False
+                    },
+                    "draft": {
+                        "type": "boolean",
+                        "description": (
+                            "For pdf output: a quick layout preview. One TeX pass with a light font setup, images "
+                            "drawn as placeholder boxes and every page labeled DRAFT. The table of contents and "
+                            "cross-references stay empty"
+                        ),
+                        "default": False
+                    },
+                    "draft_pages": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "With draft: write only the first this many pages"
+                    },
+                    "image_dpi": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": (
+                            "For docx and pptx output: scale embedded images down to this many pixels per inch at "
+                            "the size they are shown, and recompress them"
+                        )
+                    },
+                    "image_max_pixels": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": (
+                            "For docx, pptx and epub output: scale embedded images down to at most this many pixels "
+                            "on their longer edge, and recompress them"
+                        )
+                    },
+                    "html_reduce": {
+                        "type": "boolean",
+                        "description": (
+                            "For html input: remove scripts, styles, inline SVG, navigation, form controls, hidden "
+                            "elements, tracking pixels, comments and presentation attributes before conversion"
+                        ),
+                        "default": False
+                    },
+                    "html_drop_elements": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "For html input: also remove the elements matching these rules, with everything inside "
+                            "them. A rule is a name, .class, #id or [attribute] / [attribute=value], optionally "
+                            "after a name, such as 'aside', '.cookie-banner' or 'div[role=dialog]'"
+                        )
+                    },
+                    "html_keep_elements": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "With html_reduce: default rules not to apply, by rule or element name, such as 'svg' "
+                            "or 'nav'"
+                        )
+                    },
+                    "html_drop_attributes": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "For html input: also remove these attributes, with wildcards such as 'x-*'"
+                        )
                     }
                 },
                 "additionalProperties": False
             },
-        )
+        ),
+        types.Tool(
+            name="get-chunk",
+            description=(
+                "Returns one chunk of a document previously converted by convert-contents with chunk_max_bytes, "
+                "without converting the source again. The result names the next chunk_id, so a whole document "
+                "can be read page by page."
+            ),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "chunk_id": {
+                        "type": "string",
+                        "description": "A chunk id from the chunk manifest, e.g. '3f9c0a1b2d4e5f6a7b8c-0002'"
+                    }
+                },
+                "required": ["chunk_id"],
+                "additionalProperties": False
+            },
+        ),
     ]
 
+    # A watched target takes the same arguments as the conversion it repeats
+    convert_properties = tools[0].input_schema["properties"]
+    tools.append(
+        types.Tool(
+            name="watch",
+            description=(
+                "Keeps output files up to date while their sources are edited. 'add' registers a build target "
+                "(the convert-contents arguments of a conversion that writes output_file), builds it once and "
+                "then rebuilds it whenever its input files, reference_doc, defaults_file or filters change. "
+                "'remove' stops watching the target writing output_file. 'status' reports the last build of "
+                "every target, or of the one writing output_file: its state, duration, trigger and result."
+            ),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "enum": ["add", "remove", "status"],
+                        "description": "What to do: register a target, stop watching one, or report build status"
+                    },
+                    **{name: convert_properties[name] for name in WATCH_TARGET_ARGUMENTS},
+                },
+                "required": ["action"],
+                "additionalProperties": False
+            },
+        )
+    )
+    tools.append(
+        types.Tool(
+            name="inspect-document",
+            description=(
+                "Describes a document's structure without converting it: the heading outline with identifiers "
+                "and section word counts, tables with their dimensions, images, metadata and word counts. "
+                "The document is parsed once and cached, so repeat questions about the same file answer in "
+                "milliseconds. Use it instead of converting a whole document just to see what is in it."
+            ),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    **{name: convert_properties[name] for name in INSPECT_SOURCE_ARGUMENTS},
+                    "input_format": convert_properties["input_format"],
+                    "include": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(STRUCTURE_QUERIES)},
+                        "description": (
+                            f"Parts of the summary to return (default: all of {', '.join(STRUCTURE_QUERIES)})"
+                        )
+                    },
+                    "max_items": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": (
+                            f"Longest outline, table or image list returned; the rest are counted "
+                            f"(default {DEFAULT_MAX_ITEMS})"
+                        ),
+                        "default": DEFAULT_MAX_ITEMS
+                    },
+                },
+                "additionalProperties": False
+            },
+        )
+    )
+    tools.append(
+        types.Tool(
+            name="register-document",
+            description=(
+                "Stores a document on the server and returns a document_id. Pass the document_id to "
+                "convert-contents or inspect-document instead of contents, so a large document converted to "
+                "several formats is sent once. Registering the same contents again returns the same id. "
+                "Documents unused for a while expire and must be registered again."
+            ),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    **{name: convert_properties[name] for name in REGISTER_SOURCE_ARGUMENTS},
+                    "input_format": {
+                        "type": "string",
+                        "enum": list(INPUT_FORMATS),
+                        "description": (
+                            "Reader for the document when a conversion does not give input_format. Without it "
+                            "the format is detected from the content."
+                        )
+                    },
+                },
+                "additionalProperties": False
+            },
+        )
+    )
+    return tools
+
 async def handle_call_tool(
     name: str, arguments: dict | None
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
@@ -192,15 +818,28 @@ async def handle_call_tool(
 
     Tools can modify server state and notify clients of changes.
     """
-    if name not in ["convert-contents"]:
+    if name not in ["convert-contents", "get-chunk", "watch", "inspect-document", "register-document"]:
         raise ValueError(f"Unknown tool: {name}")
 
     if not arguments:
         raise ValueError("Missing arguments")
 
+    if name == "get-chunk":
+        return [types.TextContent(type="text", text=_get_chunk(arguments))]
+
+    if name == "watch":
+        return [types.TextContent(type="text", text=await _watch(arguments))]
+
+    if name == "inspect-document":
+        return [types.TextContent(type="text", text=_inspect_document(arguments))]
+
+    if name == "register-document":
+        return [types.TextContent(type="text", text=_register_document(arguments))]
+
     # Extract all possible arguments
     contents = arguments.get("contents")
     input_file = arguments.get("input_file")
+    input_files = arguments.get("input_files")
     output_file = arguments.get("output_file")
     output_format = arguments.get("output_format", "markdown").lower()
     input_format = arguments.get("input_format", "markdown").lower()
@@ -209,10 +848,51 @@ async def handle_call_tool(
     reference_doc = arguments.get("reference_doc")
     filters = arguments.get("filters", [])
     defaults_file = arguments.get("defaults_file")
+    extract_media = arguments.get("extract_media", False)
+    chunk_max_bytes = arguments.get("chunk_max_bytes")
+    contents_base64 = arguments.get("contents_base64")
+    resource = arguments.get("resource")
+    document_id = arguments.get("document_id")
+    prune_bibliography = arguments.get("prune_bibliography", False)
+    incremental = arguments.get("incremental", False)
+    draft = arguments.get("draft", False)
+    draft_pages = arguments.get("draft_pages")
+    image_dpi = arguments.get("image_dpi")
+    image_max_pixels = arguments.get("image_max_pixels")
 
     # Validate input parameters
-    if not contents and not input_file:
-        raise ValueError("Either 'contents' or 'input_file' must be provided")
+    sources = [key for key in SOURCE_ARGUMENTS if arguments.get(key)]
+    if not sources:
+        raise ValueError(
+            "One of 'contents', 'contents_base64', 'resource', 'document_id', 'input_file' or 'input_files' "
+            "must be provided"
+        )
+    if input_files and (contents or input_file):
+        raise ValueError("input_files cannot be combined with contents or input_file")
+    if (contents_base64 or resource or document_id) and len(sources) > 1:
+        raise ValueError(f"Only one source can be converted per call, but {_join_with_and(sources)} were given")
+
+    # A blob is decoded in memory and passed to pandoc on stdin like contents
+    blob_format = None
+    blob_info = ""
+    if contents_base64 or resource:
+        with tracer.start_as_current_span("decode blob") as span:
+            if resource:
+                contents, blob_format = resource_source(resource)
+                encoded_length = len(resource.get("blob") or "")
+            else:
+                contents = decode_blob(contents_base64)
+                encoded_length = len(contents_base64)
+            if isinstance(contents, bytes):
+                span.set_attribute("mcp_pandoc.blob_bytes", len(contents))
+                blob_info = memory_report(encoded_length, contents)
+
+    # A registered document stands in for contents, with the reader it was registered with
+    document = None
+    if document_id:
+        with tracer.start_as_current_span("load document"):
+            document = get_document(document_id)
+        contents, blob_format = document.contents, document.input_format
 
     # Validate reference_doc if provided
     if reference_doc:
@@ -242,32 +922,39 @@ async def handle_call_tool(
             )
 
     # Validate defaults_file if provided
+    defaults_content = None
     if defaults_file:
+        import yaml
+
         if not os.path.exists(defaults_file):
             raise ValueError(f"Defaults file not found: {defaults_file}")
 
-        # Check if it's a valid YAML file and readable
-        try:
-            with open(defaults_file) as f:
-                yaml_content = yaml.safe_load(f)
-
-            # Validate the YAML structure
-            if not isinstance(yaml_content, dict):
-                raise ValueError(f"Invalid defaults file format: {defaults_file} - must be a YAML dictionary")
-
-            # Check if the defaults file specifies an output format that conflicts with the requested format
-            if 'to' in yaml_content and yaml_content['to'] != output_format:
-                print(
-                    f"Warning: Defaults file specifies output format '{yaml_content['to']}' "
-                    f"but requested format is '{output_format}'. Using requested format."
-                )
-
-        except yaml.YAMLError as e:
-            raise ValueError(f"Error parsing defaults file {defaults_file}: {str(e)}") from e
-        except PermissionError as e:
-            raise ValueError(f"Permission denied when reading defaults file: {defaults_file}") from e
-        except Exception as e:
-            raise ValueError(f"Error reading defaults file {defaults_file}: {str(e)}") from e
+        with tracer.start_as_current_span("parse defaults", attributes={"mcp_pandoc.defaults_file": defaults_file}):
+            # Check if it's a valid YAML file and readable
+            try:
+                with open(defaults_file) as f:
+                    yaml_content = yaml.safe_load(f)
+
+                # Validate the YAML structure
+                if not isinstance(yaml_content, dict):
+                    raise ValueError(f"Invalid defaults file format: {defaults_file} - must be a YAML dictionary")
+
+                # Check if the defaults file specifies an output format that conflicts with the requested format
+                if 'to' in yaml_content and yaml_content['to'] != output_format:
+                    logger.warning(
+                        "Defaults file specifies output format '%s' but requested format is '%s'. "
+                        "Using requested format.",
+                        yaml_content['to'], output_format,
+                    )
+
+                defaults_content = yaml_content
+
+            except yaml.YAMLError as e:
+                raise ValueError(f"Error parsing defaults file {defaults_file}: {str(e)}") from e
+            except PermissionError as e:
+                raise ValueError(f"Permission denied when reading defaults file: {defaults_file}") from e
+            except Exception as e:
+                raise ValueError(f"Error reading defaults file {defaults_file}: {str(e)}") from e
 
     # Validate the output format against the single list the schema also advertises, so
     # the runtime check and the enum cannot drift apart.
@@ -276,17 +963,116 @@ async def handle_call_tool(
             f"Unsupported output format: '{output_format}'. Supported formats are: {', '.join(OUTPUT_FORMATS)}"
         )
 
-    if input_format not in INPUT_FORMATS:
+    # Detect the reader up front, so a wrong one does not cost a failed conversion and a retry.
+    # Books read each chapter with the reader its extension gives.
+    detected_format = None
+    if not input_files:
+        with tracer.start_as_current_span("sniff input format") as span:
+            sent_without_reader = (contents_base64 or resource or document_id) and "input_format" not in arguments
+            if input_format == AUTO or sent_without_reader:
+                if input_file:
+                    detected_format = sniff_file(input_file) or input_format_for(input_file)
+                elif isinstance(contents, bytes):
+                    detected_format = blob_format or sniff_bytes(contents) or "markdown"
+                else:
+                    detected_format = blob_format or sniff_text(contents) or "markdown"
+            elif input_file and "input_format" not in arguments:
+                # Only an unambiguous signature overrides the file name, such as a docx saved as .md
+                detected_format = sniff_misnamed_file(input_file, input_format_for(input_file))
+            span.set_attribute("mcp_pandoc.detected_format", detected_format or "")
+    detected_info = ""
+    if detected_format:
+        if input_format == AUTO or not input_file:
+            detected_info = f"Detected input format: {detected_format}."
+        else:
+            detected_info = (
+                f"Detected input format: {detected_format} "
+                f"(the file name suggests {input_format_for(input_file)})."
+            )
+        input_format = detected_format
+    input_info = "\n".join(info for info in (detected_info, blob_info) if info)
+
+    if input_format not in INPUT_FORMATS and not (input_files and input_format == AUTO):
         raise ValueError(
             f"Unsupported input format: '{input_format}'. Supported input formats are: "
             f"{', '.join(INPUT_FORMATS)}. Pandoc writes some formats it cannot read, so the "
             f"input list is shorter than the output list."
         )
 
+    notebook_trim = NotebookTrim.from_arguments(arguments)
+    if notebook_trim:
+        source_format = input_format_for(input_file) if input_file and not detected_format else input_format
+        if input_files or source_format != "ipynb":
+            raise ValueError("notebook_* options only apply to ipynb input")
+
+    html_reduction = HtmlReduction.from_arguments(arguments)
+    if html_reduction:
+        source_format = input_format_for(input_file) if input_file and not detected_format else input_format
+        if input_files or source_format != "html":
+            raise ValueError("html_* options only apply to html input")
+
+    if prune_bibliography and not uses_citeproc(defaults_content):
+        raise ValueError("prune_bibliography needs a defaults_file that runs citeproc")
+
+    # Sections are rendered by pandoc alone, so nothing may change how a block renders
+    if incremental:
+        reader = (detected_format or input_format_for(input_file)) if input_file else input_format
+        if (
+            input_files or contents_base64 or resource or isinstance(contents, bytes) or reader != "markdown"
+            or output_format not in INCREMENTAL_FORMATS
+            or defaults_file or filters or extract_media or chunk_max_bytes
+        ):
+            raise ValueError(
+                "incremental only applies to markdown converted to html or markdown, "
+                "without defaults_file, filters, extract_media or chunk_max_bytes"
+            )
+
+    # A draft is one TeX run on the LaTeX pandoc writes, which only makes sense for a PDF
+    if draft and output_format != "pdf":
+        raise ValueError("draft only applies to pdf output")
+    if draft_pages is not None:
+        if not draft:
+            raise ValueError("draft_pages needs draft")
+        if not isinstance(draft_pages, int) or draft_pages < 1:
+            raise ValueError("draft_pages must be a whole number of at least 1")
+
+    # Images are optimized inside the package pandoc writes, and only docx and pptx say how large they are shown
+    if image_dpi is not None or image_max_pixels is not None:
+        if output_format not in IMAGE_OUTPUT_FORMATS:
+            raise ValueError("image_dpi and image_max_pixels only apply to docx, pptx and epub output")
+        if image_dpi is not None and output_format not in DISPLAY_SIZE_FORMATS:
+            raise ValueError(
+                f"image_dpi needs docx or pptx output, which record the size each image is shown at; "
+                f"use image_max_pixels for {output_format}"
+            )
+        for name, value in (("image_dpi", image_dpi), ("image_max_pixels", image_max_pixels)):
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError(f"{name} must be a whole number of at least 1")
+        if not pillow_available():
+            raise ValueError("image_dpi and image_max_pixels need Pillow; install mcp-pandoc[images]")
+
     # Validate output_file requirement for advanced formats
     if output_format in ADVANCED_FORMATS and not output_file:
         raise ValueError(f"output_file path is required for {output_format} format")
 
+    # Extracted media is re-pointed by rewriting the converted text, which a zipped or PDF
+    # output does not have.
+    if extract_media and output_format in BINARY_OUTPUT_FORMATS:
+        raise ValueError(
+            f"extract_media is not supported for '{output_format}' output format. "
+            f"It rewrites image references in text output, and {output_format} is written as a binary file."
+        )
+
+    # Chunks are returned through the tool result and get-chunk, never written to a file
+    if chunk_max_bytes:
+        if output_file:
+            raise ValueError("chunk_max_bytes cannot be combined with output_file; chunks are returned by get-chunk")
+        if output_format not in CHUNK_OUTPUT_FORMATS:
+            raise ValueError(
+                f"chunk_max_bytes is not supported for '{output_format}' output format. Chunks can only be made "
+                f"for {_join_with_and(CHUNK_OUTPUT_FORMATS)} output, whose blocks stand on their own."
+            )
+
     # Validate filters if provided
     if filters:
         if not isinstance(filters, list):
@@ -334,12 +1120,12 @@ async def handle_call_tool(
                 if not os.access(path, os.X_OK):
                     try:
                         os.chmod(path, os.stat(path).st_mode | 0o111)
-                        print(f"Made filter executable: {path}")
+                        logger.info("Made filter executable: %s", path)
                     except Exception as e:
-                        print(f"Warning: Could not make filter executable: {path} - {str(e)}")
+                        logger.warning("Could not make filter executable: %s - %s", path, e)
                         continue
 
-                print(f"Using filter: {path}")
+                logger.info("Using filter: %s", path)
                 return path
 
         return None
@@ -372,14 +1158,67 @@ async def handle_call_tool(
 
         return filter_info, defaults_info
 
+    media_dir = tempfile.mkdtemp(prefix="mcp-pandoc-media-") if extract_media else None
+    media_report = MediaReport()
+    scratch_dirs = [media_dir] if media_dir else []
+    first_file = input_file or (input_files[0] if input_files else None)
+    timer = PhaseTimer(
+        input_format_for(first_file) if first_file and not detected_format else input_format, output_format
+    )
+    # pandoc writes next to the target, which is only replaced if the content changed
+    write_path = temp_output_path(output_file) if output_file else None
+    # Set when a notebook or web page file is reduced and then converted from memory
+    source_file = None
+
     try:
         # Prepare conversion arguments
         extra_args = []
 
+        # Extract into a scratch directory; the files are moved into the media store after conversion
+        if media_dir:
+            extra_args.append(f"--extract-media={media_dir}")
+
         # Add defaults file if provided - ensure it's properly formatted for Pandoc
         if defaults_file:
             # Make sure the path is absolute
             defaults_file_abs = os.path.abspath(defaults_file)
+
+            rewritten_defaults = None
+            defaults_scratch = None
+
+            # Self-contained output makes pandoc download remote stylesheets and images on
+            # every run; point it at cached local copies instead
+            if resource_cache_enabled() and embeds_resources(defaults_content):
+                rewritten_defaults = localize_stylesheets(defaults_content)
+                if isinstance(contents, str):
+                    contents = localize_contents(contents, input_format)
+
+            # citeproc parses every bibliography on every run; point it at cached CSL JSON instead
+            if bibliography_cache_enabled() and uses_citeproc(defaults_content):
+                with tracer.start_as_current_span("cache bibliography") as span:
+                    defaults_scratch = tempfile.mkdtemp(prefix="mcp-pandoc-defaults-")
+                    scratch_dirs.append(defaults_scratch)
+                    cited = None
+                    if prune_bibliography:
+                        paths = input_files or ([input_file] if input_file else [])
+                        cited = source_keys(contents, paths, detected_format, defaults_content)
+                    bibliography_defaults, bibliography_report = cache_bibliographies(
+                        defaults_file, rewritten_defaults or defaults_content, defaults_scratch, cited,
+                        prune_bibliography,
+                    )
+                    rewritten_defaults = bibliography_defaults or rewritten_defaults
+                    span.set_attributes({
+                        "mcp_pandoc.bibliographies_cached": len(bibliography_report.cached),
+                        "mcp_pandoc.bibliography_entries": bibliography_report.entries_kept,
+                    })
+                input_info = "\n".join(info for info in (input_info, bibliography_report.summary()) if info)
+
+            if rewritten_defaults is not None:
+                if defaults_scratch is None:
+                    defaults_scratch = tempfile.mkdtemp(prefix="mcp-pandoc-defaults-")
+                    scratch_dirs.append(defaults_scratch)
+                defaults_file_abs = write_defaults(defaults_file, rewritten_defaults, defaults_scratch)
+
             extra_args.extend(["--defaults", defaults_file_abs])
 
         # Set environment variables for filters
@@ -392,37 +1231,152 @@ async def handle_call_tool(
             output_dir = None
 
         # Validate filters once and reuse the result
-        validated_filters = validate_filters(filters, defaults_file) if filters else []
+        with tracer.start_as_current_span("resolve filters", attributes={"mcp_pandoc.filter_count": len(filters)}):
+            validated_filters = validate_filters(filters, defaults_file) if filters else []
 
-        # Handle filter arguments
-        for filter_path in validated_filters:
-            extra_args.extend(["--filter", filter_path])
+        # Python filters are handed to pandoc as forkserver shims, which skip interpreter startup and imports
+        with tracer.start_as_current_span("prepare filters"):
+            for filter_path in validated_filters:
+                extra_args.extend(["--filter", filter_command(filter_path)])
 
         # Handle PDF-specific conversion if needed
         if output_format == "pdf":
-            extra_args.extend([
-                "--pdf-engine=xelatex",
-                "-V", "geometry:margin=1in"
-            ])
+            extra_args.extend(PDF_ARGS)
 
         # Handle reference doc for the formats pandoc accepts --reference-doc for
         if reference_doc and output_format in REFERENCE_DOC_FORMATS:
             extra_args.extend(["--reference-doc", reference_doc])
 
-        # No special processing needed for content
+        if input_file and not os.path.exists(input_file):
+            raise ValueError(f"Input file not found: {input_file}")
+
+        # A book is merged into one AST, which is then converted like contents
+        reader_format = input_format
+        book_info = ""
+        if input_files:
+            defaults = defaults_content or {}
+            with tracer.start_as_current_span("read chapters", attributes={"mcp_pandoc.chapters": len(input_files)}):
+                contents, parsed = build_book(input_files, defaults.get("from") or defaults.get("reader"))
+            reader_format = "json"
+            # Last, so a reader set in a defaults file cannot override it
+            extra_args.append("--from=json")
+            book_info = (
+                f"\nChapters: {len(input_files)} ({parsed} parsed, {len(input_files) - parsed} from the AST cache)."
+            )
 
-        # Convert content using pypandoc
-        if input_file:
-            if not os.path.exists(input_file):
-                raise ValueError(f"Input file not found: {input_file}")
+        # Outputs are trimmed before pandoc parses them, so a notebook file is read here and passed on stdin
+        if notebook_trim:
+            with tracer.start_as_current_span("trim notebook") as span:
+                if input_file:
+                    with open(input_file, "rb") as f:
+                        contents = f.read()
+                    source_file, input_file = input_file, None
+                    # Images the cells link to are still found next to the notebook
+                    extra_args.append(f"--resource-path={os.path.dirname(os.path.abspath(source_file))}")
+                contents, trim_report = trim_notebook(contents, notebook_trim)
+                span.set_attributes({
+                    "mcp_pandoc.bytes_before": trim_report.bytes_before,
+                    "mcp_pandoc.bytes_after": trim_report.bytes_after,
+                })
+            reader_format = "ipynb"
+            input_info = "\n".join(info for info in (input_info, f"{trim_report.summary()}.") if info)
+
+        # A web page is streamed through the reduction, so pandoc never parses its scripts and page chrome
+        if html_reduction:
+            with tracer.start_as_current_span("reduce html") as span:
+                if input_file:
+                    source_file, input_file = input_file, None
+                    # Images the page links to are still found next to it
+                    extra_args.append(f"--resource-path={os.path.dirname(os.path.abspath(source_file))}")
+                    contents, reduction_report = reduce_html(html_file_blocks(source_file), html_reduction)
+                else:
+                    contents, reduction_report = reduce_html(html_blocks(contents), html_reduction)
+                span.set_attributes({
+                    "mcp_pandoc.bytes_before": reduction_report.bytes_before,
+                    "mcp_pandoc.bytes_after": reduction_report.bytes_after,
+                })
+            reader_format = "html"
+            input_info = "\n".join(info for info in (input_info, f"{reduction_report.summary()}.") if info)
+
+        # A registered text document is parsed once; its conversions start from the cached AST
+        if (
+            document and reader_format in AST_READERS and not (media_dir or chunk_max_bytes or incremental)
+            and not html_reduction
+            and not any(key in (defaults_content or {}) for key in READER_DEFAULTS_KEYS)
+        ):
+            with tracer.start_as_current_span("read document AST") as span:
+                contents, cached = document_ast(document, reader_format)
+                span.set_attribute("mcp_pandoc.ast_cached", cached)
+            reader_format = "json"
+            # Last, so a reader set in a defaults file cannot override it
+            extra_args.append("--from=json")
+            ast_info = f"Document AST: {'from the cache' if cached else 'parsed and cached'}."
+            input_info = "\n".join(info for info in (input_info, ast_info) if info)
+
+        timer.mark("prepare")
+
+        # Chunked output replaces the single conversion below
+        if chunk_max_bytes:
+            chunked_message = _convert_chunked(
+                input_file, contents, detected_format if input_file else reader_format, output_format,
+                pandoc_output_format, chunk_max_bytes, extra_args, validated_filters, defaults_file, media_dir,
+                media_report,
+            )
+            timer.mark("pandoc")
+            if input_info:
+                chunked_message = f"{input_info}\n{chunked_message}"
+            return [types.TextContent(type="text", text=chunked_message)]
+
+        # Unchanged sections come from memory and the rest from one pandoc run
+        if incremental:
+            if input_file:
+                with open(input_file, encoding="utf-8") as f:
+                    contents = f.read()
+            with tracer.start_as_current_span("render incremental") as span:
+                converted_output, incremental_report = render_incremental(contents, pandoc_output_format)
+                span.set_attributes({
+                    "mcp_pandoc.sections": incremental_report.sections,
+                    "mcp_pandoc.sections_rendered": incremental_report.rendered,
+                })
+            input_info = "\n".join(info for info in (input_info, incremental_report.summary()) if info)
+            if output_file:
+                with open(write_path, "w", encoding="utf-8") as f:
+                    f.write(converted_output)
+                result_message = (
+                    f"{'File' if input_file else 'Content'} successfully converted and saved to: {output_file}"
+                )
 
+        # pandoc writes LaTeX and the server runs TeX on it once
+        elif draft:
+            with tracer.start_as_current_span("render draft pdf") as span:
+                draft_report = render_draft_pdf(
+                    write_path,
+                    source=None if input_file else contents,
+                    input_file=input_file,
+                    input_format=detected_format if input_file else reader_format,
+                    extra_args=extra_args,
+                    max_pages=draft_pages,
+                )
+                span.set_attributes({
+                    "mcp_pandoc.tex_engine": draft_report.engine,
+                    "mcp_pandoc.tex_errors": draft_report.tex_errors,
+                })
+            filter_info, defaults_info = format_result_info(filters, defaults_file, validated_filters)
+            result_message = (
+                f"{'Book' if input_files else 'File' if input_file or source_file else 'Content'} successfully "
+                f"converted to a draft PDF{filter_info}{defaults_info} and saved to: {output_file}{book_info}"
+            )
+            input_info = "\n".join(info for info in (input_info, draft_report.summary()) if info)
 
+        # Convert content with pandoc, under the configured per-job resource limits
+        elif input_file:
             if output_file:
                 # Convert file to file
-                converted_output = pypandoc.convert_file(
-                    input_file,
+                converted_output = run_pandoc(
                     pandoc_output_format,
-                    outputfile=output_file,
+                    input_file=input_file,
+                    input_format=detected_format,
+                    outputfile=write_path,
                     extra_args=extra_args
                 )
 
@@ -431,9 +1385,10 @@ async def handle_call_tool(
                 result_message = f"File successfully converted{filter_info}{defaults_info} and saved to: {output_file}"
             else:
                 # Convert file to string
-                converted_output = pypandoc.convert_file(
-                    input_file,
+                converted_output = run_pandoc(
                     pandoc_output_format,
+                    input_file=input_file,
+                    input_format=detected_format,
                     extra_args=extra_args
                 )
         else:
@@ -441,29 +1396,62 @@ async def handle_call_tool(
 
             if output_file:
                 # Convert content to file
-                pypandoc.convert_text(
-                    contents,
+                run_pandoc(
                     pandoc_output_format,
-                    format=input_format,
-                    outputfile=output_file,
+                    source=contents,
+                    input_format=reader_format,
+                    outputfile=write_path,
                     extra_args=extra_args
                 )
 
                 # Create result message with filter and defaults information
                 filter_info, defaults_info = format_result_info(filters, defaults_file, validated_filters)
                 result_message = (
-                    f"Content successfully converted{filter_info}{defaults_info} and saved to: {output_file}"
+                    f"{'Book' if input_files else 'File' if source_file else 'Content'} successfully converted"
+                    f"{filter_info}{defaults_info} "
+                    f"and saved to: {output_file}{book_info}"
                 )
             else:
                 # Convert content to string
-                converted_output = pypandoc.convert_text(
-                    contents,
+                converted_output = run_pandoc(
                     pandoc_output_format,
-                    format=input_format,
+                    source=contents,
+                    input_format=reader_format,
                     extra_args=extra_args
                 )
 
+        timer.mark("pandoc")
+
+        if media_dir:
+            if output_file:
+                with open(write_path, encoding="utf-8") as f:
+                    rewritten, media_report = externalize_media(f.read(), media_dir)
+                with open(write_path, "w", encoding="utf-8") as f:
+                    f.write(rewritten)
+                result_message += f"\n{media_report.summary()}"
+            elif converted_output:
+                converted_output, media_report = externalize_media(converted_output, media_dir)
+
+        if image_dpi or image_max_pixels:
+            with tracer.start_as_current_span("optimize images") as span:
+                image_report = optimize_images(write_path, output_format, image_dpi, image_max_pixels)
+                span.set_attributes({
+                    "mcp_pandoc.images": image_report.images,
+                    "mcp_pandoc.bytes_before": image_report.bytes_before,
+                    "mcp_pandoc.bytes_after": image_report.bytes_after,
+                })
+            result_message += f"\n{image_report.summary()}"
+
         if output_file:
+            with tracer.start_as_current_span("write output") as span:
+                updated = commit_output(write_path, output_file, output_format)
+                span.set_attribute("mcp_pandoc.output_updated", updated)
+            if input_info:
+                result_message += f"\n{input_info}"
+            if updated:
+                result_message += "\nOutput file updated."
+            else:
+                result_message += "\nOutput file unchanged; the existing file was left untouched."
             notify_with_result = result_message
         else:
             if not converted_output:
@@ -476,14 +1464,19 @@ async def handle_call_tool(
                 filter_info = f" (with filters: {', '.join([os.path.basename(f) for f in validated_filters])})"
             if defaults_info:
                 defaults_info = f" (using defaults file: {os.path.basename(defaults_file)})"
+            media_info = f"{media_report.summary()}.\n" if media_dir else ""
+            chapter_info = f"{book_info.strip()}\n" if book_info else ""
+            input_lines = f"{input_info}\n" if input_info else ""
 
             notify_with_result = (
                 f'Following are the converted contents in {output_format} format{filter_info}{defaults_info}.\n'
                 f'Ask user if they expect to save this file. If so, provide the output_file parameter with '
                 f'complete path.\n'
+                f'{input_lines}{media_info}{chapter_info}'
                 f'Converted Contents:\n\n{converted_output}'
             )
 
+        timer.mark("finish")
         return [
             types.TextContent(
                 type="text",
@@ -496,7 +1489,9 @@ async def handle_call_tool(
         error_prefix = "Error converting"
         error_details = str(e)
 
-        if "Filter not found" in error_details or "Filter is not executable" in error_details:
+        if isinstance(e, ResourceLimitError):
+            error_prefix = "Resource limit exceeded during conversion"
+        elif "Filter not found" in error_details or "Filter is not executable" in error_details:
             error_prefix = "Filter error during conversion"
         elif "defaults" in error_details and defaults_file:
             error_prefix = "Defaults file error during conversion"
@@ -506,11 +1501,17 @@ async def handle_call_tool(
             error_prefix = "Pandoc executable not found"
             error_details = "Please ensure Pandoc is installed and available in your PATH"
 
-        error_msg = (
-            f"{error_prefix} {'file' if input_file else 'contents'} from {input_format} to "
-            f"{output_format}: {error_details}"
-        )
+        CONVERSION_ERRORS.inc(kind=error_prefix)
+
+        source_kind = "file" if input_file or source_file else "files" if input_files else "contents"
+        error_msg = f"{error_prefix} {source_kind} from {input_format} to {output_format}: {error_details}"
         raise ValueError(error_msg) from e
+    finally:
+        timer.finish()
+        for scratch_dir in scratch_dirs:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        if write_path and os.path.exists(write_path):
+            os.unlink(write_path)
 
 
 async def list_tools(
@@ -526,34 +1527,65 @@ async def call_tool(
     params: types.CallToolRequestParams,
 ) -> types.CallToolResult:
     """Validate tool input and return conversion errors as readable tool results."""
-    try:
-        if params.name == "convert-contents":
-            tool = (await handle_list_tools())[0]
-            validate(instance=params.arguments or {}, schema=tool.input_schema)
-
-        content = await handle_call_tool(params.name, params.arguments)
-        return types.CallToolResult(content=content)
-    except ValidationError as exc:
-        message = f"Input validation error: {exc.message}"
-    except ValueError as exc:
-        message = str(exc)
-
-    return types.CallToolResult(
-        content=[types.TextContent(type="text", text=message)],
-        is_error=True,
-    )
+    # Loaded on the first call so the handshake and tools/list do not pay for it
+    from jsonschema import ValidationError, validate
+
+    CALLS_IN_FLIGHT.inc()
+    profiler = CallProfiler(params.name, params.arguments, params.meta)
+    with call_span(params.name, params.meta) as span:
+        try:
+            with tracer.start_as_current_span("validate arguments"):
+                for tool in await handle_list_tools():
+                    if tool.name == params.name:
+                        validate(instance=params.arguments or {}, schema=tool.input_schema)
+
+            with profiler:
+                content = await handle_call_tool(params.name, params.arguments)
+            with tracer.start_as_current_span("serialize result"):
+                return types.CallToolResult(content=content, meta=profiler.result_meta)
+        except ValidationError as exc:
+            message = f"Input validation error: {exc.message}"
+        except ValueError as exc:
+            message = str(exc)
+        finally:
+            CALLS_IN_FLIGHT.dec()
+            write_textfile()
+
+        span.set_status(StatusCode.ERROR, message)
+        with tracer.start_as_current_span("serialize result"):
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text=message)],
+                is_error=True,
+                meta=profiler.result_meta,
+            )
 
 
 server = Server(
     "mcp-pandoc",
-    version="0.11.1",
+    version="0.36.0",
     on_list_tools=list_tools,
     on_call_tool=call_tool,
 )
 
 
+def _warm_up(output_format: str, scratch_dir: str):
+    """Convert the warm-up sample to one output format with the options handle_call_tool uses."""
+    run_pandoc(
+        "plain" if output_format == "txt" else output_format,
+        source=SAMPLE_DOCUMENT,
+        input_format="markdown",
+        outputfile=os.path.join(scratch_dir, f"warmup.{output_format}"),
+        extra_args=PDF_ARGS if output_format == "pdf" else (),
+    )
+
+
 async def main():
     """Run the mcp-pandoc server using stdin/stdout streams."""
+    # Warm-up and the metrics listener run alongside the handshake rather than before it
+    start_warmup(OUTPUT_FORMATS, _warm_up)
+    start_rts_probe(pandoc_path)
+    start_metrics_server()
+    configure_tracing(server.version)
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -0,0 +1,135 @@
+"""Detect a source's format before pandoc reads it.
+
+A source read with the wrong reader costs a full conversion that fails or returns
+garbage, followed by a retry. HTML or LaTeX passed as ``contents`` without an
+``input_format`` is read as markdown, and a misnamed file is read by the reader its
+extension suggests.
+
+Detection looks at the first ``SNIFF_BYTES`` of the source only. Signatures settle the
+packaged formats: zip containers are told apart by their ``mimetype`` member or their
+main part, PDFs by ``%PDF-``, and notebooks by their top-level JSON keys. Text sources
+are scored against a few cheap markers of HTML, LaTeX and reStructuredText. A text
+source with no clear markers is left to the caller's fallback, which is markdown for
+contents and the extension's reader for files.
+"""
+import io
+import re
+import zipfile
+
+# input_format value that asks for detection.
+AUTO = "auto"
+
+# How much of a source detection reads.
+SNIFF_BYTES = 64 * 1024
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_PDF_MAGIC = b"%PDF-"
+
+_ZIP_MIMETYPES = {
+    "application/epub+zip": "epub",
+    "application/vnd.oasis.opendocument.text": "odt",
+}
+_ZIP_MAIN_PARTS = {"word/document.xml": "docx", "ppt/presentation.xml": "pptx"}
+
+_NOTEBOOK = re.compile(r'^\s*\{.*"(?:nbformat|cells)"\s*:', re.DOTALL)
+
+_HTML_DOCUMENT = re.compile(r"^\s*(?:<\?xml[^>]*>\s*)?(?:<!--.*?-->\s*)*<(?:!doctype\s+html|html)\b", re.I | re.S)
+_HTML_TAG = re.compile(r"</(?:p|div|span|a|h[1-6]|ul|ol|li|table|tr|td|body|head|section|article|em|strong)>", re.I)
+
+_LATEX_DOCUMENT = re.compile(r"\\documentclass\b|\\begin\{document\}")
+_LATEX_COMMAND = re.compile(r"\\(?:section|subsection|chapter|begin|end|textbf|emph|item|usepackage|label|ref)\b")
+_LATEX_SECTION = re.compile(r"\\(?:part|chapter|section|subsection)\*?\{")
+
+_RST_DIRECTIVE = re.compile(r"^\.\. (?:[\w-]+::|_[^:]+:|\|[^|]+\|)", re.M)
+_RST_ROLE = re.compile(r":[\w-]+:`[^`]+`|`[^`<]+<[^>]+>`_")
+# Overlines and underlines in characters markdown does not use for setext headings
+_RST_ADORNMENT = re.compile(r"^\S.*\n([~^\"'`#*+:.])\1{2,}[ \t]*$", re.M)
+_MARKDOWN_MARKER = re.compile(r"^#{1,6} |\]\([^)]+\)|^```", re.M)
+
+
+def sniff_container(head: bytes, archive=None) -> str | None:
+    """Recognise a format from its file signature, or return None for text sources.
+
+    Zip containers can only be told apart from their members, so ``archive``, a path or
+    a binary file object, is opened when ``head`` is a zip signature.
+    """
+    if head.startswith(_PDF_MAGIC):
+        return "pdf"
+    if head.startswith(_ZIP_MAGIC):
+        return _zip_format(archive) if archive is not None else None
+    text = head.decode("utf-8-sig", errors="ignore")
+    if _NOTEBOOK.match(text):
+        return "ipynb"
+    return None
+
+
+def _zip_format(archive) -> str | None:
+    try:
+        with zipfile.ZipFile(archive) as package:
+            names = set(package.namelist())
+            if "mimetype" in names:
+                mimetype = package.read("mimetype").decode("ascii", errors="replace").strip()
+                if mimetype in _ZIP_MIMETYPES:
+                    return _ZIP_MIMETYPES[mimetype]
+            for part, format_name in _ZIP_MAIN_PARTS.items():
+                if part in names:
+                    return format_name
+    except (OSError, zipfile.BadZipFile):
+        pass
+    return None
+
+
+def sniff_text(text: str) -> str | None:
+    """Recognise HTML, LaTeX, reStructuredText or a notebook from text, or return None."""
+    text = text[:SNIFF_BYTES].lstrip("\ufeff")
+    if _NOTEBOOK.match(text):
+        return "ipynb"
+    if _HTML_DOCUMENT.match(text):
+        return "html"
+    if _LATEX_DOCUMENT.search(text):
+        return "latex"
+
+    markdown_score = len(_MARKDOWN_MARKER.findall(text))
+    # Markdown may embed HTML anywhere, so tags only count when the source starts with one
+    if text.lstrip().startswith("<") and len(_HTML_TAG.findall(text)) > markdown_score:
+        return "html"
+    if _LATEX_SECTION.search(text) and len(_LATEX_COMMAND.findall(text)) >= 3:
+        return "latex"
+    rst_score = (
+        2 * len(_RST_DIRECTIVE.findall(text)) + len(_RST_ROLE.findall(text)) + len(_RST_ADORNMENT.findall(text))
+    )
+    if rst_score >= 2 and rst_score > markdown_score:
+        return "rst"
+    return None
+
+
+def _read_head(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+
+
+def sniff_file(path: str) -> str | None:
+    """Recognise a file's format from its signature, then from its text."""
+    head = _read_head(path)
+    if head is None:
+        return None
+    return sniff_container(head, path) or sniff_text(head.decode("utf-8", errors="ignore"))
+
+
+def sniff_misnamed_file(path: str, expected: str) -> str | None:
+    """Return a file's format when its signature contradicts the reader ``expected`` from its name.
+
+    Only signatures are checked, since they are unambiguous; a text file keeps the
+    reader its extension gives.
+    """
+    head = _read_head(path)
+    detected = sniff_container(head, path) if head is not None else None
+    return detected if detected and detected != expected else None
+
+
+def sniff_bytes(data: bytes) -> str | None:
+    """Recognise the format of a source held in memory, such as a decoded blob."""
+    return sniff_container(data, io.BytesIO(data)) or sniff_text(data[:SNIFF_BYTES].decode("utf-8", errors="ignore"))
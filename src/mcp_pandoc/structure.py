@@ -0,0 +1,187 @@
+"""Structural summaries of a document, answered from its cached AST.
+
+Converting a whole document to markdown just to see its headings or count its tables
+renders and ships all of it. Instead, the source is read once into the pandoc JSON AST,
+which is cached under ``ast/`` by content hash like a book chapter. The summary is built
+by walking the AST:
+
+* ``outline``: every heading with its level, identifier and title, and the words in its
+  section, with and without its subsections,
+* ``tables``: caption, column count and header and body row counts,
+* ``images``: source, alt text and title,
+* ``metadata``: the document's metadata as plain values,
+* ``stats``: word, character and block counts.
+
+Tables and images name the identifier of the section they appear in. Summaries are also
+kept in memory by AST key, so a repeat query of an unchanged file costs a stat call.
+"""
+import collections
+import json
+import os
+import threading
+
+from .book import ast_key, cached_ast, source_file_sha256
+from .cache import sha256_hex
+from .chunks import stringify
+from .runner import run_pandoc
+
+# What a summary can contain, in the order it is reported.
+QUERIES = ("stats", "metadata", "outline", "tables", "images")
+
+DEFAULT_MAX_ITEMS = 200
+
+# Metadata strings longer than this, such as an abstract, are cut short.
+_MAX_METADATA_CHARS = 300
+
+_REPORT_CACHE_SIZE = 64
+_reports: collections.OrderedDict[str, dict] = collections.OrderedDict()
+_reports_lock = threading.Lock()
+
+
+def _walk(node):
+    """Yield every AST element inside node, depth first and in document order."""
+    if isinstance(node, dict):
+        if "t" in node:
+            yield node
+        yield from _walk(node.get("c"))
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk(item)
+
+
+def _top_blocks(blocks):
+    """Yield blocks, looking inside Divs, which is where some readers put headings."""
+    for block in blocks:
+        if block.get("t") == "Div":
+            yield from _top_blocks(block["c"][1])
+        else:
+            yield block
+
+
+def _meta_value(value):
+    kind, content = value.get("t"), value.get("c")
+    if kind == "MetaMap":
+        return {key: _meta_value(item) for key, item in content.items()}
+    if kind == "MetaList":
+        return [_meta_value(item) for item in content]
+    if kind == "MetaBool":
+        return content
+    text = content if kind == "MetaString" else stringify(content)
+    return text if len(text) <= _MAX_METADATA_CHARS else f"{text[:_MAX_METADATA_CHARS]}..."
+
+
+def _table(content, section: str, index: int) -> dict:
+    _, caption, colspecs, head, bodies, foot = content
+    return {
+        "index": index,
+        "section": section,
+        "caption": stringify(caption[1]),
+        "columns": len(colspecs),
+        "header_rows": len(head[1]),
+        "body_rows": sum(len(body[2]) + len(body[3]) for body in bodies),
+        "footer_rows": len(foot[1]),
+    }
+
+
+def summarize(ast: dict) -> dict:
+    """Build the full structural summary of a document AST."""
+    stats = collections.Counter()
+    outline: list[dict] = []
+    tables: list[dict] = []
+    images: list[dict] = []
+    section = ""
+
+    for block in _top_blocks(ast.get("blocks", [])):
+        stats["blocks"] += 1
+        text = stringify(block)
+        if block.get("t") == "Header":
+            level, attr, inlines = block["c"]
+            section = attr[0]
+            outline.append({"level": level, "id": attr[0], "title": stringify(inlines), "words": 0})
+            stats["headings"] += 1
+        elif outline:
+            outline[-1]["words"] += len(text.split())
+        stats["words"] += len(text.split())
+        stats["characters"] += len(text)
+
+        for element in _walk(block):
+            kind = element["t"]
+            if kind == "Table":
+                stats["tables"] += 1
+                tables.append(_table(element["c"], section, stats["tables"]))
+            elif kind == "Image":
+                stats["images"] += 1
+                _, alt, (src, title) = element["c"]
+                images.append(
+                    {"index": stats["images"], "section": section, "src": src, "alt": stringify(alt), "title": title}
+                )
+            elif kind == "CodeBlock":
+                stats["code_blocks"] += 1
+            elif kind == "Note":
+                stats["footnotes"] += 1
+            elif kind == "Link":
+                stats["links"] += 1
+
+    # A section's words with its subsections: everything up to the next heading at its level or above
+    for position, heading in enumerate(outline):
+        total = heading["words"]
+        for later in outline[position + 1:]:
+            if later["level"] <= heading["level"]:
+                break
+            total += later["words"]
+        heading["words_with_subsections"] = total
+
+    counts = ("words", "characters", "blocks", "headings", "tables", "images", "code_blocks", "footnotes", "links")
+    return {
+        "stats": {name: stats[name] for name in counts},
+        "metadata": {key: _meta_value(value) for key, value in ast.get("meta", {}).items()},
+        "outline": outline,
+        "tables": tables,
+        "images": images,
+    }
+
+
+def inspect_document(
+    reader: str, *, input_file: str | None = None, source: str | bytes | None = None
+) -> tuple[dict, bool]:
+    """Return the summary of a file or in-memory source, and whether it came from a cache."""
+    if input_file:
+        key = ast_key(source_file_sha256(input_file), reader)
+    else:
+        key = ast_key(sha256_hex(source if isinstance(source, bytes) else source.encode("utf-8")), reader)
+
+    with _reports_lock:
+        if key in _reports:
+            _reports.move_to_end(key)
+            return _reports[key], True
+
+    ast, cached = cached_ast(
+        key,
+        lambda: run_pandoc("json", input_file=input_file, source=source, input_format=reader),
+    )
+    report = summarize(ast)
+    with _reports_lock:
+        _reports[key] = report
+        while len(_reports) > _REPORT_CACHE_SIZE:
+            _reports.popitem(last=False)
+    return report, cached
+
+
+def format_report(name: str, reader: str, report: dict, cached: bool, queries, max_items: int) -> str:
+    """Render the requested parts of a summary for the tool result, capping each list at max_items."""
+    stats = report["stats"]
+    selected = {}
+    for query in QUERIES:
+        if query not in queries:
+            continue
+        value = report[query]
+        if isinstance(value, list) and len(value) > max_items:
+            selected[f"{query}_omitted"] = len(value) - max_items
+            value = value[:max_items]
+        selected[query] = value
+    return (
+        f"Structure of {os.path.basename(name)} ({reader}): {stats['words']} words, {stats['headings']} headings, "
+        f"{stats['tables']} tables, {stats['images']} images. "
+        f"{'AST from the cache' if cached else 'AST parsed and cached'}.\n\n"
+        f"{json.dumps(selected, indent=2, ensure_ascii=False)}"
+    )
@@ -0,0 +1,169 @@
+"""Trace spans for every tool call, exported over OTLP or to a JSON-lines file.
+
+The MCP SDK already opens a server span for each ``tools/call``, parented to the trace
+context the client sends in the request ``_meta``. The spans here nest under it and show
+where the time inside a call goes:
+
+* argument validation, defaults parsing and filter resolution,
+* every pandoc process, with its pid, a summary of its argv and its exit code,
+* the filters and TeX engine runs pandoc starts, timed from the ``--verbose`` log lines
+  pandoc writes as it starts each one,
+* writing the output file and building the result.
+
+Spans go through the OpenTelemetry API and cost nothing until a tracer provider is
+configured. Set one of these to export them, which needs the ``tracing`` extra
+(``pip install mcp-pandoc[tracing]``):
+
+``MCP_PANDOC_TRACE_OTLP_ENDPOINT``
+    OTLP/HTTP traces endpoint of a collector, for example
+    ``http://localhost:4318/v1/traces``.
+``MCP_PANDOC_TRACE_FILE``
+    Append one JSON object per finished span to this file.
+
+If the process already has an OpenTelemetry SDK provider, for example one installed by
+``opentelemetry-instrument``, the exporters are added to it instead.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+
+from opentelemetry import propagate, trace
+
+from .forkserver import original_filter
+
+logger = logging.getLogger(__name__)
+
+TRACE_OTLP_ENDPOINT_ENV = "MCP_PANDOC_TRACE_OTLP_ENDPOINT"
+TRACE_FILE_ENV = "MCP_PANDOC_TRACE_FILE"
+
+tracer = trace.get_tracer("mcp-pandoc")
+
+# Longest argv summary recorded on a pandoc span.
+_ARGV_SUMMARY_LENGTH = 512
+
+_FILTER_START = re.compile(r"^\[INFO\] Running filter (.+)$")
+_FILTER_END = re.compile(r"^\[INFO\] Completed filter (.+) in ")
+_TEX_RUN = re.compile(r"^\[INFO\] \[makePDF\] Command line:")
+
+
+def configure_tracing(service_version: str | None = None) -> list:
+    """Export spans as the MCP_PANDOC_TRACE_* variables ask; return the span processors added."""
+    endpoint = os.environ.get(TRACE_OTLP_ENDPOINT_ENV)
+    path = os.environ.get(TRACE_FILE_ENV)
+    if not endpoint and not path:
+        return []
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    except ImportError:
+        logger.warning("Tracing is configured but the OpenTelemetry SDK is missing; install mcp-pandoc[tracing]")
+        return []
+
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        attributes = {"service.name": "mcp-pandoc"}
+        if service_version:
+            attributes["service.version"] = service_version
+        provider = TracerProvider(resource=Resource.create(attributes))
+        trace.set_tracer_provider(provider)
+
+    processors = []
+    if endpoint:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTLP export needs opentelemetry-exporter-otlp-proto-http; install mcp-pandoc[tracing]")
+        else:
+            processors.append(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    if path:
+        processors.append(SimpleSpanProcessor(_json_lines_exporter(path)))
+
+    for processor in processors:
+        provider.add_span_processor(processor)
+    return processors
+
+
+def _json_lines_exporter(path: str):
+    """Build a span exporter that appends each span to path as one line of JSON."""
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        def __init__(self):
+            super().__init__()
+            self._lock = threading.Lock()
+            self._closed = False
+
+        def export(self, spans):
+            if self._closed:
+                return SpanExportResult.FAILURE
+            lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+            with self._lock, open(path, "a", encoding="utf-8") as handle:
+                handle.write(lines)
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            self._closed = True
+
+    return JsonLinesSpanExporter()
+
+
+@contextmanager
+def call_span(tool: str, meta: Mapping | None):
+    """Open the span for one tool call.
+
+    Under the MCP server the SDK's span is already current and becomes the parent. When
+    the handler is called directly, the trace context in ``_meta`` is used instead.
+    """
+    parent = None
+    if meta and not trace.get_current_span().get_span_context().is_valid:
+        parent = propagate.extract(dict(meta))
+    with tracer.start_as_current_span(f"mcp-pandoc {tool}", context=parent, attributes={"mcp.tool.name": tool}) as span:
+        yield span
+
+
+def argv_summary(argv: Sequence[str]) -> str:
+    """Return the pandoc command line, shortened to a length a span attribute can carry."""
+    text = " ".join([os.path.basename(argv[0]), *argv[1:]]) if argv else ""
+    return text if len(text) <= _ARGV_SUMMARY_LENGTH else text[: _ARGV_SUMMARY_LENGTH - 3] + "..."
+
+
+def record_child_processes(parent, stderr_lines: Sequence[tuple[int, str]], ended_ns: int):
+    """Add spans for the filters and TeX runs pandoc logged with --verbose.
+
+    ``stderr_lines`` are pandoc's stderr lines with the time each was read, in
+    nanoseconds since the epoch. pandoc does not log when a TeX run finishes, so each
+    run is taken to last until the next one starts or pandoc exits.
+    """
+    context = trace.set_span_in_context(parent)
+    filters: dict[str, int] = {}
+    tex_runs: list[tuple[int, str]] = []
+
+    for index, (at_ns, line) in enumerate(stderr_lines):
+        if match := _FILTER_START.match(line):
+            filters[match.group(1)] = at_ns
+        elif (match := _FILTER_END.match(line)) and match.group(1) in filters:
+            # A Python filter run through the forkserver is logged under its shim's path
+            name = original_filter(match.group(1))
+            span = tracer.start_span(
+                f"filter {os.path.basename(name)}",
+                context=context,
+                start_time=filters.pop(match.group(1)),
+                attributes={"mcp_pandoc.filter": name},
+            )
+            span.end(end_time=at_ns)
+        elif _TEX_RUN.match(line):
+            # The command line itself is on the next, indented line
+            command = stderr_lines[index + 1][1].split() if index + 1 < len(stderr_lines) else []
+            tex_runs.append((at_ns, os.path.basename(command[0].strip('"')) if command else "engine"))
+
+    for run, (started_ns, engine) in enumerate(tex_runs):
+        span = tracer.start_span(
+            f"tex {engine}", context=context, start_time=started_ns, attributes={"mcp_pandoc.tex_run": run + 1}
+        )
+        span.end(end_time=tex_runs[run + 1][0] if run + 1 < len(tex_runs) else ended_ns)
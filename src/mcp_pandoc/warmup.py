@@ -0,0 +1,135 @@
+"""Background warm-up of pandoc, the TeX engine and the font caches.
+
+The first conversion after a container starts is much slower than later ones. The
+pandoc binary has to page in, fontconfig builds its cache, and xelatex loads its format
+and fonts, which makes the first PDF the slowest of all. Setting ``MCP_PANDOC_WARMUP``
+runs a tiny conversion to each listed output format in a background thread as soon as
+the server starts. The MCP handshake does not wait for it.
+
+``MCP_PANDOC_WARMUP`` takes a comma-separated list of output formats, or ``all``. Warm-up
+is off when it is unset. Progress and the total duration are kept in :data:`WARMUP` and
+logged when warm-up finishes.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENV = "MCP_PANDOC_WARMUP"
+
+# Enough structure to load the writer, the templates and, for PDF, the TeX fonts.
+SAMPLE_DOCUMENT = "# Warm-up\n\nA paragraph with *emphasis*, `code` and a list:\n\n- one\n- two\n"
+
+_ENABLE_ALL = ("all", "1", "true", "yes", "on")
+_DISABLE = ("", "0", "false", "no", "off")
+
+
+@dataclass
+class WarmupStatus:
+    """Readiness of the warm-up stage."""
+
+    state: str = "disabled"
+    formats: list[str] = field(default_factory=list)
+    results: dict[str, str] = field(default_factory=dict)
+    duration_seconds: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether warm-up has finished or was never requested."""
+        return self.state in ("disabled", "ready")
+
+
+WARMUP = WarmupStatus()
+
+
+def warmup_formats(output_formats: Sequence[str]) -> list[str]:
+    """Return the output formats MCP_PANDOC_WARMUP asks to warm up."""
+    value = os.environ.get(WARMUP_ENV, "").strip().lower()
+    if value in _DISABLE:
+        return []
+    if value in _ENABLE_ALL:
+        return list(output_formats)
+
+    formats = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in formats if name not in output_formats]
+    if unknown:
+        raise ValueError(
+            f"{WARMUP_ENV} lists unsupported output formats: {', '.join(unknown)}. "
+            f"Use 'all' or some of: {', '.join(output_formats)}"
+        )
+    return formats
+
+
+def prime_font_cache():
+    """Build the fontconfig cache if it is missing or stale, as the first TeX run would."""
+    fc_cache = shutil.which("fc-cache")
+    if fc_cache:
+        subprocess.run([fc_cache], capture_output=True, check=False, timeout=300)  # noqa: S603
+
+
+def run_warmup(formats: Sequence[str], convert: Callable[[str, str], None]) -> WarmupStatus:
+    """Warm up each format in turn and record the outcome in WARMUP.
+
+    ``convert`` takes an output format and a scratch directory and converts
+    SAMPLE_DOCUMENT to that format there, raising if the conversion fails. A failure is
+    recorded and does not stop the other formats.
+    """
+    WARMUP.state = "warming"
+    WARMUP.formats = list(formats)
+    WARMUP.results = {}
+    started = time.perf_counter()
+
+    if "pdf" in formats:
+        prime_font_cache()
+        if not shutil.which("xelatex"):
+            WARMUP.results["pdf"] = "skipped: xelatex not found"
+            formats = [name for name in formats if name != "pdf"]
+
+    with tempfile.TemporaryDirectory(prefix="mcp-pandoc-warmup-") as scratch_dir:
+        for output_format in formats:
+            format_started = time.perf_counter()
+            try:
+                convert(output_format, scratch_dir)
+            except Exception as e:
+                WARMUP.results[output_format] = f"failed: {e}"
+                logger.warning("Warm-up conversion to %s failed: %s", output_format, e)
+            else:
+                WARMUP.results[output_format] = f"ok in {time.perf_counter() - format_started:.2f}s"
+
+    WARMUP.duration_seconds = time.perf_counter() - started
+    WARMUP.state = "ready"
+    logger.info(
+        "Warm-up finished in %.2fs: %s",
+        WARMUP.duration_seconds,
+        ", ".join(f"{name} {result}" for name, result in WARMUP.results.items()),
+    )
+    return WARMUP
+
+
+def start_warmup(output_formats: Sequence[str], convert: Callable[[str, str], None]) -> threading.Thread | None:
+    """Start warm-up in a daemon thread if MCP_PANDOC_WARMUP enables it.
+
+    The thread is a daemon so that a client closing the session is never kept waiting
+    for a TeX run to finish.
+    """
+    try:
+        formats = warmup_formats(output_formats)
+    except ValueError as e:
+        # Warm-up only saves time, so a bad setting must not stop the server starting
+        logger.warning("Skipping warm-up: %s", e)
+        return None
+    if not formats:
+        return None
+
+    logger.info("Warming up %s in the background", ", ".join(formats))
+    WARMUP.state = "warming"
+    thread = threading.Thread(target=run_warmup, args=(formats, convert), name="mcp-pandoc-warmup", daemon=True)
+    thread.start()
+    return thread
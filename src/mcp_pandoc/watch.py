@@ -0,0 +1,388 @@
+"""Watch mode: rebuild registered targets when their sources change.
+
+A target is a ``convert-contents`` call that writes an ``output_file``. Its dependencies
+are the input files, the reference document, the defaults file, the bibliographies that
+file lists and the filters. Every
+dependency's directory is watched, with inotify on Linux and by polling file stamps
+elsewhere, so editors that save by writing a new file and renaming it are seen too.
+
+A burst of changes, such as a save that touches several chapters, is collected until the
+files have been quiet for ``MCP_PANDOC_WATCH_DEBOUNCE_MS`` (default 300). Only the targets
+that depend on a changed file are rebuilt, on a pool of ``MCP_PANDOC_WATCH_WORKERS``
+threads. A target that changes again while it is building is rebuilt once more when the
+build finishes, never twice at the same time. Outputs whose content did not change are
+left untouched, so a target that writes into a watched directory does not loop.
+
+Set ``MCP_PANDOC_WATCH_POLL_SECONDS`` to poll at that interval even where inotify is
+available, for example on network filesystems that do not report changes.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+logger = logging.getLogger(__name__)
+
+WATCH_DEBOUNCE_ENV = "MCP_PANDOC_WATCH_DEBOUNCE_MS"
+WATCH_WORKERS_ENV = "MCP_PANDOC_WATCH_WORKERS"
+WATCH_POLL_ENV = "MCP_PANDOC_WATCH_POLL_SECONDS"
+
+DEFAULT_DEBOUNCE_MS = 300
+DEFAULT_POLL_SECONDS = 1.0
+
+# convert-contents arguments a target may set.
+TARGET_ARGUMENTS = (
+    "input_file", "input_files", "input_format", "output_file", "output_format",
+    "reference_doc", "defaults_file", "filters", "prune_bibliography", "incremental", "draft", "draft_pages",
+    "image_dpi", "image_max_pixels", "html_reduce", "html_drop_elements", "html_keep_elements", "html_drop_attributes",
+)
+
+# A burst that never goes quiet is still built after this many debounce periods.
+_MAX_DEBOUNCE_PERIODS = 10
+
+# inotify(7) event bits.
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_WATCH_MASK = _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+_EVENT = struct.Struct("iIII")
+
+
+def _env_number(name: str, default: float, minimum: float) -> float:
+    try:
+        return max(minimum, float(os.environ.get(name, default)))
+    except ValueError:
+        logger.warning("Ignoring invalid %s=%r", name, os.environ.get(name))
+        return default
+
+
+class PollingWatcher:
+    """Report changed files by comparing their size and mtime at an interval."""
+
+    def __init__(self, interval: float):
+        """Poll every interval seconds."""
+        self.interval = interval
+        self._stamps: dict[str, tuple | None] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path: str) -> tuple | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def watch(self, paths: set[str]):
+        """Replace the set of watched files."""
+        with self._lock:
+            self._stamps = {path: self._stamps[path] if path in self._stamps else self._stamp(path) for path in paths}
+
+    def wait(self, timeout: float) -> set[str]:
+        """Return the files that changed, waiting up to timeout seconds for one to."""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = set()
+            with self._lock:
+                for path, stamp in self._stamps.items():
+                    current = self._stamp(path)
+                    if current != stamp:
+                        self._stamps[path] = current
+                        changed.add(path)
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        """Nothing to release."""
+
+
+class InotifyWatcher:
+    """Report changed files from inotify events on their directories."""
+
+    def __init__(self):
+        """Open an inotify instance; raises OSError where inotify is not available."""
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths: set[str] = set()
+        self._directories: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, paths: set[str]):
+        """Replace the set of watched files, watching their directories."""
+        wanted = {os.path.dirname(path) for path in paths}
+        with self._lock:
+            self._paths = set(paths)
+            for wd, directory in list(self._directories.items()):
+                if directory not in wanted:
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                    del self._directories[wd]
+            for directory in wanted - set(self._directories.values()):
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+                if wd < 0:
+                    logger.warning("Cannot watch %s: %s", directory, os.strerror(ctypes.get_errno()))
+                else:
+                    self._directories[wd] = directory
+
+    def wait(self, timeout: float) -> set[str]:
+        """Return the watched files events were reported for, waiting up to timeout seconds."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        with self._lock:
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    # Events were dropped, so any file may have changed
+                    return set(self._paths)
+                if mask & _IN_IGNORED:
+                    self._directories.pop(wd, None)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is not None and name:
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self._paths:
+                        changed.add(path)
+        return changed
+
+    def close(self):
+        """Close the inotify instance."""
+        os.close(self._fd)
+
+
+def create_watcher():
+    """Return an inotify watcher where available, otherwise a polling one."""
+    if WATCH_POLL_ENV in os.environ:
+        return PollingWatcher(_env_number(WATCH_POLL_ENV, DEFAULT_POLL_SECONDS, 0.05))
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except OSError as e:
+            logger.info("Falling back to polling for watch mode: %s", e)
+    return PollingWatcher(DEFAULT_POLL_SECONDS)
+
+
+@dataclass
+class TargetStatus:
+    """Last build of a watched target."""
+
+    output_file: str
+    state: str = "queued"
+    builds: int = 0
+    last_started_at: str | None = None
+    last_duration_seconds: float | None = None
+    last_result: str | None = None
+    last_trigger: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _Target:
+    arguments: dict
+    dependencies: set[str]
+    status: TargetStatus
+    building: bool = False
+    rebuild: list[str] | None = None
+    # Futures of add calls made mid-build, resolved by the rebuild they queued
+    waiters: list[Future] = field(default_factory=list)
+
+
+def _bibliography_dependencies(defaults_file: str) -> list[str]:
+    import yaml
+
+    from .bibliography import bibliography_paths
+
+    try:
+        with open(defaults_file, encoding="utf-8") as f:
+            defaults = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        # The build reports a broken defaults file; the target still watches the file itself
+        return []
+    return bibliography_paths(defaults_file, defaults) if isinstance(defaults, dict) else []
+
+
+def target_dependencies(arguments: dict) -> set[str]:
+    """Return the absolute paths of every file a target's output depends on."""
+    paths = [arguments.get("input_file"), *arguments.get("input_files", []), arguments.get("reference_doc")]
+    defaults_file = arguments.get("defaults_file")
+    paths.append(defaults_file)
+    if defaults_file and os.path.isfile(defaults_file):
+        paths.extend(_bibliography_dependencies(defaults_file))
+    for filter_path in arguments.get("filters", []):
+        paths.append(filter_path)
+        if defaults_file and not os.path.isabs(filter_path):
+            # Filters may also be found next to the defaults file
+            paths.append(os.path.join(os.path.dirname(os.path.abspath(defaults_file)), filter_path))
+    return {os.path.abspath(path) for path in paths if path}
+
+
+class WatchService:
+    """Registered targets, the watcher thread and the build pool."""
+
+    def __init__(self, build: Callable[[dict], str], *, watcher=None, workers: int | None = None,
+                 debounce_seconds: float | None = None):
+        """Build targets with build(arguments), which returns the result text or raises."""
+        self._build = build
+        self._watcher = watcher
+        self._workers = workers
+        self._debounce = debounce_seconds
+        self._targets: dict[str, _Target] = {}
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        if self._watcher is None:
+            self._watcher = create_watcher()
+        if self._debounce is None:
+            self._debounce = _env_number(WATCH_DEBOUNCE_ENV, DEFAULT_DEBOUNCE_MS, 0) / 1000
+        workers = self._workers or int(_env_number(WATCH_WORKERS_ENV, min(4, os.cpu_count() or 1), 1))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-pandoc-watch")
+        self._thread = threading.Thread(target=self._loop, name="mcp-pandoc-watcher", daemon=True)
+        self._thread.start()
+
+    def add(self, arguments: dict) -> Future:
+        """Register or replace a target and build it; the future resolves to its status."""
+        arguments = {key: value for key, value in arguments.items() if key in TARGET_ARGUMENTS and value}
+        output_file = arguments.get("output_file")
+        if not output_file:
+            raise ValueError("output_file is required to watch a target")
+        if not arguments.get("input_file") and not arguments.get("input_files"):
+            raise ValueError("Either 'input_file' or 'input_files' must be provided to watch a target")
+
+        key = os.path.abspath(output_file)
+        dependencies = target_dependencies(arguments)
+        with self._lock:
+            self._start()
+            target = self._targets.get(key)
+            if target is not None and target.building:
+                # Built again with the new arguments once the running build finishes
+                target.arguments, target.dependencies = arguments, dependencies
+                target.rebuild = sorted({*(target.rebuild or []), "registered"})
+                waiter = Future()
+                target.waiters.append(waiter)
+                self._rewatch()
+                return waiter
+            target = self._targets[key] = _Target(arguments, dependencies, TargetStatus(key))
+            self._rewatch()
+            return self._submit(target, ["registered"])
+
+    def remove(self, output_file: str) -> bool:
+        """Stop watching a target; its output file is left in place."""
+        with self._lock:
+            removed = self._targets.pop(os.path.abspath(output_file), None) is not None
+            if removed:
+                self._rewatch()
+        return removed
+
+    def status(self, output_file: str | None = None) -> list[dict]:
+        """Return the status of every target, or of the target writing output_file."""
+        with self._lock:
+            targets = list(self._targets.values())
+        if output_file:
+            targets = [target for target in targets if target.status.output_file == os.path.abspath(output_file)]
+        return [{**asdict(target.status), "dependencies": sorted(target.dependencies)} for target in targets]
+
+    def close(self):
+        """Stop the watcher thread and the build pool."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        if self._watcher is not None:
+            self._watcher.close()
+
+    def _rewatch(self):
+        self._watcher.watch(set().union(*(target.dependencies for target in self._targets.values())))
+
+    def _submit(self, target: _Target, trigger: list[str]) -> Future:
+        target.building = True
+        target.status.state = "building"
+        target.status.last_trigger = trigger
+        future = self._pool.submit(self._run, target)
+        waiters, target.waiters = target.waiters, []
+        for waiter in waiters:
+            future.add_done_callback(lambda done, waiter=waiter: waiter.set_result(done.result()))
+        return future
+
+    def _run(self, target: _Target) -> dict:
+        status = target.status
+        started = time.time()
+        status.last_started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started))
+        try:
+            result = self._build(target.arguments)
+            status.state = "ok"
+            status.last_result = result
+        except Exception as e:
+            status.state = "error"
+            status.last_result = str(e)
+            logger.warning("Watched build of %s failed: %s", status.output_file, e)
+        status.last_duration_seconds = round(time.time() - started, 3)
+        status.builds += 1
+
+        with self._lock:
+            again, target.rebuild = target.rebuild, None
+            if again and self._targets.get(status.output_file) is target:
+                self._submit(target, again)
+            else:
+                target.building = False
+                # The target was removed before its queued rebuild could start
+                waiters, target.waiters = target.waiters, []
+                for waiter in waiters:
+                    waiter.set_result(asdict(status))
+        return asdict(status)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            changed = self._watcher.wait(0.5)
+            if not changed:
+                continue
+            # Let a burst of saves settle into one rebuild
+            deadline = time.monotonic() + self._debounce * _MAX_DEBOUNCE_PERIODS
+            while time.monotonic() < deadline and (more := self._watcher.wait(self._debounce)):
+                changed |= more
+            self._dispatch(changed)
+
+    def _dispatch(self, changed: set[str]):
+        with self._lock:
+            for target in self._targets.values():
+                trigger = sorted(target.dependencies & changed)
+                if not trigger:
+                    continue
+                if target.building:
+                    target.rebuild = sorted(set(target.rebuild or []) | set(trigger))
+                else:
+                    logger.info("Rebuilding %s after changes to %s", target.status.output_file, ", ".join(trigger))
+                    self._submit(target, trigger)
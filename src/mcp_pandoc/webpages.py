@@ -0,0 +1,412 @@
+"""Reduce scraped web pages before pandoc reads them.
+
+A page saved from the web is mostly scripts, style sheets, inline SVG icons, tracking
+markup and navigation, around a few kilobytes of article. pandoc's HTML reader builds
+all of it into a tree before dropping what it cannot represent, which is slow and
+memory-hungry on multi-megabyte pages. The page is instead streamed through a tokenizer
+and written out again without the parts that are not content:
+
+* elements matching a drop rule are removed with everything inside them. A rule is an
+  element name (``nav``), a class (``.cookie-banner``), an id (``#comments``), or an
+  attribute test (``[hidden]``, ``[role=navigation]``), optionally after an element name
+  (``img[width=1]``),
+* attributes matching a drop pattern are removed, with ``on*`` style wildcards,
+* with ``html_reduce``, comments are removed too.
+
+``html_reduce`` applies :data:`DEFAULT_DROP_ELEMENTS` and :data:`DEFAULT_DROP_ATTRIBUTES`.
+``html_drop_elements`` and ``html_drop_attributes`` add rules, and ``html_keep_elements``
+takes rules out of the defaults. Text, entities and the markup that is kept pass through
+unchanged. A dropped element that is never closed ends where its parent does, as in a
+browser.
+
+Run ``python -m mcp_pandoc.webpages`` to compare pandoc on generated pages with and
+without the reduction.
+"""
+import codecs
+import fnmatch
+import random
+import re
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from html import escape
+from html.parser import HTMLParser
+
+_KB = 1024
+
+# Read and tokenize the page in blocks, so a large file is never held twice.
+_BLOCK_SIZE = 64 * _KB
+
+# Elements and attributes that carry no content pandoc keeps.
+DEFAULT_DROP_ELEMENTS = (
+    "script", "style", "noscript", "template", "link", "svg", "canvas", "iframe", "object", "embed",
+    "nav", "button", "select", "input",
+    "[role=navigation]", "[role=banner]", "[role=contentinfo]", "[role=search]",
+    "[hidden]", "[aria-hidden=true]",
+    # Tracking pixels
+    "img[width=1]", "img[height=1]",
+)
+DEFAULT_DROP_ATTRIBUTES = (
+    "style", "on*", "data-*", "aria-*", "role", "tabindex", "rel", "target",
+    "srcset", "sizes", "loading", "decoding", "fetchpriority", "integrity", "crossorigin", "referrerpolicy", "nonce",
+    "itemprop", "itemscope", "itemtype", "js*",
+)
+
+# Elements that never have an end tag.
+_VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+))
+
+_RULE = re.compile(
+    r"(?P<tag>[a-z][a-z0-9-]*)?"
+    r"(?:\.(?P<class>[\w-]+)|#(?P<id>[\w-]+)|\[(?P<attribute>[\w:-]+)(?:=(?P<value>[^\]]*))?\])?"
+)
+
+
+# An attribute in a start tag as written, with its value skipped over.
+_ATTRIBUTE = re.compile(r"""([^\s/>"'=]+)(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]*))?""")
+
+
+@dataclass(frozen=True)
+class _Rule:
+    tag: str | None
+    attribute: str | None = None
+    value: str | None = None
+    # Whether value is one word of a space-separated list, as for class
+    word: bool = False
+
+    @classmethod
+    def parse(cls, text: str) -> "_Rule":
+        match = _RULE.fullmatch(text.strip().lower())
+        if not text.strip() or not match:
+            raise ValueError(
+                f"Invalid element rule {text!r}; use a name, .class, #id or [attribute=value], "
+                f"optionally after a name"
+            )
+        if match["class"]:
+            return cls(match["tag"], "class", match["class"], word=True)
+        if match["id"]:
+            return cls(match["tag"], "id", match["id"])
+        return cls(match["tag"], match["attribute"], match["value"])
+
+    def matches(self, tag: str, attributes: dict[str, str | None]) -> bool:
+        if self.tag and tag != self.tag:
+            return False
+        if not self.attribute:
+            return True
+        if self.attribute not in attributes:
+            return False
+        if self.value is None:
+            return True
+        actual = (attributes[self.attribute] or "").lower()
+        return self.value in actual.split() if self.word else actual == self.value
+
+
+def _strings(arguments: dict, name: str) -> tuple[str, ...]:
+    value = arguments.get(name) or []
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{name} must be an array of strings")
+    return tuple(item.strip().lower() for item in value)
+
+
+@dataclass(frozen=True)
+class HtmlReduction:
+    """What to remove from a web page before conversion."""
+
+    drop_elements: tuple[str, ...] = ()
+    drop_attributes: tuple[str, ...] = ()
+    drop_comments: bool = False
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "HtmlReduction | None":
+        """Build the reduction from the html_* tool arguments, or return None when none are set."""
+        defaults = bool(arguments.get("html_reduce"))
+        keep = _strings(arguments, "html_keep_elements")
+        if keep and not defaults:
+            raise ValueError("html_keep_elements takes rules out of the html_reduce defaults, so it needs html_reduce")
+        drop_elements = tuple(
+            rule for rule in DEFAULT_DROP_ELEMENTS if rule not in keep and _Rule.parse(rule).tag not in keep
+        ) if defaults else ()
+        reduction = cls(
+            drop_elements=drop_elements + _strings(arguments, "html_drop_elements"),
+            drop_attributes=(DEFAULT_DROP_ATTRIBUTES if defaults else ()) + _strings(arguments, "html_drop_attributes"),
+            drop_comments=defaults,
+        )
+        for rule in reduction.drop_elements:
+            _Rule.parse(rule)
+        return reduction if reduction != cls() else None
+
+
+def _size(size: int) -> str:
+    if size >= _KB * _KB:
+        return f"{size / _KB / _KB:.1f} MB"
+    return f"{size / _KB:.1f} KB" if size >= _KB else f"{size} bytes"
+
+
+@dataclass
+class ReductionReport:
+    """What reducing one page removed."""
+
+    bytes_before: int = 0
+    bytes_after: int = 0
+    elements_dropped: int = 0
+    attributes_dropped: int = 0
+
+    def summary(self) -> str:
+        """Describe the reduction for the tool result."""
+        elements = "1 element" if self.elements_dropped == 1 else f"{self.elements_dropped} elements"
+        attributes = "1 attribute" if self.attributes_dropped == 1 else f"{self.attributes_dropped} attributes"
+        return (
+            f"HTML reduced from {_size(self.bytes_before)} to {_size(self.bytes_after)} "
+            f"({elements} and {attributes} removed)"
+        )
+
+
+class _Reducer(HTMLParser):
+    """Write the tokens of a page back out, leaving out what the reduction drops."""
+
+    def __init__(self, reduction: HtmlReduction, report: ReductionReport):
+        super().__init__(convert_charrefs=False)
+        self.rules = [_Rule.parse(rule) for rule in reduction.drop_elements]
+        self.drop_attributes = reduction.drop_attributes
+        self.drop_comments = reduction.drop_comments
+        self.report = report
+        self.output: list[str] = []
+        # Elements written and not closed yet, and the elements open inside the one being dropped
+        self.open: list[str] = []
+        self.dropping: list[str] = []
+
+    def _drops(self, tag: str, attrs: list) -> bool:
+        attributes = dict(reversed(attrs))
+        return any(rule.matches(tag, attributes) for rule in self.rules)
+
+    def _start_tag(self, tag: str, attrs: list, end: str) -> str:
+        kept = [
+            (name, value) for name, value in attrs
+            if not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.drop_attributes)
+        ]
+        raw = self.get_starttag_text()
+        if len(kept) == len(attrs):
+            return raw
+        self.report.attributes_dropped += len(attrs) - len(kept)
+        # The tokenizer lowercases names, but SVG and MathML attributes such as viewBox are case-sensitive
+        written = {match[1].lower(): match[1] for match in _ATTRIBUTE.finditer(raw, len(tag) + 1)}
+        parts = [raw[:len(tag) + 1]]
+        for name, value in kept:
+            name = written.get(name, name)
+            parts.append(f" {name}" if value is None else f' {name}="{escape(value)}"')
+        parts.append(end)
+        return "".join(parts)
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            if tag not in _VOID_ELEMENTS:
+                self.dropping.append(tag)
+        elif self._drops(tag, attrs):
+            self.report.elements_dropped += 1
+            if tag not in _VOID_ELEMENTS:
+                self.dropping.append(tag)
+        else:
+            if tag not in _VOID_ELEMENTS:
+                self.open.append(tag)
+            self.output.append(self._start_tag(tag, attrs, ">"))
+
+    def handle_startendtag(self, tag, attrs):
+        if self.dropping:
+            return
+        if self._drops(tag, attrs):
+            self.report.elements_dropped += 1
+        else:
+            self.output.append(self._start_tag(tag, attrs, " />"))
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag in self.dropping:
+                del self.dropping[len(self.dropping) - 1 - self.dropping[::-1].index(tag):]
+                return
+            if tag not in self.open:
+                return
+            # The dropped element was never closed, and its parent is closing
+            self.dropping.clear()
+        if tag in self.open:
+            del self.open[len(self.open) - 1 - self.open[::-1].index(tag):]
+        self.output.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.output.append(data)
+
+    def handle_entityref(self, name):
+        if not self.dropping:
+            self.output.append(f"&{name};")
+
+    def handle_charref(self, name):
+        if not self.dropping:
+            self.output.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        if not self.dropping and not self.drop_comments:
+            self.output.append(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        if not self.dropping:
+            self.output.append(f"<!{decl}>")
+
+    def handle_pi(self, data):
+        if not self.dropping:
+            self.output.append(f"<?{data}>")
+
+    def unknown_decl(self, data):
+        if not self.dropping:
+            self.output.append(f"<![{data}]>")
+
+
+def html_blocks(source: str | bytes) -> Iterator[str]:
+    """Yield a page held in memory as text blocks."""
+    if isinstance(source, bytes):
+        try:
+            source = source.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ValueError(f"HTML input is not valid UTF-8: {e}") from e
+    for start in range(0, len(source), _BLOCK_SIZE):
+        yield source[start:start + _BLOCK_SIZE]
+
+
+def html_file_blocks(path: str) -> Iterator[str]:
+    """Yield a page file as text blocks, decoding it as UTF-8 as it is read."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+                yield decoder.decode(block)
+            yield decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise ValueError(f"HTML input is not valid UTF-8: {e}") from e
+
+
+def reduce_html(blocks: Iterable[str], reduction: HtmlReduction) -> tuple[str, ReductionReport]:
+    """Return the page without the elements, attributes and comments the reduction drops."""
+    report = ReductionReport()
+    reducer = _Reducer(reduction, report)
+    for block in blocks:
+        report.bytes_before += len(block.encode("utf-8"))
+        reducer.feed(block)
+    reducer.close()
+    reduced = "".join(reducer.output)
+    report.bytes_after = len(reduced.encode("utf-8"))
+    return reduced, report
+
+
+def sample_page(size_kb: int, seed: int = 0) -> str:
+    """Generate a news-site style page of about size_kb kilobytes, mostly scripts, styles and page chrome."""
+    rng = random.Random(seed)  # noqa: S311
+    words = ("pandoc", "document", "convert", "format", "server", "latency", "table", "figure", "section", "note")
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 16))).capitalize() + "."
+
+    icon = (
+        '<svg class="icon" viewBox="0 0 24 24" aria-hidden="true"><path d="'
+        + " ".join(f"L{rng.randint(0, 24)} {rng.randint(0, 24)}" for _ in range(40))
+        + '"/></svg>'
+    )
+    head = (
+        "<!DOCTYPE html>\n<html lang=\"en\"><head><meta charset=\"utf-8\"><title>Sample article</title>\n"
+        '<link rel="stylesheet" href="/site.css"><link rel="preload" href="/font.woff2" as="font">\n'
+    )
+    nav = (
+        '<header role="banner"><nav class="site-nav">'
+        + "".join(f'<a href="/section/{i}" data-track="nav-{i}">{icon}Section {i}</a>' for i in range(40))
+        + "</nav></header>\n"
+    )
+    parts = [head, "</head><body>\n", nav, '<main><article class="story">\n<h1>Sample article</h1>\n']
+    length = sum(len(part) for part in parts)
+    target = size_kb * _KB
+    section = 0
+    while length < target:
+        section += 1
+        block = (
+            f"<style>.story-{section} {{ margin: {section}px; color: #{rng.randint(0, 0xFFFFFF):06x}; }}"
+            + "".join(f".c{section}-{i} {{ padding: {i}px; }}" for i in range(30)) + "</style>\n"
+            f"<script>window.__data_{section} = {{" + ",".join(f'"k{i}": {rng.random()}' for i in range(60))
+            + "};</script>\n"
+            f'<h2 id="s{section}" data-anchor="s{section}">Section {section}</h2>\n'
+            f'<p class="para" style="line-height: 1.5" data-analytics="p{section}">{sentence()} '
+            f'<a href="https://example.com/{section}" rel="noopener" target="_blank" '
+            f'onclick="track({section})">{sentence()}</a> {sentence()}</p>\n'
+            f'<figure><img src="/img/{section}.jpg" alt="Figure {section}" '
+            f'srcset="/img/{section}-400.jpg 400w, /img/{section}-800.jpg 800w" sizes="100vw" loading="lazy">'
+            f"<figcaption>{sentence()}</figcaption></figure>\n"
+            f'<div class="share" aria-label="Share">{icon}{icon}<button onclick="share()">Share</button></div>\n'
+            f'<img src="https://tracker.example.com/p.gif?s={section}" width="1" height="1" alt="">\n'
+        )
+        parts.append(block)
+        length += len(block)
+    parts.append(
+        '</article></main>\n<footer role="contentinfo"><nav>'
+        + "".join(f'<a href="/about/{i}">About {i}</a>' for i in range(20))
+        + '</nav></footer>\n<div class="cookie-banner" hidden><p>We use cookies.</p></div>\n</body></html>\n'
+    )
+    return "".join(parts)
+
+
+def benchmark(sizes: list[int], to: str, repeat: int) -> list[dict]:
+    """Convert generated pages with pandoc as they are and reduced, keeping the best run of each."""
+    from .rts import time_job
+    from .runner import ResourceLimits, pandoc_path
+
+    argv = [pandoc_path(), *ResourceLimits.from_env().rts_args(), "--from=html", f"--to={to}"]
+    reduction = HtmlReduction.from_arguments({"html_reduce": True})
+    rows = []
+    for size in sizes:
+        page = sample_page(size)
+        started = time.perf_counter()
+        reduced, _ = reduce_html(html_blocks(page), reduction)
+        row = {"input": f"html {size} KB", "reduce_seconds": time.perf_counter() - started}
+        for setting, source in (("full", page), ("reduced", reduced)):
+            runs = [time_job(argv, source.encode("utf-8")) for _ in range(repeat)]
+            row[f"{setting}_bytes"] = len(source.encode("utf-8"))
+            row[f"{setting}_seconds"] = min(seconds for seconds, _ in runs)
+            row[f"{setting}_peak_rss_kb"] = max((rss or 0) for _, rss in runs) or None
+        rows.append(row)
+    return rows
+
+
+def format_benchmark(rows: list[dict]) -> str:
+    """Render benchmark rows as a plain-text table."""
+    lines = [
+        f"{'input':<16} {'full KB':>9} {'reduced KB':>11} {'reduce s':>9} {'full s':>8} {'reduced s':>10} "
+        f"{'full MB':>8} {'reduced MB':>11}"
+    ]
+    for row in rows:
+        full_mb, reduced_mb = (
+            f"{row[key] / 1024:.0f}" if row[key] else "-" for key in ("full_peak_rss_kb", "reduced_peak_rss_kb")
+        )
+        lines.append(
+            f"{row['input']:<16} {row['full_bytes'] / _KB:>9.0f} {row['reduced_bytes'] / _KB:>11.0f} "
+            f"{row['reduce_seconds']:>9.3f} {row['full_seconds']:>8.3f} {row['reduced_seconds']:>10.3f} "
+            f"{full_mb:>8} {reduced_mb:>11}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the web page reduction benchmark from the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mcp_pandoc.webpages", description="Compare pandoc on web pages with and without reduction."
+    )
+    parser.add_argument("--sizes", default="256,1024,4096", help="comma-separated page sizes in KB")
+    parser.add_argument("--to", default="markdown", help="output format")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page and setting")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    print(format_benchmark(benchmark(sizes, args.to, max(1, args.repeat))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
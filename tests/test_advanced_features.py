@@ -654,7 +654,7 @@ class TestFormatDirectionality:
         tool = (await handle_list_tools())[0]
         properties = tool.input_schema["properties"]
 
-        assert properties["input_format"]["enum"] == list(INPUT_FORMATS)
+        assert properties["input_format"]["enum"] == [*INPUT_FORMATS, "auto"]
         assert properties["output_format"]["enum"] == list(OUTPUT_FORMATS)
 
     @pytest.mark.asyncio
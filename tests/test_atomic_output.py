@@ -0,0 +1,117 @@
+"""Tests for atomic output writes that skip unchanged rebuilds."""
+import os
+import zipfile
+
+import pytest
+from mcp_pandoc.outputs import commit_output, normalized_digest, temp_output_path
+from mcp_pandoc.server import handle_call_tool
+
+SOURCE = "# Report\n\nQuarterly numbers are up.\n"
+
+
+async def _convert(contents, output_file, output_format):
+    result = await handle_call_tool(
+        "convert-contents",
+        {"contents": contents, "output_format": output_format, "output_file": str(output_file)},
+    )
+    return result[0].text
+
+
+def _age(path):
+    """Backdate a file so an untouched rebuild is distinguishable from a rewrite."""
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    return os.stat(path).st_mtime_ns
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("output_format", ["html", "docx", "odt", "pptx", "epub"])
+async def test_identical_rebuild_leaves_the_file_untouched(tmp_path, output_format):
+    """Rebuilding from unchanged sources keeps the old file, mtime and all."""
+    output = tmp_path / f"report.{output_format}"
+    first = await _convert(SOURCE, output, output_format)
+    mtime = _age(output)
+    before = output.read_bytes()
+
+    second = await _convert(SOURCE, output, output_format)
+
+    assert "Output file updated." in first
+    assert "Output file unchanged" in second
+    assert os.stat(output).st_mtime_ns == mtime
+    assert output.read_bytes() == before
+    assert os.listdir(tmp_path) == [output.name]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("output_format", ["html", "docx"])
+async def test_changed_content_replaces_the_file(tmp_path, output_format):
+    """A real change is written, and the file keeps the permissions it had."""
+    output = tmp_path / f"report.{output_format}"
+    await _convert(SOURCE, output, output_format)
+    output.chmod(0o640)
+    mtime = _age(output)
+
+    result = await _convert(SOURCE + "\nRevenue doubled.\n", output, output_format)
+
+    assert "Output file updated." in result
+    assert os.stat(output).st_mtime_ns != mtime
+    assert output.stat().st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == [output.name]
+
+
+@pytest.mark.asyncio
+async def test_failed_conversion_keeps_the_previous_file(tmp_path):
+    """A conversion that fails part way never leaves a truncated target or a stray temp file."""
+    output = tmp_path / "report.html"
+    output.write_text("previous build", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        await handle_call_tool(
+            "convert-contents",
+            {
+                "contents": SOURCE,
+                "output_format": "html",
+                "output_file": str(output),
+                "filters": [str(tmp_path / "missing-filter.py")],
+            },
+        )
+
+    assert output.read_text(encoding="utf-8") == "previous build"
+    assert os.listdir(tmp_path) == [output.name]
+
+
+def test_zip_digest_ignores_member_timestamps(tmp_path):
+    """Only names and contents count, not the dates zip stamps on members."""
+    paths = []
+    for year in (1990, 2020):
+        path = tmp_path / f"{year}.docx"
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr(zipfile.ZipInfo("word/document.xml", (year, 1, 1, 0, 0, 0)), "<w:document/>")
+            archive.writestr(
+                zipfile.ZipInfo("docProps/core.xml", (year, 1, 1, 0, 0, 0)),
+                f"<dcterms:created>{year}-01-01T00:00:00Z</dcterms:created>",
+            )
+        paths.append(path)
+
+    assert normalized_digest(str(paths[0]), "docx") == normalized_digest(str(paths[1]), "docx")
+
+
+def test_pdf_digest_ignores_dates_and_file_id(tmp_path):
+    """PDF creation dates and trailer IDs differ on every run of the engine."""
+    first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    first.write_bytes(b"%PDF-1.5\n/CreationDate (D:20240101)\ntrailer /ID [<AA><BB>]\n")
+    second.write_bytes(b"%PDF-1.5\n/CreationDate (D:20250101)\ntrailer /ID [<CC><DD>]\n")
+
+    assert normalized_digest(str(first), "pdf") == normalized_digest(str(second), "pdf")
+
+
+def test_new_file_is_moved_into_place(tmp_path):
+    """With nothing to compare against the temporary file simply becomes the output."""
+    target = tmp_path / "notes.md"
+    temp = temp_output_path(str(target))
+    with open(temp, "w", encoding="utf-8") as handle:
+        handle.write("# Notes\n")
+
+    assert os.path.dirname(temp) == str(tmp_path)
+    assert commit_output(temp, str(target), "markdown") is True
+    assert target.read_text(encoding="utf-8") == "# Notes\n"
+    assert not os.path.exists(temp)
@@ -0,0 +1,111 @@
+"""Tests for the CSL JSON cache of citeproc bibliographies."""
+import pytest
+from mcp_pandoc.bibliography import cited_keys, wait_for_conversions
+from mcp_pandoc.server import handle_call_tool
+from mcp_pandoc.watch import target_dependencies
+
+BIBTEX = """@article{doe99,
+  author = {Doe, Jane},
+  title = {On Caching},
+  journal = {Journal of Examples},
+  year = {1999}
+}
+
+@book{roe:2010,
+  author = {Roe, Richard},
+  title = {Databases at Scale},
+  publisher = {Example Press},
+  year = {2010}
+}
+
+@misc{unused,
+  author = {Poe, Edgar},
+  title = {Never Cited},
+  year = {1845}
+}
+"""
+
+PAPER = "# Paper\n\nCaching helps [@doe99], as @roe:2010 showed.\n\n# References\n"
+
+
+@pytest.fixture
+def paper(tmp_path, monkeypatch):
+    """A paper, its bibliography and a citeproc defaults file, with the cache in tmp_path."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "refs.bib").write_text(BIBTEX, encoding="utf-8")
+    defaults = tmp_path / "citations.yaml"
+    defaults.write_text("citeproc: true\nbibliography: ${.}/refs.bib\n", encoding="utf-8")
+    source = tmp_path / "paper.md"
+    source.write_text(PAPER, encoding="utf-8")
+    return source, defaults
+
+
+async def _convert(source, defaults, **arguments):
+    result = await handle_call_tool(
+        "convert-contents",
+        {"input_file": str(source), "output_format": "html", "defaults_file": str(defaults), **arguments},
+    )
+    info, _, converted = result[0].text.partition("Converted Contents:\n\n")
+    return info, converted
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("As [@doe99; @roe:2010, p. 4] and @{weird key} said.", {"doe99", "roe:2010", "weird key"}),
+        ("Shown by @doe99. Write to jane@example.com.", {"doe99"}),
+        ("\\citep[see][12]{doe99, roe:2010} and \\textcite{poe}", {"doe99", "roe:2010", "poe"}),
+        ("---\nnocite: '@*'\n---\nText.", None),
+    ],
+)
+def test_cited_keys(text, expected):
+    """Markdown and LaTeX citations are found, and @* keeps the whole bibliography."""
+    assert cited_keys([text]) == expected
+
+
+@pytest.mark.asyncio
+async def test_cached_and_pruned_bibliographies_render_the_same(paper):
+    """The first build reads the .bib, later ones the cached CSL JSON, pruned or whole."""
+    source, defaults = paper
+
+    info, first = await _convert(source, defaults)
+    assert "Bibliography: refs.bib read directly while the CSL JSON copy is built." in info
+    wait_for_conversions()
+
+    info, cached = await _convert(source, defaults)
+    assert "Bibliography: refs.bib from the CSL JSON cache." in info
+
+    info, pruned = await _convert(source, defaults, prune_bibliography=True)
+    assert "Bibliography: refs.bib from the CSL JSON cache, pruned to 2 of 3 entries." in info
+
+    assert "Databases at Scale" in first
+    assert "Never Cited" not in first
+    assert first == cached == pruned
+
+
+@pytest.mark.asyncio
+async def test_cache_can_be_turned_off(paper, monkeypatch):
+    """With the cache off pandoc is given the original file and nothing is reported."""
+    monkeypatch.setenv("MCP_PANDOC_BIBLIOGRAPHY_CACHE", "off")
+    source, defaults = paper
+
+    info, converted = await _convert(source, defaults)
+
+    assert "Bibliography:" not in info
+    assert "On Caching" in converted
+
+
+@pytest.mark.asyncio
+async def test_pruning_needs_citeproc(tmp_path):
+    """prune_bibliography is rejected when nothing runs citeproc."""
+    with pytest.raises(ValueError, match="prune_bibliography needs a defaults_file that runs citeproc"):
+        await handle_call_tool("convert-contents", {"contents": "# Hi", "prune_bibliography": True})
+
+
+def test_watch_depends_on_the_bibliography(paper):
+    """Editing a bibliography rebuilds the targets whose defaults list it."""
+    source, defaults = paper
+
+    dependencies = target_dependencies({"input_file": str(source), "defaults_file": str(defaults)})
+
+    assert str(defaults.parent / "refs.bib") in dependencies
@@ -0,0 +1,108 @@
+"""Tests for binary sources sent as base64 or embedded resources."""
+import base64
+
+import pytest
+from mcp_pandoc import blobs
+from mcp_pandoc.runner import run_pandoc
+from mcp_pandoc.server import handle_call_tool
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+@pytest.fixture
+def docx_bytes(tmp_path):
+    """A small Word document, as the bytes a client would send."""
+    path = tmp_path / "minutes.docx"
+    run_pandoc("docx", source="# Minutes\n\nAll agreed.", input_format="markdown", outputfile=str(path))
+    return path.read_bytes()
+
+
+async def _convert(**arguments):
+    result = await handle_call_tool("convert-contents", {"output_format": "markdown", **arguments})
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_base64_docx_is_detected_and_converted(docx_bytes):
+    """A docx sent as base64 needs no file on the server and no input_format."""
+    text = await _convert(contents_base64=base64.b64encode(docx_bytes).decode("ascii"))
+
+    assert "Detected input format: docx." in text
+    assert "# Minutes" in text and "All agreed." in text
+    assert "Input blob:" not in text
+
+
+@pytest.mark.asyncio
+async def test_embedded_resource_uses_its_mime_type(docx_bytes, tmp_path):
+    """The resource of an EmbeddedResource is converted with the reader its mimeType names."""
+    output = tmp_path / "minutes.html"
+    resource = {
+        "uri": "file:///remote/minutes.docx",
+        "mimeType": DOCX_MIME_TYPE,
+        "blob": base64.encodebytes(docx_bytes).decode("ascii"),
+    }
+
+    text = await _convert(resource=resource, output_format="html", output_file=str(output))
+
+    assert text.startswith(f"Content successfully converted and saved to: {output}")
+    assert "Detected input format: docx." in text
+    assert "All agreed." in output.read_text(encoding="utf-8")
+
+
+@pytest.mark.asyncio
+async def test_text_resource_is_converted_like_contents():
+    """A text resource is read as text, with its MIME type picking the reader."""
+    text = await _convert(resource={"uri": "mem://page", "mimeType": "text/html", "text": "<h2>Agenda</h2>"})
+
+    assert "## Agenda" in text
+
+
+@pytest.mark.asyncio
+async def test_explicit_input_format_wins_over_detection():
+    """input_format is used as given for a blob."""
+    text = await _convert(
+        contents_base64=base64.b64encode(b"<h1>Raw</h1>").decode("ascii"), input_format="markdown"
+    )
+
+    assert "Detected input format" not in text
+    assert "<h1>\nRaw\n</h1>" in text
+
+
+@pytest.mark.asyncio
+async def test_oversized_payload_is_refused_before_decoding(monkeypatch):
+    """The limit is checked from the base64 length, so an oversized payload is never decoded."""
+    monkeypatch.setenv(blobs.BLOB_LIMIT_ENV, "1")
+    decoded = []
+    monkeypatch.setattr(blobs.base64, "b64decode", lambda *args, **kwargs: decoded.append(args))
+
+    with pytest.raises(ValueError, match="contents_base64 decodes to 1.5 MB, over the 1 MB limit"):
+        await _convert(contents_base64="A" * (2 * 1024 * 1024))
+    assert decoded == []
+
+
+@pytest.mark.asyncio
+async def test_large_payload_reports_memory(monkeypatch):
+    """Payloads over the report threshold say how big they were and how much memory the server peaked at."""
+    monkeypatch.setattr(blobs, "REPORT_BYTES", 16)
+    text = await _convert(contents_base64=base64.b64encode(b"# Title\n\n" + b"word " * 20).decode("ascii"))
+
+    assert "Input blob: 0.0 MB decoded from 0.0 MB of base64 and streamed to pandoc's stdin" in text
+
+
+@pytest.mark.asyncio
+async def test_invalid_base64_is_reported():
+    """Malformed base64 names the argument it came from."""
+    with pytest.raises(ValueError, match="contents_base64 is not valid base64"):
+        await _convert(contents_base64="abc")
+    # Characters outside the alphabet are an error, not silently dropped into different bytes
+    with pytest.raises(ValueError, match="contents_base64 is not valid base64"):
+        await _convert(contents_base64=base64.b64encode(b"# Title\n").decode("ascii").replace("Ua", "U*a"))
+
+
+@pytest.mark.asyncio
+async def test_blob_excludes_other_sources(docx_bytes, tmp_path):
+    """A blob cannot be combined with another source."""
+    encoded = base64.b64encode(docx_bytes).decode("ascii")
+
+    with pytest.raises(ValueError, match="Only one source can be converted per call, but contents and contents_base64"):
+        await _convert(contents="# Also", contents_base64=encoded)
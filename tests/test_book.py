@@ -0,0 +1,144 @@
+"""Tests for multi-file book builds and the per-chapter AST cache."""
+import json
+import os
+import zipfile
+
+import pytest
+from mcp_pandoc import book
+from mcp_pandoc.server import handle_call_tool
+
+CHAPTERS = {
+    "01-intro.md": "---\ntitle: The Book\n---\n\n# Introduction\n\nWhere it starts.[^a]\n\n[^a]: First note.\n",
+    "02-middle.md": "# Middle\n\n## Introduction\n\nA second introduction.[^a]\n\n[^a]: Second note.\n",
+    "03-end.md": "---\ntitle: Ignored\n---\n\n# End\n\nWhere it stops.\n",
+}
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep the AST cache inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def chapters(tmp_path):
+    """Write the chapter files and return their paths in order."""
+    paths = []
+    for name, text in CHAPTERS.items():
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Record every chapter pandoc parses."""
+    parsed = []
+    run_pandoc = book.run_pandoc
+
+    def spy(to, **kwargs):
+        parsed.append(kwargs["input_file"])
+        return run_pandoc(to, **kwargs)
+
+    monkeypatch.setattr(book, "run_pandoc", spy)
+    return parsed
+
+
+async def _build(paths, **arguments):
+    result = await handle_call_tool("convert-contents", {"input_files": paths, "output_format": "html", **arguments})
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_chapters_are_merged_in_order(chapters, parses):
+    """The book keeps chapter order, the first title, every footnote, and unique heading ids."""
+    text = await _build(chapters, output_format="html")
+
+    assert "Chapters: 3 (3 parsed, 0 from the AST cache)." in text
+    assert text.index("Where it starts.") < text.index("A second introduction.") < text.index("Where it stops.")
+    assert '<h1 id="introduction">Introduction</h1>' in text
+    assert '<h2 id="introduction-1">Introduction</h2>' in text
+    assert "First note." in text and "Second note." in text
+    assert sorted(parses) == sorted(chapters)
+
+
+@pytest.mark.asyncio
+async def test_only_the_edited_chapter_is_parsed_again(chapters, parses):
+    """After one chapter changes, the others come from the cache and the output has the edit."""
+    await _build(chapters)
+    parses.clear()
+
+    with open(chapters[1], "a", encoding="utf-8") as f:
+        f.write("\nAn added paragraph.\n")
+    text = await _build(chapters)
+
+    assert parses == [chapters[1]]
+    assert "Chapters: 3 (1 parsed, 2 from the AST cache)." in text
+    assert "An added paragraph." in text
+
+
+def test_metadata_comes_from_the_first_chapter_that_sets_it(chapters):
+    """Later chapters cannot override a field an earlier one set."""
+    merged = json.loads(book.build_book(chapters)[0])
+
+    assert merged["meta"]["title"]["c"][0] == {"t": "Str", "c": "The"}
+    assert [block["t"] for block in merged["blocks"]].count("Header") == 4
+
+
+@pytest.mark.asyncio
+async def test_book_is_written_once_to_a_file(chapters, tmp_path):
+    """Binary formats are written from the merged AST with the usual file handling."""
+    output = tmp_path / "book.docx"
+
+    text = await _build(chapters, output_format="docx", output_file=str(output))
+
+    assert text.startswith(f"Book successfully converted and saved to: {output}")
+    document = zipfile.ZipFile(output).read("word/document.xml").decode("utf-8")
+    assert document.index("Where it starts.") < document.index("A second introduction.") < document.index("Where it stops.")
+
+
+@pytest.mark.asyncio
+async def test_book_can_be_chunked(chapters):
+    """A book is chunked like any other source."""
+    text = await _build(chapters, output_format="markdown", chunk_max_bytes=256)
+
+    manifest = json.loads(text.split("Chunk manifest:\n\n", 1)[1])
+    assert [chunk["heading_path"][-1] for chunk in manifest["chunks"]][:2] == ["Introduction", "Middle"]
+
+
+@pytest.mark.asyncio
+async def test_missing_chapter_is_reported(chapters, tmp_path):
+    """A missing chapter names the file."""
+    with pytest.raises(ValueError, match="Input file not found: .*99-missing.md"):
+        await _build([*chapters, str(tmp_path / "99-missing.md")])
+
+
+@pytest.mark.asyncio
+async def test_input_files_exclude_other_sources(chapters):
+    """A call has exactly one source."""
+    with pytest.raises(ValueError, match="input_files cannot be combined"):
+        await _build(chapters, contents="# Extra")
+
+
+@pytest.mark.asyncio
+async def test_packaged_chapters_are_refused(chapters):
+    """A docx chapter would lose its images in the AST, so the book is not built."""
+    docx = os.path.join(os.path.dirname(__file__), "fixtures", "test.docx")
+
+    with pytest.raises(ValueError, match="Chapter .*test.docx is read as docx, which cannot be built into a book"):
+        await _build([*chapters, docx])
+
+
+def test_repeated_identifiers_are_renamed_inside_lists_and_tables(tmp_path):
+    """Headings nested in list items and table cells are renamed like top-level ones."""
+    first = tmp_path / "a.html"
+    first.write_text("<h1>Setup</h1><h2>Usage</h2>", encoding="utf-8")
+    second = tmp_path / "b.html"
+    second.write_text(
+        "<ul><li><h2>Setup</h2></li></ul><table><tr><td><h3>Usage</h3></td></tr></table>", encoding="utf-8"
+    )
+
+    merged = book.build_book([str(first), str(second)])[0]
+
+    assert merged.count('"setup-1"') == 1 and merged.count('"usage-1"') == 1
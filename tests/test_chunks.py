@@ -0,0 +1,170 @@
+"""Tests for heading-aware chunked output and the get-chunk tool."""
+import json
+
+import mcp.types as types
+import pypandoc
+import pytest
+from mcp_pandoc.server import call_tool, handle_call_tool
+
+BOOK = """# Part One
+
+Opening paragraph with a footnote.[^n]
+
+## Chapter 1
+
+{chapter_one}
+
+## Chapter 2
+
+Short chapter.
+
+# Part Two
+
+Closing words.
+
+[^n]: The note travels with its paragraph.
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep chunk manifests inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def _book(paragraphs=12):
+    chapter = "\n\n".join(f"Paragraph {i} of the first chapter, long enough to count. " * 3 for i in range(paragraphs))
+    return BOOK.format(chapter_one=chapter)
+
+
+def _manifest(result_text):
+    return json.loads(result_text.split("Chunk manifest:\n\n", 1)[1])
+
+
+async def _chunk(arguments):
+    result = await handle_call_tool("convert-contents", {"output_format": "markdown", **arguments})
+    return result[0].text
+
+
+async def _get(chunk_id):
+    result = await handle_call_tool("get-chunk", {"chunk_id": chunk_id})
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_chunks_follow_headings_and_respect_the_size_limit():
+    """Every heading starts a chunk, long sections are split, and paths are recorded."""
+    manifest = _manifest(await _chunk({"contents": _book(), "chunk_max_bytes": 600}))
+    chunks = manifest["chunks"]
+
+    paths = [chunk["heading_path"] for chunk in chunks]
+    assert paths[0] == ["Part One"]
+    assert ["Part One", "Chapter 2"] in paths
+    assert paths[-1] == ["Part Two"]
+
+    chapter_one = [chunk for chunk in chunks if chunk["heading_path"] == ["Part One", "Chapter 1"]]
+    assert len(chapter_one) > 1
+    assert [chunk["continuation"] for chunk in chapter_one] == [False] + [True] * (len(chapter_one) - 1)
+
+    assert all(chunk["bytes"] <= 600 for chunk in chunks)
+    assert [chunk["ordinal"] for chunk in chunks] == list(range(1, len(chunks) + 1))
+    assert all(a["end"] == b["start"] for a, b in zip(chunks, chunks[1:]))
+
+
+@pytest.mark.asyncio
+async def test_chunks_reassemble_and_keep_footnotes_local():
+    """Paging through every chunk by id yields the whole document, footnote included."""
+    manifest = _manifest(await _chunk({"contents": _book(), "chunk_max_bytes": 600}))
+
+    texts = []
+    chunk_id = manifest["chunks"][0]["id"]
+    while chunk_id:
+        page = await _get(chunk_id)
+        texts.append(page.split("Chunk contents:\n\n", 1)[1])
+        next_line = next(line for line in page.splitlines() if line.startswith("Next chunk_id: "))
+        chunk_id = next_line.removeprefix("Next chunk_id: ")
+        if chunk_id.startswith("none"):
+            chunk_id = None
+
+    assert len(texts) == len(manifest["chunks"])
+    assert len("".join(texts).encode("utf-8")) == manifest["total_bytes"]
+    assert "The note travels with its paragraph." in texts[0]
+
+
+@pytest.mark.asyncio
+async def test_manifest_is_served_from_cache_for_the_same_source(tmp_path):
+    """A second conversion of unchanged bytes does not convert again."""
+    source = tmp_path / "book.docx"
+    pypandoc.convert_text(_book(), "docx", format="md", outputfile=str(source))
+
+    first = await _chunk({"input_file": str(source), "chunk_max_bytes": 600})
+    second = await _chunk({"input_file": str(source), "chunk_max_bytes": 600})
+    resized = await _chunk({"input_file": str(source), "chunk_max_bytes": 2000})
+
+    assert "newly chunked" in first
+    assert "served from the chunk cache" in second
+    assert _manifest(first) == _manifest(second)
+    assert _manifest(resized)["document_id"] != _manifest(first)["document_id"]
+
+
+@pytest.mark.asyncio
+async def test_chunks_use_the_writer_options_of_the_defaults_file(tmp_path):
+    """Chunks are written like the unchunked conversion, and the defaults file's filters still run only once."""
+    exclaim = tmp_path / "exclaim.lua"
+    exclaim.write_text('function Str(s) if s.text == "Closing" then s.text = s.text .. "!" end return s end\n')
+    defaults = tmp_path / "narrow.yaml"
+    defaults.write_text(f"columns: 30\nwrap: auto\nfilters:\n  - {exclaim}\n", encoding="utf-8")
+    arguments = {"contents": _book(2), "defaults_file": str(defaults)}
+
+    manifest = _manifest(await _chunk({**arguments, "chunk_max_bytes": 600}))
+    whole = (await handle_call_tool("convert-contents", {**arguments, "output_format": "markdown"}))[0].text
+    chunks = [(await _get(chunk["id"])).split("Chunk contents:\n\n", 1)[1] for chunk in manifest["chunks"]]
+
+    assert all(len(line) <= 30 for text in chunks for line in text.splitlines())
+    assert "Closing! words." in chunks[-1] and "Closing!!" not in chunks[-1]
+    # Footnotes follow their paragraph in chunks, so only the order of words may differ
+    assert sorted("".join(chunks).split()) == sorted(whole.split("Converted Contents:", 1)[1].split())
+
+
+@pytest.mark.asyncio
+async def test_html_chunks_split_cleanly():
+    """Writers that wrap the marker paragraph in markup split on the whole line."""
+    manifest = _manifest(await _chunk({"contents": _book(2), "output_format": "html", "chunk_max_bytes": 4096}))
+    text = await _get(manifest["chunks"][0]["id"])
+
+    assert '<h1 id="part-one">Part One</h1>' in text
+    assert "MCPPANDOCBLOCKBREAK" not in text
+
+
+@pytest.mark.asyncio
+async def test_chunk_mode_rejects_output_file(tmp_path):
+    """Chunks are served by get-chunk, so an output file is a contradiction."""
+    with pytest.raises(ValueError, match="cannot be combined with output_file"):
+        await _chunk({"contents": "# A", "chunk_max_bytes": 600, "output_file": str(tmp_path / "out.md")})
+
+
+@pytest.mark.asyncio
+async def test_chunk_mode_needs_a_block_sequence_output():
+    """A notebook is one JSON document, so a run of its blocks is not valid on its own."""
+    with pytest.raises(ValueError, match="not supported for 'ipynb' output format. Chunks can only be made for"):
+        await _chunk({"contents": _book(), "chunk_max_bytes": 600, "output_format": "ipynb"})
+
+
+@pytest.mark.asyncio
+async def test_unknown_chunk_is_reported_through_the_client_path():
+    """A chunk id that was never produced returns a readable tool error."""
+    result = await call_tool(
+        None,
+        types.CallToolRequestParams(name="get-chunk", arguments={"chunk_id": "0" * 20 + "-0001"}),
+    )
+
+    assert result.is_error is True
+    assert "No chunked document found" in result.content[0].text
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_id", ["../../../../../tmp/a-0001", "/etc/passwd/aaaaaaaa-0001", "A" * 20 + "-0001"])
+async def test_chunk_id_must_be_a_document_hash(chunk_id):
+    """Only lowercase hex document ids are looked up, so a chunk id cannot name a path outside the cache."""
+    with pytest.raises(ValueError, match="Invalid chunk_id"):
+        await _get(chunk_id)
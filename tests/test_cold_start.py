@@ -0,0 +1,88 @@
+"""Cold-start budget for the server entry point.
+
+Clients start a fresh server for every session, so everything imported before the
+handshake is paid again on each one. These tests keep the heavy conversion dependencies
+out of that path and put a ceiling on the time to the first tools/list.
+
+Override the ceilings with MCP_PANDOC_IMPORT_BUDGET_MS and MCP_PANDOC_COLD_START_BUDGET_MS
+on slow CI machines.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pytest
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+# Only needed once a conversion runs, never for initialize or tools/list.
+DEFERRED_MODULES = ("pypandoc", "yaml", "jsonschema")
+
+# Import time of this package's own modules, excluding the MCP SDK they build on.
+IMPORT_BUDGET_MS = int(os.environ.get("MCP_PANDOC_IMPORT_BUDGET_MS", "100"))
+
+# Process start to first tools/list response, MCP SDK import included.
+COLD_START_BUDGET_MS = int(os.environ.get("MCP_PANDOC_COLD_START_BUDGET_MS", "5000"))
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def _run_python(code, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], capture_output=True, text=True, check=True, timeout=60
+    )
+
+
+def test_deferred_modules_are_not_imported_before_first_use():
+    """-X importtime shows none of the conversion dependencies at server import."""
+    result = _run_python("import mcp_pandoc.server", "-X", "importtime")
+
+    imported = {match.group(4) for match in map(_IMPORTTIME_LINE.match, result.stderr.splitlines()) if match}
+    assert "mcp_pandoc.server" in imported
+    for module in DEFERRED_MODULES:
+        assert module not in imported, f"{module} is imported at startup"
+
+
+def test_own_import_time_is_within_budget():
+    """The package's own modules import quickly; the MCP SDK is measured separately."""
+    result = _run_python("import mcp_pandoc.server", "-X", "importtime")
+
+    own_us = sum(
+        int(match.group(1))
+        for match in map(_IMPORTTIME_LINE.match, result.stderr.splitlines())
+        if match and match.group(4).startswith("mcp_pandoc")
+    )
+    assert own_us / 1000 < IMPORT_BUDGET_MS, f"mcp_pandoc modules took {own_us / 1000:.1f} ms to import"
+
+
+def test_tools_list_does_not_load_conversion_machinery():
+    """Listing tools works from the fast path alone."""
+    result = _run_python(
+        "import asyncio, sys\n"
+        "from mcp_pandoc.server import list_tools\n"
+        "asyncio.run(list_tools(None, None))\n"
+        f"print(sorted(m for m in {DEFERRED_MODULES!r} if m in sys.modules))\n"
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.asyncio
+async def test_time_to_first_tools_list_is_within_budget():
+    """A freshly spawned server answers initialize and tools/list within the budget."""
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-c", "from mcp_pandoc import main; main()"],
+    )
+
+    started = time.perf_counter()
+    async with stdio_client(params) as streams:
+        async with ClientSession(*streams) as session:
+            await session.initialize()
+            tools = await session.list_tools()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+    assert tools.tools
+    assert elapsed_ms < COLD_START_BUDGET_MS, f"first tools/list took {elapsed_ms:.0f} ms"
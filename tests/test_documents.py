@@ -0,0 +1,101 @@
+"""Tests for documents registered once and converted by handle."""
+import base64
+import os
+
+import pytest
+from mcp_pandoc import documents
+from mcp_pandoc.documents import get_document, register_document
+from mcp_pandoc.runner import run_pandoc
+from mcp_pandoc.server import handle_call_tool
+
+REPORT = "".join(f"# Part {i}\n\nFindings for part {i}, with *emphasis* and a [link](https://example.com).\n\n"
+                 for i in range(20))
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep spilled documents and the AST cache inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+async def _register(**arguments) -> str:
+    result = await handle_call_tool("register-document", arguments)
+    return result[0].text.split("document_id ")[1].split()[0]
+
+
+async def _converted(**arguments) -> tuple[str, str]:
+    result = await handle_call_tool("convert-contents", {"output_format": "html", **arguments})
+    info, _, converted = result[0].text.partition("Converted Contents:\n\n")
+    return info, converted
+
+
+@pytest.mark.asyncio
+async def test_converting_by_handle_matches_contents():
+    """A handle converts to what its contents do, parsing the source once for several conversions."""
+    document_id = await _register(contents=REPORT)
+
+    _, expected = await _converted(contents=REPORT)
+    first_info, first = await _converted(document_id=document_id)
+    second_info, second = await _converted(document_id=document_id)
+
+    assert first == second == expected
+    assert "Document AST: parsed and cached." in first_info
+    assert "Document AST: from the cache." in second_info
+    assert await _register(contents=REPORT) == document_id
+
+
+@pytest.mark.asyncio
+async def test_binary_documents_keep_their_reader(tmp_path):
+    """A docx registered from base64 is converted with its own reader, not through the AST cache."""
+    path = tmp_path / "minutes.docx"
+    run_pandoc("docx", source="# Minutes\n\nAll agreed.", input_format="markdown", outputfile=str(path))
+
+    document_id = await _register(contents_base64=base64.b64encode(path.read_bytes()).decode("ascii"))
+    info, converted = await _converted(document_id=document_id, output_format="markdown")
+
+    assert "Detected input format: docx." in info
+    assert "Document AST" not in info
+    assert "All agreed." in converted
+
+
+def test_documents_spill_to_disk_and_expire(monkeypatch):
+    """Past the memory budget the oldest document goes to disk; unused documents expire."""
+    monkeypatch.setenv("MCP_PANDOC_DOCUMENT_MEMORY_MB", "0")
+    older, _ = register_document("# Older\n", "markdown")
+    newer, new = register_document("# Newer\n")
+
+    spilled = os.path.join(documents.cache_dir("documents"), f"{older.document_id}.markdown.txt")
+    assert new
+    assert os.path.exists(spilled)
+    reloaded = get_document(older.document_id)
+    assert (reloaded.contents, reloaded.input_format) == ("# Older\n", "markdown")
+    assert not os.path.exists(spilled)
+
+    monkeypatch.setenv("MCP_PANDOC_DOCUMENT_TTL_SECONDS", "60")
+    reloaded.last_used -= 120
+    get_document(newer.document_id)
+    with pytest.raises(ValueError, match="Unknown document_id: .* Register the document again"):
+        get_document(older.document_id)
+
+
+@pytest.mark.parametrize("suffix", [".markdown", ".markdown.txt", "0"])
+def test_only_whole_ids_find_a_spilled_document(monkeypatch, suffix):
+    """An id with anything after the hash is unknown, even when a spill file name starts with it."""
+    monkeypatch.setenv("MCP_PANDOC_DOCUMENT_MEMORY_MB", "0")
+    spilled, _ = register_document("# Spilled\n", "markdown")
+    register_document("# Newer\n")
+
+    with pytest.raises(ValueError, match="Unknown document_id"):
+        get_document(spilled.document_id + suffix)
+    assert get_document(spilled.document_id).contents == "# Spilled\n"
+
+
+@pytest.mark.asyncio
+async def test_handle_replaces_other_sources():
+    """document_id is one source among contents, contents_base64, resource and input_file."""
+    document_id = await _register(contents=REPORT)
+
+    with pytest.raises(ValueError, match="Only one source can be converted per call"):
+        await _converted(document_id=document_id, contents=REPORT)
+    with pytest.raises(ValueError, match="Exactly one of 'contents', 'contents_base64' or 'resource'"):
+        await handle_call_tool("register-document", {"contents": "# A", "contents_base64": "IyBB"})
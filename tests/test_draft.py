@@ -0,0 +1,98 @@
+"""Tests for draft PDFs built with a single TeX pass."""
+import json
+import os
+import shutil
+import sys
+
+import pytest
+from mcp_pandoc.server import handle_call_tool
+
+# Stands in for pdflatex: records each run and writes the PDF and log TeX would
+FAKE_ENGINE = """#!{python}
+import json, os, sys
+with open(sys.argv[-1], encoding="utf-8") as f:
+    tex = f.read()
+with open(os.environ["ENGINE_RUNS"], "a", encoding="utf-8") as f:
+    f.write(json.dumps({{"argv": sys.argv[1:], "tex": tex}}) + "\\n")
+with open("draft.log", "w") as f:
+    f.write(os.environ.get("ENGINE_LOG", "No errors.\\n"))
+if "ENGINE_NO_PDF" not in os.environ:
+    with open("draft.pdf", "wb") as f:
+        f.write(b"%PDF-1.5\\n% draft\\n")
+"""
+
+DOCUMENT = "---\ntitle: Layout\n---\n\n# One\n\n![Chart](https://example.com/chart.png){width=80%}\n\nText.\n"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Put a fake pdflatex first on PATH and return the file its runs are recorded in."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "pdflatex"
+    fake.write_text(FAKE_ENGINE.format(python=sys.executable), encoding="utf-8")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    runs = tmp_path / "runs.jsonl"
+    monkeypatch.setenv("ENGINE_RUNS", str(runs))
+    return runs
+
+
+def _runs(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+async def _draft(tmp_path, **arguments) -> str:
+    result = await handle_call_tool("convert-contents", {
+        "contents": DOCUMENT, "output_format": "pdf", "output_file": str(tmp_path / "layout.pdf"), "draft": True,
+        **arguments,
+    })
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_draft_runs_tex_once_on_a_placeholder_preamble(engine, tmp_path):
+    """One TeX pass over pandoc's LaTeX, with images replaced, pages capped and every page labeled."""
+    message = await _draft(tmp_path, draft_pages=2)
+
+    runs = _runs(engine)
+    assert len(runs) == 1
+    tex = runs[0]["tex"]
+    assert r"\renewcommand{\includegraphics}[2][]" in tex
+    assert r"\ifnum\value{page}>2\relax\DiscardShipoutBox\fi" in tex
+    assert "DRAFT: single pass, placeholder images" in tex
+    assert "-interaction=nonstopmode" in runs[0]["argv"]
+    assert (tmp_path / "layout.pdf").read_bytes().startswith(b"%PDF")
+    assert "Content successfully converted to a draft PDF and saved to:" in message
+    assert "Draft PDF: one pdflatex pass, images replaced by placeholders, first 2 pages only." in message
+
+
+@pytest.mark.asyncio
+async def test_tex_errors_are_reported_not_fatal(engine, tmp_path, monkeypatch):
+    """A PDF written despite TeX errors is kept; no PDF at all fails with TeX's first errors."""
+    monkeypatch.setenv("ENGINE_LOG", "./draft.tex:40: Undefined control sequence.\nl.40 \\foo\n")
+
+    assert "TeX reported 1 error; the draft was written anyway." in await _draft(tmp_path)
+
+    monkeypatch.setenv("ENGINE_NO_PDF", "1")
+    with pytest.raises(ValueError, match="produced no draft PDF: ./draft.tex:40: Undefined control sequence"):
+        await _draft(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_draft_options_need_pdf_output(tmp_path):
+    """draft is only for pdf, and draft_pages only with draft."""
+    with pytest.raises(ValueError, match="draft only applies to pdf output"):
+        await _draft(tmp_path, output_format="html")
+    with pytest.raises(ValueError, match="draft_pages needs draft"):
+        await _draft(tmp_path, draft=False, draft_pages=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not (shutil.which("pdflatex") or shutil.which("xelatex")), reason="needs pdflatex or xelatex")
+async def test_draft_with_real_tex(tmp_path):
+    """A real engine writes a PDF even though the image is a remote URL that is never fetched."""
+    message = await _draft(tmp_path, draft_pages=1)
+
+    assert (tmp_path / "layout.pdf").read_bytes().startswith(b"%PDF")
+    assert "Draft PDF: one" in message
@@ -0,0 +1,144 @@
+"""Tests for extract_media and the content-addressed media store."""
+import base64
+import os
+import struct
+import zlib
+
+import pypandoc
+import pytest
+from mcp_pandoc.media import hoist_data_uris, store_bytes
+from mcp_pandoc.server import handle_call_tool
+
+
+def _png(rgb):
+    """Return a valid 2x2 PNG filled with one colour."""
+    raw = b"".join(b"\x00" + bytes(rgb) * 2 for _ in range(2))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", 2, 2, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+@pytest.fixture
+def media_store(tmp_path, monkeypatch):
+    """Point the media store at a scratch directory."""
+    store = tmp_path / "store"
+    monkeypatch.setenv("MCP_PANDOC_MEDIA_DIR", str(store))
+    return store
+
+
+def _docx_with_image(tmp_path, name, rgb=(255, 0, 0)):
+    """Build a docx embedding one PNG, the way an inbound Word document would."""
+    image = tmp_path / f"{name}.png"
+    image.write_bytes(_png(rgb))
+    source = tmp_path / f"{name}.md"
+    source.write_text(f"# {name}\n\n![diagram]({image.name})\n", encoding="utf-8")
+    output = tmp_path / f"{name}.docx"
+    pypandoc.convert_file(str(source), "docx", outputfile=str(output), extra_args=[f"--resource-path={tmp_path}"])
+    return output
+
+
+def _stored_files(store):
+    return sorted(p for p in store.rglob("*") if p.is_file())
+
+
+@pytest.mark.asyncio
+async def test_docx_images_are_stored_once_and_referenced_by_stable_path(tmp_path, media_store):
+    """The same image in two documents lands in the store once, under one path."""
+    first = _docx_with_image(tmp_path, "first")
+    second = _docx_with_image(tmp_path, "second")
+
+    results = []
+    for document in (first, second):
+        result = await handle_call_tool(
+            "convert-contents",
+            {"input_file": str(document), "output_format": "markdown", "extract_media": True},
+        )
+        results.append(result[0].text)
+
+    stored = _stored_files(media_store)
+    assert len(stored) == 1
+    reference = str(stored[0]).replace(os.sep, "/")
+    assert all(reference in text for text in results)
+    assert "1 new, 0 already stored" in results[0]
+    assert "0 new, 1 already stored" in results[1]
+    assert "mcp-pandoc-media-" not in results[1], "scratch extraction paths must not leak"
+
+
+@pytest.mark.asyncio
+async def test_extract_media_rewrites_a_text_output_file(tmp_path, media_store):
+    """An html output file is re-pointed at the store as well as inline results."""
+    output = tmp_path / "out.html"
+
+    result = await handle_call_tool(
+        "convert-contents",
+        {
+            "input_file": str(_docx_with_image(tmp_path, "doc")),
+            "output_format": "html",
+            "output_file": str(output),
+            "extract_media": True,
+        },
+    )
+
+    reference = str(_stored_files(media_store)[0]).replace(os.sep, "/")
+    assert reference in output.read_text(encoding="utf-8")
+    assert "Extracted 1 media file(s)" in result[0].text
+
+
+@pytest.mark.asyncio
+async def test_data_uris_are_hoisted_out_of_inline_results(media_store):
+    """Base64 images kept inline by the reader are replaced with stored paths."""
+    payload = base64.b64encode(_png((0, 0, 255))).decode()
+
+    result = await handle_call_tool(
+        "convert-contents",
+        {
+            "contents": f'<p><img src="data:image/png;base64,{payload}" alt="dot"></p>',
+            "input_format": "html",
+            "output_format": "markdown",
+            "extract_media": True,
+        },
+    )
+
+    assert payload not in result[0].text
+    assert str(_stored_files(media_store)[0]).replace(os.sep, "/") in result[0].text
+
+
+@pytest.mark.asyncio
+async def test_extract_media_is_rejected_for_binary_output(tmp_path, media_store):
+    """Binary outputs have no text to rewrite, so the option is refused up front."""
+    with pytest.raises(ValueError) as excinfo:
+        await handle_call_tool(
+            "convert-contents",
+            {
+                "contents": "# Test",
+                "output_format": "docx",
+                "output_file": str(tmp_path / "out.docx"),
+                "extract_media": True,
+            },
+        )
+
+    assert "extract_media is not supported for 'docx'" in str(excinfo.value)
+
+
+def test_store_is_content_addressed(media_store):
+    """Identical bytes map to one path; different bytes never collide."""
+    first, created_first = store_bytes(b"same", ".png")
+    again, created_again = store_bytes(b"same", ".PNG")
+    other, _ = store_bytes(b"different", ".png")
+
+    assert first == again
+    assert (created_first, created_again) == (True, False)
+    assert other != first
+
+
+def test_invalid_base64_is_left_untouched(media_store):
+    """A malformed data URI is not guessed at."""
+    text = "![x](data:image/png;base64,abc)"
+
+    rewritten, report = hoist_data_uris(text)
+
+    assert rewritten == text
+    assert report.stored == []
@@ -0,0 +1,132 @@
+"""Tests for running Python filters through the forkserver."""
+import os
+import sys
+
+import pytest
+from mcp_pandoc import forkserver
+from mcp_pandoc.forkserver import filter_command, python_interpreter
+from mcp_pandoc.runner import JOB_HISTORY, ResourceLimitError, ResourceLimits, run_pandoc
+from mcp_pandoc.server import handle_call_tool
+
+pytestmark = pytest.mark.skipif(os.name != "posix" or not hasattr(os, "fork"), reason="needs fork and Unix sockets")
+
+# Records whether panflute was imported before the script ran, and the CPU limit it runs under
+SHOUT = """#!{python}
+import os, resource, sys
+with open(os.environ["FILTER_REPORT"], "a") as report:
+    report.write(f"{{'panflute' in sys.modules}} {{resource.getrlimit(resource.RLIMIT_CPU)[0]}}\\n")
+
+import panflute as pf
+
+def shout(elem, doc):
+    if isinstance(elem, pf.Str):
+        return pf.Str(elem.text.upper())
+
+if __name__ == "__main__":
+    pf.run_filter(shout)
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_forkservers(monkeypatch):
+    """Start each test with the forkserver on but not yet started, and stop the ones it started."""
+    monkeypatch.setenv("MCP_PANDOC_FILTER_FORKSERVER", "on")
+    forkserver.shutdown()
+    yield
+    forkserver.shutdown()
+
+
+@pytest.fixture
+def shout(tmp_path, monkeypatch):
+    """A panflute filter that upper-cases text and reports how it was run."""
+    pytest.importorskip("panflute")
+    report = tmp_path / "report.txt"
+    monkeypatch.setenv("FILTER_REPORT", str(report))
+    path = tmp_path / "shout.py"
+    path.write_text(SHOUT.format(python=sys.executable), encoding="utf-8")
+    path.chmod(0o755)
+    return path, report
+
+
+def _write_filter(tmp_path, first_line: str):
+    path = tmp_path / "filter.py"
+    path.write_text(f"{first_line}\nimport sys\nsys.stdout.write(sys.stdin.read())\n", encoding="utf-8")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_forkserver_is_off_unless_enabled(tmp_path, monkeypatch):
+    """Without the setting every filter runs directly."""
+    monkeypatch.delenv("MCP_PANDOC_FILTER_FORKSERVER")
+    path = _write_filter(tmp_path, f"#!{sys.executable}")
+
+    assert not forkserver.forkserver_enabled()
+    assert filter_command(path) == path
+
+
+def test_only_plain_python_filters_are_shimmed(tmp_path):
+    """The #! line decides: a bare Python interpreter is shimmed, anything else runs as it is."""
+    assert python_interpreter(_write_filter(tmp_path, f"#!{sys.executable}")) == sys.executable
+    for first_line in ("#!/usr/bin/env -S python3 -u", "#!/bin/sh", "# no interpreter line"):
+        path = _write_filter(tmp_path, first_line)
+        assert python_interpreter(path) is None
+        assert filter_command(path) == path
+
+
+@pytest.mark.asyncio
+async def test_filter_runs_in_the_forkserver_with_the_same_output(shout, monkeypatch):
+    """A shimmed filter sees panflute already imported, keeps the job's limits and writes the same output."""
+    path, report = shout
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_CPU_SECONDS", "30")
+    arguments = {"contents": "Hello *there*", "output_format": "html", "filters": [str(path)]}
+
+    forked = await handle_call_tool("convert-contents", arguments)
+    monkeypatch.setenv("MCP_PANDOC_FILTER_FORKSERVER", "off")
+    direct = await handle_call_tool("convert-contents", arguments)
+
+    assert "HELLO <em>THERE</em>" in forked[0].text
+    assert forked[0].text == direct[0].text
+    assert report.read_text().splitlines() == ["True 30", "False 30"]
+
+
+def test_filter_failures_keep_their_exit_status(tmp_path):
+    """A filter's stderr and exit status reach pandoc as if it ran on its own."""
+    path = tmp_path / "broken.py"
+    path.write_text(f"#!{sys.executable}\nimport sys\nsys.stderr.write('bad input')\nsys.exit(3)\n")
+    path.chmod(0o755)
+
+    shim = filter_command(str(path))
+
+    assert shim != str(path)
+    with pytest.raises(RuntimeError, match="bad input") as failure:
+        run_pandoc("html", source="# A", input_format="markdown", extra_args=["--filter", shim])
+    assert "3" in str(failure.value)
+    assert shim not in str(failure.value) and str(path) in str(failure.value)
+
+
+def test_filter_stopped_by_a_limit_is_reported_and_counted(tmp_path):
+    """A forked filter that runs out of CPU time fails the job with the CPU limit, and its time is the job's."""
+    path = tmp_path / "spin.py"
+    path.write_text(f"#!{sys.executable}\nwhile True:\n    pass\n")
+    path.chmod(0o755)
+
+    with pytest.raises(ResourceLimitError) as failure:
+        run_pandoc("html", source="# A", input_format="markdown", extra_args=["--filter", filter_command(str(path))],
+                   limits=ResourceLimits(cpu_seconds=1))
+
+    assert failure.value.limit == "cpu"
+    assert JOB_HISTORY[-1].cpu_seconds >= 0.9
+
+
+def test_shim_runs_the_filter_itself_without_a_forkserver(shout):
+    """If the forkserver is gone the shim falls back to running the script."""
+    path, report = shout
+    shim = filter_command(str(path))
+    for server in forkserver._servers.values():
+        server.stop()
+
+    output = run_pandoc("html", source="Hi", input_format="markdown", extra_args=["--filter", shim])
+
+    assert output.strip() == "<p>HI</p>"
+    assert report.read_text().startswith("False")
+    assert os.path.basename(shim) == "shout.py"
@@ -0,0 +1,80 @@
+"""Tests for downscaling and recompressing images in docx, pptx and epub outputs."""
+import io
+import zipfile
+
+import pytest
+from mcp_pandoc.server import handle_call_tool
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep optimized images inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def photo(tmp_path):
+    """A noisy 1600x1200 JPEG saved at high quality, like a camera photo."""
+    path = tmp_path / "photo.jpg"
+    Image.effect_noise((1600, 1200), 30).convert("RGB").save(path, quality=95)
+    return path
+
+
+def _media(path) -> dict[str, bytes]:
+    with zipfile.ZipFile(path) as package:
+        return {name: package.read(name) for name in package.namelist() if name.endswith((".jpg", ".png"))}
+
+
+async def _convert(tmp_path, source, output_format, **arguments) -> str:
+    result = await handle_call_tool("convert-contents", {
+        "contents": source, "output_format": output_format, "output_file": str(tmp_path / f"out.{output_format}"),
+        **arguments,
+    })
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_docx_images_are_scaled_to_the_dpi_they_are_shown_at(tmp_path, photo):
+    """A photo shown 2 inches wide at 96 dpi keeps about 192 pixels, and a rebuild reuses the cached result."""
+    source = f"![Photo]({photo}){{width=2in}}\n"
+
+    message = await _convert(tmp_path, source, "docx", image_dpi=96)
+
+    (image,) = _media(tmp_path / "out.docx").values()
+    assert Image.open(io.BytesIO(image)).size == (192, 144)
+    assert "Images: 1 of 1 made smaller (0 from the cache)" in message
+    assert " saved." in message
+
+    again = await _convert(tmp_path, source, "docx", image_dpi=96)
+    assert "Images: 1 of 1 made smaller (1 from the cache)" in again
+    assert "Output file unchanged" in again
+
+
+@pytest.mark.asyncio
+async def test_epub_keeps_its_layout_and_small_images(tmp_path, photo):
+    """In an epub the cap applies to the longer edge; the mimetype stays first and an image that cannot shrink is kept."""
+    icon = tmp_path / "icon.png"
+    Image.new("RGB", (8, 8), "red").save(icon, optimize=True)
+    icon_bytes = icon.read_bytes()
+
+    message = await _convert(tmp_path, f"# Photos\n\n![Photo]({photo})\n\n![Icon]({icon})\n", "epub",
+                             image_max_pixels=400)
+
+    with zipfile.ZipFile(tmp_path / "out.epub") as package:
+        first = package.infolist()[0]
+        assert (first.filename, first.compress_type) == ("mimetype", zipfile.ZIP_STORED)
+    sizes = sorted(Image.open(io.BytesIO(data)).size for data in _media(tmp_path / "out.epub").values())
+    assert sizes == [(8, 8), (400, 300)]
+    assert icon_bytes in _media(tmp_path / "out.epub").values()
+    assert "Images: 1 of 2 made smaller" in message
+
+
+@pytest.mark.asyncio
+async def test_image_options_need_a_package_output(tmp_path):
+    """Only docx, pptx and epub carry images to optimize, and only docx and pptx know their display size."""
+    with pytest.raises(ValueError, match="only apply to docx, pptx and epub output"):
+        await _convert(tmp_path, "# A", "html", image_max_pixels=800)
+    with pytest.raises(ValueError, match="image_dpi needs docx or pptx output"):
+        await _convert(tmp_path, "# A", "epub", image_dpi=150)
@@ -0,0 +1,142 @@
+"""Tests for incremental rendering of markdown sections."""
+import pytest
+from mcp_pandoc.incremental import cross_block_reason, render_incremental, split_sections
+from mcp_pandoc.runner import run_pandoc
+from mcp_pandoc.server import handle_call_tool
+
+GUIDE = """Intro paragraph with *emphasis*.
+
+# Install
+
+Run the installer:
+
+```bash
+pip install example
+```
+
+## Options
+
+- `--fast`: skip checks
+- `--quiet`: say less
+
+# Usage
+
+```python
+# Not a heading, inside a fence
+print("hello")
+```
+
+::: note
+# Inside a div
+
+Divs are kept whole.
+:::
+
+    indented code
+
+| Column | Value |
+|--------|-------|
+| a      | 1     |
+
+# Troubleshooting
+
+See the [issue tracker](https://example.com/issues).
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep any on-disk caches inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def test_sections_split_at_headings_outside_fences():
+    """Headings in code fences and fenced divs do not start a section."""
+    sections = split_sections(GUIDE)
+
+    assert [section.splitlines()[0] for section in sections] == [
+        "Intro paragraph with *emphasis*.", "# Install", "## Options", "# Usage", "# Troubleshooting",
+    ]
+    assert "".join(sections) == GUIDE
+
+
+@pytest.mark.parametrize("to", ["html", "markdown"])
+def test_output_is_identical_to_a_full_conversion(to):
+    """Cached and freshly rendered sections join to exactly what pandoc writes for the whole document."""
+    edited = GUIDE.replace("say less", "say much less")
+
+    first, first_report = render_incremental(GUIDE, to)
+    second, second_report = render_incremental(edited, to)
+
+    assert first == run_pandoc(to, source=GUIDE, input_format="markdown")
+    assert second == run_pandoc(to, source=edited, input_format="markdown")
+    assert second_report.summary() == "Incremental: 1 of 5 sections rendered, the rest from the cache."
+    assert first_report.fallback_reason is None
+
+
+def test_code_block_ids_follow_the_whole_document():
+    """Highlighted code blocks keep the numbering a full conversion gives them after an earlier section changes."""
+    document = "".join(f"# Part {i}\n\n```python\nx = {i}\n```\n\n    plain {i}\n\n" for i in range(4))
+    render_incremental(document, "html")
+    edited = document.replace("x = 1", "x = 10")
+
+    output, report = render_incremental(edited, "html")
+
+    assert report.rendered == 1
+    assert 'id="cb7"' in output
+    assert output == run_pandoc("html", source=edited, input_format="markdown")
+
+
+@pytest.mark.parametrize(
+    ("text", "reason"),
+    [
+        ("---\ntitle: Notes\n---\n\n# A\n", "it starts with a metadata block"),
+        ("% Notes\n\n# A\n", "it starts with a metadata block"),
+        ("# A\n\nSee [the docs][docs].\n\n# B\n\n[docs]: https://example.com\n", "reference links or footnotes"),
+        ("# A\n\nA claim.[^1]\n\n# B\n\n[^1]: A source.\n", "reference links or footnotes"),
+        ("# A\n\nA claim.^[A source.]\n", "inline footnotes"),
+        ("# A\n\n(@first) One.\n\n# B\n\n(@second) Two.\n", "example lists"),
+        ("<div>\n\n# A\n\n</div>\n", "raw HTML blocks"),
+        ("# Notes\n\n# Notes\n", "share an identifier"),
+        ("# Setup\n\nText.\n\n# Use\n\nFollow [Setup] first.\n", "links to headings by their titles"),
+    ],
+)
+def test_cross_section_constructs_fall_back(text, reason):
+    """Anything that makes one section's output depend on another is converted in full."""
+    assert reason in cross_block_reason(text)
+
+    output, report = render_incremental(text, "html")
+
+    assert output == run_pandoc("html", source=text, input_format="markdown")
+    assert report.summary().startswith("Incremental: converted in full because")
+
+
+@pytest.mark.asyncio
+async def test_tool_writes_the_same_file(tmp_path):
+    """convert-contents with incremental writes what a full conversion writes, and reports the sections."""
+    source = tmp_path / "guide.md"
+    source.write_text(GUIDE, encoding="utf-8")
+    full, incremental = tmp_path / "full.html", tmp_path / "incremental.html"
+    target = {"input_file": str(source), "output_format": "html"}
+
+    await handle_call_tool("convert-contents", {**target, "output_file": str(full)})
+    result = await handle_call_tool("convert-contents", {**target, "output_file": str(incremental), "incremental": True})
+
+    assert "Incremental: " in result[0].text
+    assert incremental.read_text(encoding="utf-8") == full.read_text(encoding="utf-8")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        {"contents": "# A", "output_format": "latex"},
+        {"contents": "<p>A</p>", "input_format": "html", "output_format": "html"},
+        {"contents": "# A", "output_format": "html", "filters": ["f.lua"]},
+        {"contents": "# A", "output_format": "html", "chunk_max_bytes": 4096},
+    ],
+)
+async def test_tool_rejects_other_conversions(arguments):
+    """incremental is only accepted where section outputs can be joined."""
+    with pytest.raises(ValueError, match="incremental only applies to markdown converted to html or markdown"):
+        await handle_call_tool("convert-contents", {**arguments, "incremental": True})
@@ -0,0 +1,97 @@
+"""Tests for the MCP load generator."""
+import json
+import sys
+
+import pytest
+from mcp_pandoc.loadgen import LoadGenerator, Scenario, build_mix, load_mix, main, percentile, sample_document
+
+
+def test_percentiles_interpolate_between_ranks():
+    """p50 of an even count falls between the middle values; p100 is the maximum."""
+    values = [0.4, 0.1, 0.3, 0.2]
+
+    assert percentile(values, 50) == pytest.approx(0.25)
+    assert percentile(values, 100) == 0.4
+    assert percentile([0.7], 99) == 0.7
+    assert percentile([], 50) is None
+
+
+def test_mix_weights_follow_the_shares():
+    """PDF and filtered calls get their shares; the rest is split evenly."""
+    mix = build_mix(["html", "docx"], [1, 8], pdf_share=0.2, filters=["/f.py"], filter_share=0.5)
+
+    weights = {(s.output_format, s.size_kb, bool(s.filters)): s.weight for s in mix}
+    assert sum(weights.values()) == pytest.approx(1.0)
+    assert weights[("pdf", 8, True)] == pytest.approx(0.2 / 2 * 0.5)
+    assert weights[("html", 1, False)] == pytest.approx(0.8 / 2 / 2 * 0.5)
+    assert all(s.filters for s in build_mix(["html"], [4], filters=["/f.py"], filter_share=1.0))
+
+
+def test_mix_file_is_validated(tmp_path):
+    """Unknown keys in a mix file are reported, not ignored."""
+    path = tmp_path / "mix.json"
+    path.write_text(json.dumps([{"output_format": "html", "size_kb": 2, "colour": "red"}]))
+
+    with pytest.raises(ValueError, match="Invalid scenario"):
+        load_mix(str(path))
+
+
+def test_sample_documents_reach_the_requested_size():
+    """Generated documents are at least as large as asked, and stable for a seed."""
+    document = sample_document(16, seed=3)
+
+    assert 16 * 1024 <= len(document) < 18 * 1024
+    assert document == sample_document(16, seed=3)
+    assert "| Key | Value |" in document
+
+
+@pytest.mark.asyncio
+async def test_fixed_concurrency_across_sessions(tmp_path):
+    """Calls are spread over several real server processes and all succeed."""
+    generator = LoadGenerator(
+        [Scenario("html", 2, weight=3), Scenario("docx", 2, weight=1)],
+        sessions=2,
+        concurrency=3,
+        requests=8,
+        sample_interval=0.05,
+    )
+
+    report = await generator.run()
+
+    assert report["calls"] == 8
+    assert report["errors"] == 0
+    assert {result.session for result in generator.results} == {0, 1}
+    assert report["p50_seconds"] <= report["p95_seconds"] <= report["p99_seconds"] <= report["max_seconds"]
+    assert sum(stats["calls"] for stats in report["scenarios"].values()) == 8
+    if sys.platform.startswith("linux"):
+        assert len(generator.server_pids) == 2
+        assert report["server_rss_bytes"]["peak"] > 0
+
+
+@pytest.mark.asyncio
+async def test_fixed_rate_counts_errors():
+    """At a fixed rate every call is sent, and failed calls count towards the error rate."""
+    generator = LoadGenerator(
+        [Scenario("html", 1, input_format="markdown"), Scenario("html", 1, filters=["/nonexistent/filter.py"])],
+        rate=20,
+        requests=6,
+    )
+
+    report = await generator.run()
+
+    assert report["calls"] == 6
+    assert report["config"]["mode"] == "fixed rate"
+    assert 0 < report["errors"] < 6
+    assert report["error_rate"] == report["errors"] / 6
+    assert "Filter not found" in report["top_errors"][0][0]
+
+
+def test_command_line_writes_a_json_report(tmp_path, capsys):
+    """The CLI prints the summary, writes the JSON report and exits 0 without errors."""
+    output = tmp_path / "report.json"
+
+    status = main(["--requests", "3", "--concurrency", "2", "--sizes", "1", "--json", str(output)])
+
+    assert status == 0
+    assert "Calls: 3 in" in capsys.readouterr().out
+    assert json.loads(output.read_text())["calls"] == 3
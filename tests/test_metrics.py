@@ -0,0 +1,125 @@
+"""Tests for the Prometheus and OpenMetrics exposition."""
+import re
+import urllib.request
+
+import mcp.types as types
+import pytest
+from mcp_pandoc.metrics import Counter, Histogram, render, start_metrics_server
+from mcp_pandoc.server import call_tool
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep the cache whose size is exported inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+async def _convert(arguments):
+    return await call_tool(None, types.CallToolRequestParams(name="convert-contents", arguments=arguments))
+
+
+def _sample(text, name, **labels):
+    """Return the value of one sample line, or None if it is absent."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = rf"^{re.escape(name)}{re.escape('{' + label_text + '}') if labels else ''} (\S+)$"
+    match = re.search(pattern, text, flags=re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    """An observation on a bound lands in that bucket, and later buckets include it."""
+    histogram = Histogram("test_latency_seconds", "Test latency.", ("op",), buckets=(1.0, 5.0), registry=[])
+    histogram.observe(1.0, op="a")
+    histogram.observe(3.0, op="a")
+    histogram.observe(10.0, op="a")
+
+    lines = histogram.samples(openmetrics=False)
+
+    assert 'test_latency_seconds_bucket{op="a",le="1.0"} 1' in lines
+    assert 'test_latency_seconds_bucket{op="a",le="5.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{op="a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_sum{op="a"} 14' in lines
+    assert 'test_latency_seconds_count{op="a"} 3' in lines
+
+
+def test_counter_naming_follows_each_format():
+    """Prometheus names the family with _total; OpenMetrics names it without and ends with # EOF."""
+    counter = Counter("test_failures", "Test failures.", ("kind",), registry=[])
+    counter.inc(kind='quote " and \\ slash')
+
+    assert counter.header(openmetrics=False)[1] == "# TYPE test_failures_total counter"
+    assert counter.header(openmetrics=True)[1] == "# TYPE test_failures counter"
+    assert counter.samples(openmetrics=True) == ['test_failures_total{kind="quote \\" and \\\\ slash"} 1']
+    assert render(openmetrics=True).endswith("# EOF\n")
+
+
+@pytest.mark.asyncio
+async def test_conversions_record_latency_by_format_and_phase():
+    """Each phase of a conversion is observed under its input and output format."""
+    before = render()
+    await _convert({"contents": "Hi\n==\n", "input_format": "rst", "output_format": "html"})
+    after = render()
+
+    for phase in ("prepare", "pandoc", "finish", "total"):
+        labels = {"input_format": "rst", "output_format": "html", "phase": phase}
+        count = _sample(after, "mcp_pandoc_conversion_duration_seconds_count", **labels)
+        assert count == (_sample(before, "mcp_pandoc_conversion_duration_seconds_count", **labels) or 0) + 1
+    assert _sample(after, "mcp_pandoc_child_peak_rss_bytes") > 0
+    assert _sample(after, "mcp_pandoc_calls_in_flight") == 0
+    assert _sample(after, "mcp_pandoc_jobs_running") == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_counted_by_their_classification(monkeypatch):
+    """The counter uses the same error class the client sees."""
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_HEAP_MB", "32")
+    kind = {"kind": "Resource limit exceeded during conversion"}
+    before = _sample(render(), "mcp_pandoc_conversion_errors_total", **kind) or 0
+
+    result = await _convert({"contents": "word " * 20000, "output_format": "html"})
+
+    assert result.is_error is True
+    assert _sample(render(), "mcp_pandoc_conversion_errors_total", **kind) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_textfile_is_rewritten_after_each_call(tmp_path, monkeypatch):
+    """The textfile collector file appears after a call and holds a complete exposition."""
+    textfile = tmp_path / "mcp_pandoc.prom"
+    monkeypatch.setenv("MCP_PANDOC_METRICS_TEXTFILE", str(textfile))
+
+    await _convert({"contents": "# Hi", "output_format": "html"})
+
+    text = textfile.read_text(encoding="utf-8")
+    assert "# TYPE mcp_pandoc_conversion_duration_seconds histogram" in text
+    assert _sample(text, "mcp_pandoc_cache_bytes", cache="media") is not None
+    assert not [path for path in tmp_path.iterdir() if path.name.startswith(".mcp-pandoc-metrics-")]
+
+
+def test_http_listener_negotiates_the_format(monkeypatch):
+    """Scrapers asking for OpenMetrics get it; others get the Prometheus text format."""
+    monkeypatch.setenv("MCP_PANDOC_METRICS_PORT", "0")
+    httpd = start_metrics_server()
+    url = f"http://127.0.0.1:{httpd.server_port}/metrics"
+    try:
+        with urllib.request.urlopen(url) as response:
+            plain = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        request = urllib.request.Request(url, headers={"Accept": "application/openmetrics-text; version=1.0.0"})
+        with urllib.request.urlopen(request) as response:
+            openmetrics = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert "# TYPE mcp_pandoc_warmup_ready gauge" in plain
+    assert not plain.endswith("# EOF\n")
+    assert openmetrics.endswith("# EOF\n")
+
+
+def test_metrics_are_off_by_default(monkeypatch):
+    """Without a port there is no listener."""
+    monkeypatch.delenv("MCP_PANDOC_METRICS_PORT", raising=False)
+
+    assert start_metrics_server() is None
@@ -0,0 +1,142 @@
+"""Tests for trimming notebook outputs before conversion."""
+import base64
+import json
+
+import pytest
+from mcp_pandoc.notebooks import NotebookTrim, trim_notebook
+from mcp_pandoc.server import handle_call_tool
+
+PLOT = base64.b64encode(bytes(range(256)) * 400).decode("ascii")
+
+
+def _notebook(plots=1):
+    """A notebook with prose, a chatty stream, plots and a long HTML table."""
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Analysis\n", "\n", "Loading the data."]}]
+    for index in range(plots):
+        cells.append({
+            "cell_type": "code",
+            "execution_count": index + 1,
+            "metadata": {"execution": {"iopub.execute_input": "2026-01-01T00:00:00Z"}, "tags": ["keep"]},
+            "source": [f"plot({index})"],
+            "outputs": [
+                {"output_type": "stream", "name": "stdout", "text": [f"epoch {n}\n" for n in range(100)]},
+                {"output_type": "display_data", "metadata": {}, "data": {"image/png": PLOT, "text/plain": "<Figure>"}},
+                {
+                    "output_type": "execute_result",
+                    "execution_count": index + 1,
+                    "metadata": {},
+                    "data": {"text/html": "<table>" + "<tr><td>row</td></tr>" * 500 + "</table>"},
+                },
+            ],
+        })
+    return {
+        "cells": cells,
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+
+def test_outputs_are_trimmed_by_type_size_and_lines():
+    """Images go, long text is cut, streams keep their tail, and execution metadata is dropped."""
+    trim = NotebookTrim(
+        drop_outputs=("image/*",), max_output_bytes=200, stream_tail_lines=3, strip_metadata=True
+    )
+
+    trimmed, report = trim_notebook(json.dumps(_notebook()), trim)
+
+    cell = json.loads(trimmed)["cells"][1]
+    stream, display, result = cell["outputs"]
+    assert stream["text"] == "[... 97 lines omitted]\nepoch 97\nepoch 98\nepoch 99\n"
+    assert display["data"] == {"text/plain": "<Figure>"}
+    assert result["data"]["text/html"].endswith("bytes truncated]\n")
+    assert len(result["data"]["text/html"].encode("utf-8")) < 300
+    assert cell["execution_count"] is None and cell["metadata"] == {"tags": ["keep"]}
+    assert result["output_type"] == "display_data" and "execution_count" not in result
+    assert report.outputs_truncated == 2 and report.outputs_dropped == 0
+    assert report.bytes_after < report.bytes_before / 20
+
+
+def test_wildcard_drops_every_output():
+    """'*' keeps the code and prose only."""
+    trimmed, report = trim_notebook(json.dumps(_notebook(plots=2)), NotebookTrim(drop_outputs=("*",)))
+
+    assert all(cell.get("outputs", []) == [] for cell in json.loads(trimmed)["cells"])
+    assert report.outputs_dropped == 6
+
+
+def test_binary_output_over_the_size_limit_is_dropped_whole():
+    """A cut image is useless, so it goes, while the output's text form stays."""
+    trimmed, _ = trim_notebook(json.dumps(_notebook()), NotebookTrim(max_output_bytes=1000))
+
+    display = json.loads(trimmed)["cells"][1]["outputs"][1]
+    assert display["data"] == {"text/plain": "<Figure>"}
+
+
+def test_streams_and_errors_are_trimmed_and_dropped_by_their_jupyter_types():
+    """Tracebacks keep their last lines, and stderr and errors can be dropped by MIME type like any output."""
+    notebook = _notebook()
+    notebook["cells"][1]["outputs"] += [
+        {"output_type": "stream", "name": "stderr", "text": "warning: slow\n"},
+        {
+            "output_type": "error", "ename": "KeyError", "evalue": "'x'",
+            "traceback": [f"frame {n}\n  line" for n in range(50)] + ["KeyError: 'x'"],
+        },
+    ]
+
+    trimmed, report = trim_notebook(json.dumps(notebook), NotebookTrim(stream_tail_lines=3))
+    error = json.loads(trimmed)["cells"][1]["outputs"][-1]
+    assert error["traceback"] == ["[... 98 lines omitted]", "frame 49", "  line", "KeyError: 'x'"]
+    assert report.outputs_truncated == 2
+
+    drop = NotebookTrim(drop_outputs=("application/vnd.jupyter.stderr", "application/vnd.jupyter.error"))
+    trimmed, report = trim_notebook(json.dumps(notebook), drop)
+    outputs = json.loads(trimmed)["cells"][1]["outputs"]
+    assert [output.get("name") or output["output_type"] for output in outputs] == [
+        "stdout", "display_data", "execute_result",
+    ]
+    assert report.outputs_dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_notebook_file_is_converted_without_its_outputs(tmp_path):
+    """The tool trims a notebook file before pandoc reads it and reports the reduction."""
+    source = tmp_path / "analysis.ipynb"
+    source.write_text(json.dumps(_notebook(plots=3)), encoding="utf-8")
+    output = tmp_path / "analysis.md"
+
+    result = await handle_call_tool("convert-contents", {
+        "input_file": str(source),
+        "output_format": "markdown",
+        "output_file": str(output),
+        "notebook_drop_outputs": ["image/*", "text/html"],
+        "notebook_stream_tail_lines": 2,
+    })
+
+    text = result[0].text
+    assert text.startswith(f"File successfully converted and saved to: {output}")
+    assert "Notebook trimmed from" in text and "(3 outputs dropped, 3 truncated)" in text
+    converted = output.read_text(encoding="utf-8")
+    assert "# Analysis" in converted and "plot(2)" in converted and "epoch 99" in converted
+    assert "epoch 50" not in converted and "<table>" not in converted and "image/png" not in converted
+
+
+@pytest.mark.asyncio
+async def test_trimmed_output_is_smaller_than_untrimmed(tmp_path):
+    """Dropping plots shrinks what pandoc has to write."""
+    source = tmp_path / "plots.ipynb"
+    source.write_text(json.dumps(_notebook(plots=5)), encoding="utf-8")
+    arguments = {"input_file": str(source), "output_format": "ipynb"}
+
+    full = (await handle_call_tool("convert-contents", arguments))[0].text
+    trimmed = (await handle_call_tool("convert-contents", {**arguments, "notebook_drop_outputs": ["image/*"]}))[0].text
+
+    assert "image/png" in full and "image/png" not in trimmed
+    assert len(trimmed) < len(full) / 5
+
+
+@pytest.mark.asyncio
+async def test_notebook_options_need_notebook_input(tmp_path):
+    """The options are rejected for other inputs rather than silently ignored."""
+    with pytest.raises(ValueError, match="notebook_\\* options only apply to ipynb input"):
+        await handle_call_tool("convert-contents", {"contents": "# Hi", "notebook_strip_metadata": True})
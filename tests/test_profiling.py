@@ -0,0 +1,98 @@
+"""Tests for opt-in per-call profiling."""
+import json
+import os
+
+import mcp.types as types
+import pytest
+from mcp_pandoc.profiling import META_KEY
+from mcp_pandoc.server import call_tool
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    """Collect bundles in the test's scratch directory, with clients allowed to ask for a profile."""
+    directory = tmp_path / "profiles"
+    monkeypatch.setenv("MCP_PANDOC_PROFILE_DIR", str(directory))
+    monkeypatch.setenv("MCP_PANDOC_PROFILE", "request")
+    return directory
+
+
+async def _convert(arguments, meta=None):
+    params = types.CallToolRequestParams.model_validate(
+        {"name": "convert-contents", "arguments": arguments, **({"_meta": meta} if meta else {})}
+    )
+    return await call_tool(None, params)
+
+
+@pytest.mark.asyncio
+async def test_meta_flag_writes_a_complete_bundle(profile_dir):
+    """One flagged call yields the Python profile, memory report and pandoc statistics."""
+    contents = "# Title\n\n" + "A long paragraph. " * 50
+    result = await _convert({"contents": contents, "output_format": "html"}, meta={META_KEY: True})
+
+    bundle = result.meta[META_KEY]
+    assert os.path.dirname(bundle) == str(profile_dir)
+    assert sorted(os.listdir(bundle)) == ["call.json", "memory.txt", "pandoc-1.log", "profile.pstats", "profile.txt"]
+
+    call = json.loads(open(os.path.join(bundle, "call.json"), encoding="utf-8").read())
+    assert call["tool"] == "convert-contents"
+    assert call["outcome"] == "ok"
+    assert call["arguments"]["contents"] == f"<{len(contents)} characters>"
+    assert call["pandoc_jobs"] == 1
+
+    log = open(os.path.join(bundle, "pandoc-1.log"), encoding="utf-8").read()
+    assert "+RTS -s -RTS --verbose" in log
+    assert "bytes allocated in the heap" in log
+    assert "handle_call_tool" in open(os.path.join(bundle, "profile.txt"), encoding="utf-8").read()
+    assert "Peak traced memory" in open(os.path.join(bundle, "memory.txt"), encoding="utf-8").read()
+    assert "Converted Contents" in result.content[0].text
+
+
+@pytest.mark.asyncio
+async def test_unflagged_calls_are_not_profiled(profile_dir):
+    """Without the flag or the server setting nothing is written."""
+    result = await _convert({"contents": "# Hi", "output_format": "html"})
+
+    assert result.meta is None
+    assert not profile_dir.exists()
+
+
+@pytest.mark.asyncio
+async def test_failed_calls_are_profiled_too(profile_dir, monkeypatch):
+    """A failing call still leaves a bundle, which records the error."""
+    monkeypatch.setenv("MCP_PANDOC_PROFILE", "all")
+
+    result = await _convert({"input_file": "/nonexistent/in.md", "output_format": "html"})
+
+    assert result.is_error is True
+    call = json.loads(open(os.path.join(result.meta[META_KEY], "call.json"), encoding="utf-8").read())
+    assert call["outcome"].startswith("ValueError: ")
+
+
+@pytest.mark.asyncio
+async def test_retention_keeps_only_the_newest_bundles(profile_dir, monkeypatch):
+    """The cap makes it safe to leave profiling on."""
+    monkeypatch.setenv("MCP_PANDOC_PROFILE", "all")
+    monkeypatch.setenv("MCP_PANDOC_PROFILE_KEEP", "2")
+
+    bundles = []
+    for index in range(4):
+        result = await _convert({"contents": f"# Doc {index}", "output_format": "html"})
+        bundles.append(os.path.basename(result.meta[META_KEY]))
+
+    assert sorted(os.listdir(profile_dir)) == sorted(bundles[-2:])
+
+
+@pytest.mark.asyncio
+async def test_server_setting_can_refuse_the_flag(profile_dir, monkeypatch):
+    """Clients asking for a profile are ignored unless the operator allows it, which is the default."""
+    for setting in ("off", None):
+        if setting:
+            monkeypatch.setenv("MCP_PANDOC_PROFILE", setting)
+        else:
+            monkeypatch.delenv("MCP_PANDOC_PROFILE")
+
+        result = await _convert({"contents": "# Hi", "output_format": "html"}, meta={META_KEY: True})
+
+        assert result.meta is None
+    assert not profile_dir.exists()
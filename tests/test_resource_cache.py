@@ -0,0 +1,149 @@
+"""Tests for the fetch cache used by self-contained html builds.
+
+A local HTTP server stands in for the CDN so the tests can count requests and then go
+"offline" by shutting it down.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import yaml
+from mcp_pandoc.resources import cached_path, fetch, localize_contents
+from mcp_pandoc.server import handle_call_tool
+
+STYLESHEET = b"body { color: rebeccapurple; }\n"
+
+# A stylesheet whose references resolve against its own URL.
+SKIN = (
+    b'@import "base.css";\n'
+    b"body { background: url(img/bg.png); }\n"
+    b".a { background: url('../shared/a.png'); }\n"
+    b'.b { background: url("/root.png"); }\n'
+    b".c { background: url(https://fonts.example/f.woff2); }\n"
+    b".d { background: url(data:image/png;base64,AAAA); fill: url(#grad); }\n"
+)
+
+FILES = {"/theme.css": STYLESHEET, "/skin/site.css": SKIN}
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    """Serve one stylesheet and count how often it is requested."""
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path not in FILES:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/css")
+        self.send_header("Content-Length", str(len(FILES[self.path])))
+        self.end_headers()
+        self.wfile.write(FILES[self.path])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cdn():
+    """Run the stand-in CDN on an ephemeral port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CountingHandler)
+    server.hits = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def resource_dir(tmp_path, monkeypatch):
+    """Keep the cache inside the test's scratch directory."""
+    directory = tmp_path / "resources"
+    monkeypatch.setenv("MCP_PANDOC_RESOURCE_DIR", str(directory))
+    return directory
+
+
+def _defaults(tmp_path, url):
+    path = tmp_path / "web.yaml"
+    path.write_text(
+        yaml.safe_dump({"standalone": True, "self-contained": True, "css": [url], "metadata": {"title": "T"}}),
+        encoding="utf-8",
+    )
+    return path
+
+
+async def _build(defaults, output):
+    return await handle_call_tool(
+        "convert-contents",
+        {
+            "contents": "# Hello",
+            "output_format": "html",
+            "output_file": str(output),
+            "defaults_file": str(defaults),
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_repeated_self_contained_builds_fetch_once_and_survive_going_offline(tmp_path, cdn):
+    """The stylesheet is downloaded on first use only, then served from the cache."""
+    url = f"http://127.0.0.1:{cdn.server_port}/theme.css"
+    defaults = _defaults(tmp_path, url)
+
+    await _build(defaults, tmp_path / "first.html")
+    await _build(defaults, tmp_path / "second.html")
+    cdn.shutdown()
+    cdn.server_close()
+    await _build(defaults, tmp_path / "offline.html")
+
+    assert cdn.hits == ["/theme.css"]
+    for name in ("first.html", "second.html", "offline.html"):
+        assert "rebeccapurple" in (tmp_path / name).read_text(encoding="utf-8")
+
+
+@pytest.mark.asyncio
+async def test_cache_can_be_turned_off(tmp_path, cdn, monkeypatch):
+    """With the cache off, pandoc fetches the resource itself every time."""
+    monkeypatch.setenv("MCP_PANDOC_RESOURCE_CACHE", "off")
+    url = f"http://127.0.0.1:{cdn.server_port}/theme.css"
+    defaults = _defaults(tmp_path, url)
+
+    await _build(defaults, tmp_path / "first.html")
+    await _build(defaults, tmp_path / "second.html")
+
+    assert cdn.hits == ["/theme.css", "/theme.css"]
+
+
+def test_cached_stylesheet_keeps_resolving_against_its_url(cdn):
+    """Relative references are made absolute; absolute, data and fragment references are kept."""
+    base = f"http://127.0.0.1:{cdn.server_port}"
+
+    with open(fetch(f"{base}/skin/site.css"), encoding="utf-8") as f:
+        cached = f.read()
+
+    assert f'@import "{base}/skin/base.css";' in cached
+    assert f"url({base}/skin/img/bg.png)" in cached
+    assert f"url('{base}/shared/a.png')" in cached
+    assert f'url("{base}/root.png")' in cached
+    assert "url(https://fonts.example/f.woff2)" in cached
+    assert "url(data:image/png;base64,AAAA)" in cached and "url(#grad)" in cached
+
+
+def test_remote_images_in_contents_point_at_the_cache(cdn):
+    """Image URLs are rewritten; plain hyperlinks are left alone."""
+    url = f"http://127.0.0.1:{cdn.server_port}/theme.css"
+    markdown = f"![img]({url}) and [link]({url})"
+
+    rewritten = localize_contents(markdown, "markdown")
+
+    local = cached_path(url).replace("\\", "/")
+    assert rewritten == f"![img]({local}) and [link]({url})"
+
+
+def test_unreachable_resource_is_left_for_pandoc_to_report(cdn):
+    """A failed fetch keeps the original URL so pandoc produces its usual warning."""
+    url = f"http://127.0.0.1:{cdn.server_port}/missing.png"
+    html = f'<img src="{url}">'
+
+    assert localize_contents(html, "html") == html
@@ -0,0 +1,134 @@
+"""Tests for per-job resource limits on pandoc and its children."""
+import os
+import shutil
+import sys
+
+import mcp.types as types
+import pytest
+from mcp_pandoc import runner
+from mcp_pandoc.runner import JOB_HISTORY, ResourceLimitError, ResourceLimits, run_pandoc
+from mcp_pandoc.server import call_tool
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="rlimits are POSIX only")
+
+# One very long paragraph is far more expensive for the markdown reader than its size suggests.
+HEAVY_MARKDOWN = "word " * 20000
+
+
+@pytest.fixture(params=["prlimit", "python"])
+def wrapper(request, monkeypatch):
+    """Apply the limits through util-linux's prlimit, then through the Python fallback."""
+    if request.param == "prlimit" and not runner._prlimit_path():
+        pytest.skip("needs util-linux prlimit")
+    if request.param == "python":
+        monkeypatch.setattr(runner, "_prlimit_path", lambda: None)
+    return request.param
+
+
+async def _convert(arguments):
+    return await call_tool(None, types.CallToolRequestParams(name="convert-contents", arguments=arguments))
+
+
+@pytest.mark.asyncio
+async def test_heap_limit_breach_is_a_classified_tool_error(monkeypatch):
+    """The server survives and reports which limit stopped the job."""
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_HEAP_MB", "32")
+
+    result = await _convert({"contents": HEAVY_MARKDOWN, "output_format": "html"})
+
+    assert result.is_error is True
+    assert result.content[0].text.startswith("Resource limit exceeded during conversion contents")
+    assert "32 MB heap limit" in result.content[0].text
+
+
+@pytest.mark.asyncio
+async def test_inline_output_limit_stops_the_job(monkeypatch):
+    """Output returned inline is counted as it streams and cut off at the limit."""
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_OUTPUT_MB", "1")
+    contents = "\n\n".join(f"Paragraph {i} " + "text " * 40 for i in range(6000))
+
+    result = await _convert({"contents": contents, "output_format": "html"})
+
+    assert result.is_error is True
+    assert "1 MB output size limit" in result.content[0].text
+
+
+@posix_only
+@pytest.mark.asyncio
+async def test_output_file_limit_is_enforced_by_rlimit(monkeypatch, tmp_path):
+    """RLIMIT_FSIZE stops pandoc writing a file larger than the limit."""
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_OUTPUT_MB", "1")
+    contents = "\n\n".join(f"Paragraph {i} " + "text " * 40 for i in range(6000))
+    output = tmp_path / "big.html"
+
+    result = await _convert({"contents": contents, "output_format": "html", "output_file": str(output)})
+
+    assert result.is_error is True
+    assert "1 MB output size limit" in result.content[0].text
+
+
+@posix_only
+def test_memory_limit_breach_is_classified(wrapper):
+    """An address-space cap too small for pandoc is reported as the memory limit."""
+    with pytest.raises(ResourceLimitError) as excinfo:
+        run_pandoc("html", source="# Hi", input_format="markdown", limits=ResourceLimits(memory_mb=200))
+
+    assert excinfo.value.limit == "memory"
+
+
+@posix_only
+def test_cpu_limit_applies_to_filters_pandoc_starts(wrapper, tmp_path):
+    """rlimits are inherited, so a runaway filter is stopped and attributed to the CPU limit."""
+    spinner = tmp_path / "spin.py"
+    spinner.write_text(f"#!{sys.executable}\nwhile True:\n    pass\n", encoding="utf-8")
+    spinner.chmod(0o755)
+
+    with pytest.raises(ResourceLimitError) as excinfo:
+        run_pandoc(
+            "html",
+            source="# Hi",
+            input_format="markdown",
+            extra_args=["--filter", str(spinner)],
+            limits=ResourceLimits(cpu_seconds=1),
+        )
+
+    assert excinfo.value.limit == "cpu"
+
+
+@posix_only
+def test_generous_limits_do_not_change_the_result(wrapper):
+    """Limits that are not hit leave the conversion untouched, and the usage recorded is pandoc's own."""
+    limits = ResourceLimits(memory_mb=4096, cpu_seconds=60, heap_mb=1024, output_mb=10)
+
+    output = run_pandoc("html", source="# Hi", input_format="markdown", limits=limits)
+
+    assert output.strip() == '<h1 id="hi">Hi</h1>'
+    job = JOB_HISTORY[-1]
+    assert job.returncode == 0
+    assert job.peak_rss_kb > 0
+    assert job.cpu_seconds is not None
+    assert job.argv[1:4] == ["+RTS", "-M1024m", "-RTS"]
+
+
+@posix_only
+def test_limits_are_applied_by_an_exec_wrapper_not_preexec_fn(wrapper):
+    """The server is multi-threaded, so nothing runs between fork and exec; the wrapper keeps pandoc's argv."""
+    argv = ["pandoc", "--to=html"]
+
+    wrapped = ResourceLimits(cpu_seconds=5, output_mb=2).wrap(argv)
+
+    assert wrapped[-2:] == argv
+    if wrapper == "prlimit":
+        assert wrapped[0] == shutil.which("prlimit")
+        assert wrapped[1:4] == ["--core=0:0", "--cpu=5:6", f"--fsize={2 * 1024 * 1024}:{2 * 1024 * 1024}"]
+    else:
+        assert wrapped[0] == sys.executable and "CORE:0:0,CPU:5:6" in wrapped[-3]
+    assert ResourceLimits(heap_mb=64).wrap(argv) is argv
+
+
+def test_invalid_limit_setting_is_rejected(monkeypatch):
+    """A malformed limit names the variable rather than silently running unlimited."""
+    monkeypatch.setenv("MCP_PANDOC_LIMIT_CPU_SECONDS", "lots")
+
+    with pytest.raises(ValueError, match="MCP_PANDOC_LIMIT_CPU_SECONDS must be a whole number"):
+        ResourceLimits.from_env()
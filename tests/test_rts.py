@@ -0,0 +1,64 @@
+"""Tests for choosing pandoc's GHC runtime options per job."""
+import pytest
+from mcp_pandoc.rts import DEFAULT_PROFILE, RtsSupport, choose_profile, probe
+from mcp_pandoc.runner import JOB_HISTORY, ResourceLimits, pandoc_path, run_pandoc
+
+SUPPORTED = RtsSupport(accepts_options=True, threaded=False)
+NO_LIMITS = ResourceLimits()
+
+
+@pytest.mark.parametrize(
+    ("input_bytes", "input_format", "name", "args"),
+    [
+        (2_000, "markdown", "small", ("-H16m",)),
+        (600_000, "markdown", "medium", ("-H32m",)),
+        (100_000, "docx", "medium", ("-H32m",)),
+        (8_000_000, "markdown", "large", ()),
+    ],
+)
+def test_profile_follows_input_size(input_bytes, input_format, name, args):
+    """Small inputs get a smaller suggested heap; packaged ones count at their unzipped size."""
+    profile = choose_profile(input_bytes, input_format, NO_LIMITS, SUPPORTED)
+
+    assert (profile.name, profile.args) == (name, args)
+
+
+def test_limits_are_not_moved_by_tuning():
+    """A capped job keeps the binary's heap, and a large one under a memory cap compacts."""
+    assert choose_profile(2_000, "markdown", ResourceLimits(heap_mb=32), SUPPORTED).args == ()
+    assert choose_profile(2_000, "markdown", ResourceLimits(memory_mb=200), SUPPORTED).args == ()
+
+    large = choose_profile(8_000_000, "markdown", ResourceLimits(memory_mb=512), SUPPORTED)
+    assert (large.name, large.args) == ("large-compacting", ("-c",))
+
+
+def test_threaded_and_locked_binaries():
+    """Threaded builds skip the parallel collector; a binary without -rtsopts keeps its defaults."""
+    threaded = RtsSupport(accepts_options=True, threaded=True)
+    locked = RtsSupport(accepts_options=False, threaded=False)
+
+    assert choose_profile(2_000, "markdown", NO_LIMITS, threaded).args == ("-H16m", "-qg")
+    assert choose_profile(2_000, "markdown", NO_LIMITS, locked) is DEFAULT_PROFILE
+    assert DEFAULT_PROFILE.argv() == []
+
+
+def test_probe_reads_the_installed_binary():
+    """The bundled pandoc takes +RTS options, and the answer is kept for later jobs."""
+    support = probe(pandoc_path())
+
+    assert support.accepts_options is True
+    assert probe(pandoc_path()) is support
+
+
+def test_job_records_its_profile(monkeypatch):
+    """The profile a job ran with is kept in the job history, and tuning can be switched off."""
+    monkeypatch.delenv("MCP_PANDOC_LIMIT_HEAP_MB", raising=False)
+    monkeypatch.delenv("MCP_PANDOC_LIMIT_MEMORY_MB", raising=False)
+
+    run_pandoc("html", source="# Tuned", input_format="markdown")
+    assert JOB_HISTORY[-1].rts_profile == "small"
+
+    monkeypatch.setenv("MCP_PANDOC_RTS_TUNING", "off")
+    output = run_pandoc("html", source="# Untuned", input_format="markdown")
+    assert JOB_HISTORY[-1].rts_profile == "default"
+    assert '<h1 id="untuned">Untuned</h1>' in output
@@ -36,8 +36,10 @@ async def test_stdio_server_initializes_and_lists_tool():
             )
 
     assert initialized.server_info.name == "mcp-pandoc"
-    assert initialized.server_info.version == "0.11.1"
-    assert [tool.name for tool in tools.tools] == ["convert-contents"]
+    assert initialized.server_info.version == "0.36.0"
+    assert [tool.name for tool in tools.tools] == [
+        "convert-contents", "get-chunk", "watch", "inspect-document", "register-document",
+    ]
     assert called.is_error is False
     assert '<h1 id="hello">Hello</h1>' in called.content[0].text
 
@@ -0,0 +1,103 @@
+"""Tests for input format detection."""
+import json
+import zipfile
+
+import pytest
+from mcp_pandoc.runner import run_pandoc
+from mcp_pandoc.server import handle_call_tool
+from mcp_pandoc.sniff import sniff_file, sniff_text
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("<!DOCTYPE html>\n<html><body><p>Hi</p></body></html>", "html"),
+        ("<div>\n  <p>A fragment</p>\n  <p>with tags</p>\n</div>", "html"),
+        ("\\documentclass{article}\n\\begin{document}\nHi\n\\end{document}\n", "latex"),
+        ("\\section{Intro}\nSome \\emph{stress} and \\textbf{weight}.\n", "latex"),
+        ("Title\n=====\n\n.. note::\n\n   Read :ref:`setup` first.\n", "rst"),
+        (json.dumps({"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}), "ipynb"),
+        ("# Title\n\nSee [the docs](https://example.com).\n\n<div>inline html</div>\n", None),
+        ("Title\n=====\n\nA setext heading is markdown too.\n", None),
+        ("Fractions like $\\frac{a}{b}$ and \\emph{one} command.\n", None),
+    ],
+)
+def test_text_formats(text, expected):
+    """Clear markers pick the reader; markdown and anything ambiguous is left to the fallback."""
+    assert sniff_text(text) == expected
+
+
+def test_zip_containers_are_told_apart(tmp_path):
+    """Packaged formats are recognised from their members, whatever they are named."""
+    docx = tmp_path / "report.bin"
+    run_pandoc("docx", source="# Report", input_format="markdown", outputfile=str(docx))
+    epub = tmp_path / "book.zip"
+    with zipfile.ZipFile(epub, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr("META-INF/container.xml", "<container/>")
+
+    assert sniff_file(str(docx)) == "docx"
+    assert sniff_file(str(epub)) == "epub"
+    assert sniff_file(str(tmp_path / "missing.md")) is None
+
+
+@pytest.mark.asyncio
+async def test_auto_contents_are_read_with_the_detected_reader():
+    """HTML passed as contents is converted as HTML, and the result says so."""
+    result = await handle_call_tool(
+        "convert-contents",
+        {"contents": "<html><body><h1>Heading</h1><p>Some <em>text</em>.</p></body></html>", "input_format": "auto"},
+    )
+
+    text = result[0].text
+    assert "Detected input format: html." in text
+    assert "# Heading" in text
+    assert "<p>" not in text
+
+
+@pytest.mark.asyncio
+async def test_auto_file_falls_back_to_the_extension(tmp_path):
+    """A file without clear markers keeps the reader its extension gives."""
+    source = tmp_path / "notes.md"
+    source.write_text("# Notes\n\nNothing unusual here.\n", encoding="utf-8")
+
+    result = await handle_call_tool(
+        "convert-contents", {"input_file": str(source), "input_format": "auto", "output_format": "html"}
+    )
+
+    assert "Detected input format: markdown." in result[0].text
+    assert '<h1 id="notes">Notes</h1>' in result[0].text
+
+
+@pytest.mark.asyncio
+async def test_misnamed_file_is_read_by_its_signature(tmp_path):
+    """A docx saved with a markdown name is read as docx without being asked for auto."""
+    source = tmp_path / "minutes.md"
+    run_pandoc("docx", source="# Minutes\n\nAll agreed.", input_format="markdown", outputfile=str(source))
+
+    result = await handle_call_tool("convert-contents", {"input_file": str(source), "output_format": "markdown"})
+
+    text = result[0].text
+    assert "Detected input format: docx (the file name suggests markdown)." in text
+    assert "All agreed." in text
+
+
+@pytest.mark.asyncio
+async def test_explicit_format_is_not_second_guessed():
+    """An input_format given by the caller is used as is, so raw HTML stays raw HTML."""
+    result = await handle_call_tool(
+        "convert-contents", {"contents": "<p>kept</p>", "input_format": "markdown", "output_format": "html"}
+    )
+
+    assert "Detected input format" not in result[0].text
+    assert "<p>\nkept\n</p>" in result[0].text
+
+
+@pytest.mark.asyncio
+async def test_detected_format_that_cannot_be_read_is_reported(tmp_path):
+    """A pptx is recognised, then rejected like any unsupported reader."""
+    source = tmp_path / "slides.md"
+    run_pandoc("pptx", source="# Slide", input_format="markdown", outputfile=str(source))
+
+    with pytest.raises(ValueError, match="Unsupported input format: 'pptx'"):
+        await handle_call_tool("convert-contents", {"input_file": str(source)})
@@ -0,0 +1,115 @@
+"""Tests for the inspect-document tool and the structural summary behind it."""
+import json
+
+import pytest
+from mcp_pandoc.runner import run_pandoc
+from mcp_pandoc.server import handle_call_tool
+from mcp_pandoc.structure import summarize
+
+REPORT = """---
+title: Quarterly Report
+author: [Ann, Bo]
+---
+
+# Summary {#summary}
+
+Revenue grew in every region.[^1]
+
+[^1]: Before currency effects.
+
+## Regions
+
+| Region | Q1 | Q2 |
+|--------|----|----|
+| North  | 1  | 2  |
+| South  | 3  | 4  |
+
+: Revenue by region
+
+![Growth chart](chart.png "Growth")
+
+# Outlook
+
+Steady.
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    """Keep the AST cache inside the test's scratch directory."""
+    monkeypatch.setenv("MCP_PANDOC_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def _summary(text: str) -> dict:
+    return json.loads(text.partition("\n\n")[2])
+
+
+def test_summary_of_a_document():
+    """Headings, section sizes, tables, images and metadata come from one walk of the AST."""
+    summary = summarize(json.loads(run_pandoc("json", source=REPORT, input_format="markdown")))
+
+    assert [(h["level"], h["id"], h["title"]) for h in summary["outline"]] == [
+        (1, "summary", "Summary"), (2, "regions", "Regions"), (1, "outlook", "Outlook"),
+    ]
+    summary_section = summary["outline"][0]
+    assert summary_section["words"] == 5
+    assert summary_section["words_with_subsections"] > summary_section["words"]
+    assert summary["tables"] == [{
+        "index": 1, "section": "regions", "caption": "Revenue by region",
+        "columns": 3, "header_rows": 1, "body_rows": 2, "footer_rows": 0,
+    }]
+    assert summary["images"][0] == {
+        "index": 1, "section": "regions", "src": "chart.png", "alt": "Growth chart", "title": "Growth",
+    }
+    assert summary["metadata"] == {"title": "Quarterly Report", "author": ["Ann", "Bo"]}
+    assert summary["stats"]["footnotes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_inspecting_a_docx_is_cached_and_small(tmp_path):
+    """A repeat query is served from the cache, and the answer is far smaller than the document."""
+    body = "\n\n".join(f"# Section {i}\n\n" + "Lorem ipsum dolor sit amet. " * 60 for i in range(60))
+    source = tmp_path / "long.docx"
+    run_pandoc("docx", source=body, input_format="markdown", outputfile=str(source))
+
+    first = await handle_call_tool("inspect-document", {"input_file": str(source), "include": ["outline"]})
+    second = await handle_call_tool("inspect-document", {"input_file": str(source), "include": ["outline"]})
+    converted = await handle_call_tool("convert-contents", {"input_file": str(source)})
+
+    assert "(docx): 18120 words, 60 headings" in first[0].text
+    assert "AST parsed and cached." in first[0].text
+    assert "AST from the cache." in second[0].text
+    assert _summary(second[0].text)["outline"][59]["id"] == "section-59"
+    assert len(first[0].text) * 5 < len(converted[0].text)
+
+
+@pytest.mark.asyncio
+async def test_lists_are_capped():
+    """max_items shortens long lists and says how many entries were left out."""
+    result = await handle_call_tool(
+        "inspect-document", {"contents": REPORT, "include": ["outline", "stats"], "max_items": 1}
+    )
+
+    summary = _summary(result[0].text)
+    assert list(summary) == ["stats", "outline_omitted", "outline"]
+    assert summary["outline_omitted"] == 2
+    assert summary["outline"][0]["title"] == "Summary"
+
+
+@pytest.mark.asyncio
+async def test_contents_format_is_detected():
+    """Contents without an input_format are sniffed like convert-contents does."""
+    result = await handle_call_tool(
+        "inspect-document", {"contents": "<html><body><h1 id='top'>Top</h1><p>Text</p></body></html>"}
+    )
+
+    assert result[0].text.startswith("Structure of contents (html): 2 words, 1 headings")
+
+
+@pytest.mark.asyncio
+async def test_exactly_one_source(tmp_path):
+    """inspect-document summarizes one source per call."""
+    with pytest.raises(ValueError, match="Exactly one of"):
+        await handle_call_tool("inspect-document", {"contents": "# A", "input_file": str(tmp_path / "a.md")})
+    with pytest.raises(ValueError, match="Input file not found"):
+        await handle_call_tool("inspect-document", {"input_file": str(tmp_path / "missing.md")})
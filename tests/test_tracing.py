@@ -0,0 +1,173 @@
+"""Tests for the trace spans exported for each conversion."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mcp.types as types
+import pytest
+from mcp_pandoc import tracing
+from mcp_pandoc.server import call_tool
+from opentelemetry import trace
+
+pytest.importorskip("opentelemetry.sdk")
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture
+def tracing_env(monkeypatch):
+    """Start every test without a tracer provider and shut down whatever it configured."""
+    monkeypatch.setattr(trace, "_TRACER_PROVIDER", None)
+    monkeypatch.setattr(trace._TRACER_PROVIDER_SET_ONCE, "_done", False)
+    monkeypatch.setattr(tracing.tracer, "_real_tracer", None)
+    processors = []
+
+    def configure():
+        processors.extend(tracing.configure_tracing("0.0.0"))
+        return processors
+
+    yield configure
+    for processor in processors:
+        processor.shutdown()
+
+
+async def _convert(arguments, meta=None):
+    params = types.CallToolRequestParams.model_validate(
+        {"name": "convert-contents", "arguments": arguments, **({"_meta": meta} if meta else {})}
+    )
+    return await call_tool(None, params)
+
+
+def _read_spans(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_spans_are_written_to_the_file(tracing_env, tmp_path, monkeypatch):
+    """A call yields its own span with the pandoc job and the stages nested under it."""
+    trace_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("MCP_PANDOC_TRACE_FILE", str(trace_file))
+    tracing_env()
+
+    await _convert({"contents": "# Title", "output_format": "html"})
+
+    spans = {span["name"]: span for span in _read_spans(trace_file)}
+    root = spans["mcp-pandoc convert-contents"]
+    assert root["parent_id"] is None
+    assert root["resource"]["attributes"]["service.version"] == "0.0.0"
+    for name in ("validate arguments", "pandoc", "serialize result"):
+        assert spans[name]["parent_id"] == root["context"]["span_id"]
+        assert spans[name]["context"]["trace_id"] == root["context"]["trace_id"]
+
+    pandoc = spans["pandoc"]["attributes"]
+    assert pandoc["process.exit.code"] == 0
+    assert pandoc["process.pid"] > 0
+    assert "--verbose --from=markdown --to=html" in pandoc["process.command_line"]
+
+
+@pytest.mark.asyncio
+async def test_filters_get_their_own_spans(tracing_env, tmp_path, monkeypatch):
+    """Filters pandoc runs appear as children of the pandoc span, timed from its log."""
+    trace_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("MCP_PANDOC_TRACE_FILE", str(trace_file))
+    tracing_env()
+    passthrough = tmp_path / "passthrough.py"
+    passthrough.write_text("#!/usr/bin/env python3\nimport sys\nsys.stdout.write(sys.stdin.read())\n")
+
+    result = await _convert({"contents": "# Title", "output_format": "html", "filters": [str(passthrough)]})
+
+    assert "[INFO]" not in result.content[0].text
+    spans = {span["name"]: span for span in _read_spans(trace_file)}
+    assert spans["resolve filters"]["attributes"]["mcp_pandoc.filter_count"] == 1
+    filter_span = spans["filter passthrough.py"]
+    assert filter_span["parent_id"] == spans["pandoc"]["context"]["span_id"]
+    assert filter_span["attributes"]["mcp_pandoc.filter"] == str(passthrough)
+    assert filter_span["start_time"] <= filter_span["end_time"]
+
+
+@pytest.mark.asyncio
+async def test_client_trace_context_is_continued(tracing_env, tmp_path, monkeypatch):
+    """A traceparent in the request _meta makes the call part of the client's trace."""
+    trace_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("MCP_PANDOC_TRACE_FILE", str(trace_file))
+    tracing_env()
+
+    await _convert(
+        {"contents": "# Title", "output_format": "html"},
+        meta={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"},
+    )
+
+    root = next(span for span in _read_spans(trace_file) if span["name"] == "mcp-pandoc convert-contents")
+    assert root["context"]["trace_id"] == f"0x{TRACE_ID}"
+    assert root["parent_id"] == "0x00f067aa0ba902b7"
+
+
+@pytest.mark.asyncio
+async def test_failed_calls_mark_their_spans(tracing_env, tmp_path, monkeypatch):
+    """An error result sets the error status on the call span."""
+    trace_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("MCP_PANDOC_TRACE_FILE", str(trace_file))
+    tracing_env()
+
+    result = await _convert({"input_file": "/nonexistent/in.md", "output_format": "html"})
+
+    assert result.is_error is True
+    root = next(span for span in _read_spans(trace_file) if span["name"] == "mcp-pandoc convert-contents")
+    assert root["status"]["status_code"] == "ERROR"
+
+
+@pytest.mark.asyncio
+async def test_spans_are_exported_to_an_otlp_collector(tracing_env, monkeypatch):
+    """The OTLP exporter posts protobuf trace requests to the configured endpoint."""
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: N802
+            received.append((self.path, self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Collector)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setenv("MCP_PANDOC_TRACE_OTLP_ENDPOINT", f"http://127.0.0.1:{httpd.server_port}/v1/traces")
+    try:
+        processors = tracing_env()
+        await _convert({"contents": "# Title", "output_format": "html"})
+        for processor in processors:
+            processor.force_flush()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    names = set()
+    for path, body in received:
+        assert path == "/v1/traces"
+        request = ExportTraceServiceRequest.FromString(body)
+        for resource_spans in request.resource_spans:
+            for scope_spans in resource_spans.scope_spans:
+                names.update(span.name for span in scope_spans.spans)
+    assert {"mcp-pandoc convert-contents", "pandoc", "validate arguments"} <= names
+
+
+def test_tracing_is_off_by_default(tracing_env, monkeypatch):
+    """Without an endpoint or a file nothing is configured and spans are not recorded."""
+    monkeypatch.delenv("MCP_PANDOC_TRACE_OTLP_ENDPOINT", raising=False)
+    monkeypatch.delenv("MCP_PANDOC_TRACE_FILE", raising=False)
+
+    assert tracing_env() == []
+    with tracing.tracer.start_as_current_span("probe") as span:
+        assert not span.is_recording()
+
+
+def test_argv_summary_is_bounded():
+    """Long command lines are cut to a size span attributes can carry."""
+    summary = tracing.argv_summary(["/usr/local/bin/pandoc", *(["--metadata=x"] * 200)])
+
+    assert summary.startswith("pandoc --metadata=x")
+    assert len(summary) == 512
+    assert summary.endswith("...")
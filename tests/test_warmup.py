@@ -0,0 +1,84 @@
+"""Tests for the background warm-up stage."""
+import sys
+
+import pytest
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp_pandoc.server import OUTPUT_FORMATS, _warm_up
+from mcp_pandoc.warmup import WARMUP, run_warmup, start_warmup, warmup_formats
+
+
+def test_warmup_is_off_unless_requested(monkeypatch):
+    """No variable, no background work."""
+    monkeypatch.delenv("MCP_PANDOC_WARMUP", raising=False)
+
+    assert warmup_formats(OUTPUT_FORMATS) == []
+    assert start_warmup(OUTPUT_FORMATS, _warm_up) is None
+
+
+def test_warmup_formats_are_parsed_and_checked(monkeypatch):
+    """A list selects formats, 'all' selects every one, and typos are named."""
+    monkeypatch.setenv("MCP_PANDOC_WARMUP", "html, docx")
+    assert warmup_formats(OUTPUT_FORMATS) == ["html", "docx"]
+
+    monkeypatch.setenv("MCP_PANDOC_WARMUP", "all")
+    assert warmup_formats(OUTPUT_FORMATS) == list(OUTPUT_FORMATS)
+
+    monkeypatch.setenv("MCP_PANDOC_WARMUP", "html,dcox")
+    with pytest.raises(ValueError, match="unsupported output formats: dcox"):
+        warmup_formats(OUTPUT_FORMATS)
+    assert start_warmup(OUTPUT_FORMATS, _warm_up) is None
+
+
+def test_warmup_converts_each_format_and_reports_readiness():
+    """Every format gets a real conversion, and the duration is recorded."""
+    status = run_warmup(["html", "txt", "docx", "pptx"], _warm_up)
+
+    assert status.state == "ready"
+    assert status.ready
+    assert list(status.results) == ["html", "txt", "docx", "pptx"]
+    assert all(result.startswith("ok in ") for result in status.results.values())
+    assert status.duration_seconds > 0
+
+
+def test_failed_format_does_not_stop_the_rest():
+    """One broken format is recorded and the remaining formats still warm up."""
+    def convert(output_format, scratch_dir):
+        if output_format == "odt":
+            raise RuntimeError("writer crashed")
+        _warm_up(output_format, scratch_dir)
+
+    status = run_warmup(["odt", "html"], convert)
+
+    assert status.results["odt"] == "failed: writer crashed"
+    assert status.results["html"].startswith("ok in ")
+    assert status.state == "ready"
+
+
+def test_background_thread_finishes(monkeypatch):
+    """start_warmup returns at once and the thread marks warm-up ready when done."""
+    monkeypatch.setenv("MCP_PANDOC_WARMUP", "markdown")
+
+    thread = start_warmup(OUTPUT_FORMATS, _warm_up)
+    thread.join(timeout=60)
+
+    assert not thread.is_alive()
+    assert WARMUP.state == "ready"
+    assert WARMUP.formats == ["markdown"]
+
+
+@pytest.mark.asyncio
+async def test_handshake_does_not_wait_for_warmup():
+    """The server answers while every format, PDF included, is still warming up."""
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-c", "from mcp_pandoc import main; main()"],
+        env={"MCP_PANDOC_WARMUP": "all"},
+    )
+
+    async with stdio_client(params) as streams:
+        async with ClientSession(*streams) as session:
+            await session.initialize()
+            tools = await session.list_tools()
+
+    assert [tool.name for tool in tools.tools][0] == "convert-contents"
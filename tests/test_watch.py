@@ -0,0 +1,211 @@
+"""Tests for watch mode."""
+import json
+import os
+import sys
+import threading
+import time
+
+import mcp.types as types
+import pytest
+from mcp_pandoc.server import WATCH, call_tool
+from mcp_pandoc.watch import InotifyWatcher, PollingWatcher, WatchService, target_dependencies
+
+WATCHERS = [pytest.param(lambda: PollingWatcher(0.05), id="polling")]
+if sys.platform.startswith("linux"):
+    WATCHERS.append(pytest.param(InotifyWatcher, id="inotify"))
+
+
+class Builds:
+    """A stand-in build that records the targets it built."""
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.outputs = []
+        self.lock = threading.Lock()
+
+    def __call__(self, arguments):
+        time.sleep(self.seconds)
+        with self.lock:
+            self.outputs.append(arguments["output_file"])
+        return f"built {arguments['output_file']}"
+
+    def count(self, output_file):
+        with self.lock:
+            return self.outputs.count(output_file)
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def service_factory():
+    """Create services that are closed after the test."""
+    services = []
+
+    def create(build, watcher, **kwargs):
+        service = WatchService(build, watcher=watcher(), debounce_seconds=0.1, **kwargs)
+        services.append(service)
+        return service
+
+    yield create
+    for service in services:
+        service.close()
+
+
+@pytest.mark.parametrize("watcher", WATCHERS)
+def test_only_targets_that_depend_on_a_change_are_rebuilt(service_factory, watcher, tmp_path):
+    """Editing one source rebuilds its target and leaves the other alone."""
+    builds = Builds()
+    service = service_factory(builds, watcher)
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.md").write_text(f"# {name}\n")
+        service.add({"input_file": str(tmp_path / f"{name}.md"), "output_file": str(tmp_path / f"{name}.html")}).result()
+
+    (tmp_path / "a.md").write_text("# a, edited\n")
+    _wait_for(lambda: builds.count(str(tmp_path / "a.html")) == 2)
+    time.sleep(0.3)
+
+    assert builds.count(str(tmp_path / "b.html")) == 1
+    status = service.status(str(tmp_path / "a.html"))[0]
+    assert status["last_trigger"] == [str(tmp_path / "a.md")]
+    assert status["state"] == "ok"
+    assert status["builds"] == 2
+
+
+@pytest.mark.parametrize("watcher", WATCHERS)
+def test_a_burst_of_saves_is_built_once(service_factory, watcher, tmp_path):
+    """Changes that arrive within the debounce window are collected into one rebuild."""
+    builds = Builds()
+    service = service_factory(builds, watcher)
+    chapters = [tmp_path / f"{index}.md" for index in range(3)]
+    for chapter in chapters:
+        chapter.write_text("text\n")
+    output = str(tmp_path / "book.docx")
+    service.add({"input_files": [str(chapter) for chapter in chapters], "output_file": output}).result()
+
+    for round_ in range(2):
+        for chapter in chapters:
+            chapter.write_text(f"edit {round_}\n")
+            time.sleep(0.02)
+    _wait_for(lambda: builds.count(output) == 2)
+    time.sleep(0.5)
+
+    assert builds.count(output) == 2
+    assert service.status(output)[0]["last_trigger"] == sorted(str(chapter) for chapter in chapters)
+
+
+def test_changes_during_a_build_queue_exactly_one_more(service_factory, tmp_path):
+    """A target is never built twice at once, and an edit made mid-build is not lost."""
+    builds = Builds(seconds=0.8)
+    service = service_factory(builds, lambda: PollingWatcher(0.02))
+    source = tmp_path / "doc.md"
+    source.write_text("one\n")
+    output = str(tmp_path / "doc.html")
+    service.add({"input_file": str(source), "output_file": output}).result()
+
+    source.write_text("two\n")
+    _wait_for(lambda: service.status(output)[0]["state"] == "building")
+    source.write_text("three\n")
+    time.sleep(0.2)
+    source.write_text("four!\n")
+    _wait_for(lambda: builds.count(output) == 3 and service.status(output)[0]["state"] == "ok")
+    time.sleep(1.0)
+
+    assert builds.count(output) == 3
+
+
+def test_registering_again_mid_build_waits_for_the_running_build(service_factory, tmp_path):
+    """New arguments for a target that is building are built after it, never alongside it."""
+    running, overlapped, formats = [], [], []
+    lock = threading.Lock()
+
+    def build(arguments):
+        with lock:
+            overlapped.append(bool(running))
+            running.append(arguments)
+        time.sleep(0.4)
+        with lock:
+            running.remove(arguments)
+            formats.append(arguments["output_format"])
+        return arguments["output_format"]
+
+    service = service_factory(build, lambda: PollingWatcher(0.05))
+    source = tmp_path / "doc.md"
+    source.write_text("one\n")
+    target = {"input_file": str(source), "output_file": str(tmp_path / "doc.out")}
+
+    first = service.add({**target, "output_format": "html"})
+    _wait_for(lambda: running)
+    second = service.add({**target, "output_format": "rst"})
+
+    assert first.result()["last_result"] == "html"
+    assert second.result()["last_result"] == "rst"
+    assert formats == ["html", "rst"] and overlapped == [False, False]
+    status = service.status(target["output_file"])[0]
+    assert status["builds"] == 2 and status["state"] == "ok" and status["last_trigger"] == ["registered"]
+
+
+def test_dependencies_cover_every_input(tmp_path):
+    """Filters, the reference document and the defaults file are watched along with the sources."""
+    defaults = tmp_path / "conf" / "defaults.yaml"
+
+    dependencies = target_dependencies({
+        "input_files": ["a.md", "b.md"],
+        "reference_doc": "house.docx",
+        "defaults_file": str(defaults),
+        "filters": ["filters/diagram.py"],
+        "output_file": "out.docx",
+    })
+
+    assert str(tmp_path / "conf" / "filters" / "diagram.py") in dependencies
+    assert {"a.md", "b.md", "house.docx", "defaults.yaml", "diagram.py"} <= {os.path.basename(p) for p in dependencies}
+    assert not any(path.endswith("out.docx") for path in dependencies)
+
+
+async def _watch(**arguments):
+    result = await call_tool(None, types.CallToolRequestParams(name="watch", arguments=arguments))
+    return result.is_error, result.content[0].text
+
+
+@pytest.mark.asyncio
+async def test_watch_tool_rebuilds_a_real_conversion(tmp_path, monkeypatch):
+    """The tool builds on add, rebuilds after an edit, and reports status until removed."""
+    monkeypatch.setenv("MCP_PANDOC_WATCH_POLL_SECONDS", "0.05")
+    source = tmp_path / "notes.md"
+    source.write_text("# Notes\n\nFirst draft.\n")
+    output = tmp_path / "notes.html"
+
+    is_error, text = await _watch(action="add", input_file=str(source), output_format="html", output_file=str(output))
+    assert is_error is False
+    assert text.startswith(f"Watching 1 files for {output}. Initial build: ok in ")
+    assert "First draft." in output.read_text()
+
+    try:
+        source.write_text("# Notes\n\nSecond draft.\n")
+        _wait_for(lambda: WATCH.status(str(output))[0]["builds"] == 2)
+        assert "Second draft." in output.read_text()
+
+        _, text = await _watch(action="status", output_file=str(output))
+        status = json.loads(text.split("\n\n", 1)[1])[0]
+        assert status["builds"] == 2
+        assert status["last_trigger"] == [str(source)]
+        assert "Output file updated." in status["last_result"]
+    finally:
+        is_error, text = await _watch(action="remove", output_file=str(output))
+    assert is_error is False
+
+    _, text = await _watch(action="status", output_file=str(output))
+    assert text.startswith("0 watched target(s).")
+
+
+@pytest.mark.asyncio
+async def test_watch_tool_requires_an_output_file(tmp_path):
+    """Watched builds always write a file."""
+    is_error, text = await _watch(action="add", input_file=str(tmp_path / "a.md"))
+
+    assert is_error is True
+    assert text == "output_file is required to watch a target"
@@ -0,0 +1,98 @@
+"""Tests for reducing web pages before conversion."""
+import pytest
+from mcp_pandoc.server import handle_call_tool
+from mcp_pandoc.webpages import HtmlReduction, html_blocks, reduce_html, sample_page
+
+ARTICLE = '<h1>Title</h1>\n<p>Some <a href="https://example.com">linked</a> text &amp; more.</p>\n'
+
+PAGE = (
+    '<!DOCTYPE html><html><head><title>Page</title><style>p { color: red; }</style>'
+    '<script>if (a < b) { document.write("<p>injected</p>"); }</script></head><body>'
+    '<nav><ul><li><a href="/">Home</a></ul></nav>'
+    '<main data-page="1" onclick="track()">'
+    + ARTICLE.replace("<p>", '<p style="margin: 0" aria-label="x">')
+    + '<svg viewBox="0 0 1 1"><text>icon</text></svg><img src="p.gif" width="1" height="1">'
+    "<!-- build 1234 --></main>"
+    '<div class="cookie-banner"><p>We use cookies.</p></div></body></html>'
+)
+
+
+def _reduce(page: str, **arguments) -> str:
+    reduced, _ = reduce_html(html_blocks(page), HtmlReduction.from_arguments(arguments))
+    return reduced
+
+
+def test_default_rules_leave_the_article():
+    """Scripts, styles, navigation, SVG, tracking pixels, comments and presentation attributes go."""
+    reduced, report = reduce_html(html_blocks(PAGE), HtmlReduction.from_arguments({"html_reduce": True}))
+
+    assert "<main>" + ARTICLE in reduced
+    for removed in ("script", "injected", "color: red", "Home", "svg", "p.gif", "build 1234", "data-page", "style="):
+        assert removed not in reduced
+    assert "<title>Page</title>" in reduced and "We use cookies." in reduced
+    assert report.elements_dropped == 5 and report.attributes_dropped == 4
+    assert report.bytes_after == len(reduced.encode("utf-8")) < report.bytes_before
+
+
+def test_rules_can_be_added_and_exempted():
+    """Extra rules match classes and attributes; kept defaults stay, and dropped attributes take wildcards."""
+    reduced = _reduce(
+        PAGE, html_reduce=True, html_drop_elements=[".cookie-banner"], html_keep_elements=["svg", "nav"],
+        html_drop_attributes=["hr*"],
+    )
+
+    assert "We use cookies." not in reduced
+    assert '<svg viewBox="0 0 1 1"><text>icon</text></svg>' in reduced and "Home" in reduced
+    assert "<a>linked</a>" in reduced and '<main data-page="1">' not in reduced
+
+    only = _reduce(PAGE, html_drop_elements=["main"])
+    assert "Title" not in only and "build 1234" not in only and "<script>" in only and '<a href="/">' in only
+
+
+def test_unclosed_dropped_element_ends_with_its_parent():
+    """Optional end tags inside a dropped element do not end it, and its parent closing does."""
+    page = "<div><p>one<nav><p>menu</p><li>item</div><p>two</p><section><aside>x<p>y</section><p>three"
+
+    assert _reduce(page, html_drop_elements=["nav", "aside"]) == "<div><p>one</div><p>two</p><section></section><p>three"
+
+
+def test_pages_are_reduced_across_block_boundaries():
+    """A page larger than one block is reduced as a whole: every section heading stays and no script does."""
+    page = sample_page(512)
+
+    reduced = _reduce(page, html_reduce=True)
+
+    assert len(reduced) < len(page) / 5
+    assert reduced.count("<h2 ") == page.count("<h2 ")
+    assert "<script" not in reduced and "tracker.example.com" not in reduced and "srcset" not in reduced
+
+
+@pytest.mark.asyncio
+async def test_reduced_file_converts_like_the_clean_article(tmp_path):
+    """The tool reads the page file through the reduction, so pandoc sees only the article."""
+    source = tmp_path / "page.html"
+    source.write_text(PAGE, encoding="utf-8")
+    arguments = {"input_file": str(source), "output_format": "markdown"}
+
+    text = (await handle_call_tool("convert-contents", {**arguments, "html_reduce": True}))[0].text
+    clean = (await handle_call_tool("convert-contents", {"contents": ARTICLE, "input_format": "html",
+                                                         "output_format": "markdown"}))[0].text
+
+    assert "HTML reduced from " in text and "(5 elements and 4 attributes removed)" in text
+    converted = text.split("Converted Contents:", 1)[1]
+    assert converted.replace("We use cookies.", "").strip() == clean.split("Converted Contents:", 1)[1].strip()
+
+
+@pytest.mark.asyncio
+async def test_html_options_need_html_input():
+    """The options are rejected for other inputs, and a bad rule is reported."""
+    with pytest.raises(ValueError, match="html_\\* options only apply to html input"):
+        await handle_call_tool("convert-contents", {"contents": "# Hi", "html_reduce": True})
+    with pytest.raises(ValueError, match="Invalid element rule 'div > p'"):
+        await handle_call_tool("convert-contents", {
+            "contents": "<p>Hi</p>", "input_format": "html", "html_drop_elements": ["div > p"],
+        })
+    with pytest.raises(ValueError, match="html_keep_elements .* needs html_reduce"):
+        await handle_call_tool("convert-contents", {
+            "contents": "<p>Hi</p>", "input_format": "html", "html_keep_elements": ["svg"],
+        })